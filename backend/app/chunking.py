@@ -0,0 +1,154 @@
+"""
+Token-budgeted, structure-aware chunking.
+
+Text is split at sentence ends and at 10-K/10-Q headings ("PART II", "Item 1A. Risk
+Factors", ...) and the pieces are packed greedily into chunks of at most
+CHUNK_MAX_TOKENS. A heading starts a new chunk once the current one is reasonably
+full, so sections are not glued to the tail of the previous one. Input is consumed as
+a stream of text pieces in a single pass.
+"""
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "800"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+# A heading only forces a break once the open chunk holds this share of the budget,
+# otherwise a table of contents would produce a chunk per line.
+HEADING_MIN_FILL = 0.3
+TOKENIZER_ENCODING = "cl100k_base"
+
+# Sentence end followed by the start of a new sentence.
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?;])\s+(?=[\"'(\[]?[A-Z0-9])")
+# Filing headings; the lookbehind skips cross-references such as "see Item 7."
+_HEADING = re.compile(r"(?<![a-z,] )(?=\b(?:PART\s+I{1,3}V?\b|(?:ITEM|Item)\s+\d{1,2}[A-C]?\.\s))")
+_BOUNDARY = re.compile(f"{_SENTENCE_BREAK.pattern}|{_HEADING.pattern}")
+# Characters before the end of already-searched text where a boundary may still begin
+_BOUNDARY_LOOKBACK = 16
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            # tiktoken fetches its BPE file on first use; without it fall back to ~4 chars/token.
+            logger.warning("tiktoken unavailable (%s); estimating tokens from character counts.", e)
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def _split_by_tokens(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        for i in range(0, len(tokens), max_tokens):
+            yield encoding.decode(tokens[i:i + max_tokens])
+    else:
+        step = max_tokens * 4
+        for i in range(0, len(text), step):
+            yield text[i:i + step]
+
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    The longest prefix of `text` that fits in `max_tokens` tokens.
+    """
+    if max_tokens <= 0:
+        return ""
+    return next(_split_by_tokens(text, max_tokens), "")
+
+
+def _iter_segments(text_pieces, max_segment_chars):
+    """
+    Yields (segment, is_heading) at sentence / heading boundaries from streamed text.
+    """
+    buffer = ""
+    scanned = 0
+    for piece in text_pieces:
+        buffer += piece
+        last = 0
+        # Only the new text (plus a few characters a boundary can straddle) is searched again.
+        for match in _BOUNDARY.finditer(buffer, scanned):
+            if match.start() > last:
+                yield buffer[last:match.start()].strip(), _HEADING.match(buffer, last) is not None
+            last = match.end()
+        buffer = buffer[last:]
+        if len(buffer) > max_segment_chars:
+            # No boundary in sight (e.g. a flattened table); emit it and let the packer split it.
+            yield buffer.strip(), _HEADING.match(buffer) is not None
+            buffer = ""
+        scanned = max(0, len(buffer.rstrip()) - _BOUNDARY_LOOKBACK)
+    if buffer.strip():
+        yield buffer.strip(), _HEADING.match(buffer) is not None
+
+
+def iter_token_chunks(text_pieces, max_tokens=None, overlap_tokens=None):
+    """
+    Packs streamed text into chunks of at most `max_tokens` tokens aligned on sentence and
+    section boundaries. `text_pieces` may be a string or an iterable of strings.
+    """
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    # The overlap never takes more than half a chunk, leaving room for new text.
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    if isinstance(text_pieces, str):
+        text_pieces = [text_pieces]
+
+    current = []
+    current_tokens = 0
+    fresh = 0
+
+    def flush(keep_overlap=True):
+        nonlocal current, current_tokens, fresh
+        chunk = " ".join(segment for segment, _ in current)
+        carried = []
+        carried_tokens = 0
+        # Carry trailing sentences forward as overlap, newest first, while they fit.
+        for segment, tokens in reversed(current if keep_overlap else []):
+            if carried_tokens + tokens > overlap_tokens:
+                break
+            carried.insert(0, (segment, tokens))
+            carried_tokens += tokens
+        current, current_tokens, fresh = carried, carried_tokens, 0
+        return chunk
+
+    for segment, is_heading in _iter_segments(text_pieces, max_tokens * 8):
+        if not segment:
+            continue
+        # +1 for the joining space
+        tokens = count_tokens(segment) + 1
+        if tokens > max_tokens:
+            if fresh:
+                yield flush(keep_overlap=False)
+            for piece in _split_by_tokens(segment, max_tokens - 1):
+                yield piece
+            current, current_tokens, fresh = [], 0, 0
+            continue
+
+        starts_section = is_heading and current_tokens >= max_tokens * HEADING_MIN_FILL
+        if fresh and (starts_section or current_tokens + tokens > max_tokens):
+            # A new section starts clean rather than with the previous section's tail.
+            yield flush(keep_overlap=not starts_section)
+        while current_tokens + tokens > max_tokens:
+            # Carried overlap gives way to the new segment rather than overflowing the chunk.
+            current_tokens -= current.pop(0)[1]
+        current.append((segment, tokens))
+        current_tokens += tokens
+        fresh += 1
+
+    if fresh:
+        yield flush()
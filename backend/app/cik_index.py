@@ -0,0 +1,122 @@
+"""
+On-disk ticker -> CIK index built from SEC's company_tickers.json.
+
+The index lives in a small SQLite file, is loaded lazily into an in-process dict on
+first lookup and shared by every ingestion task in the process. Once it is older than
+CIK_INDEX_MAX_AGE_HOURS it is rebuilt in a background thread while lookups keep being
+served from the loaded copy. Run `python -m app.cik_index` from cron to refresh it on a
+fixed schedule instead.
+"""
+import logging
+import os
+import time
+import sqlite3
+import threading
+from app import http_client
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+CIK_INDEX_PATH = os.getenv("CIK_INDEX_PATH", os.path.join(current_dir, "..", "cik_index.db"))
+CIK_INDEX_MAX_AGE_HOURS = float(os.getenv("CIK_INDEX_MAX_AGE_HOURS", "168"))
+SEC_TICKERS_URL = "https://www.sec.gov/files/company_tickers.json"
+SEC_USER_AGENT = os.getenv("SEC_API_USER_AGENT", "CognivestAI/1.0 (cognivest_dev@example.com)")
+
+_index = None
+_built_at = 0.0
+_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS ciks (ticker TEXT PRIMARY KEY, cik INTEGER NOT NULL, title TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def build_index(path=CIK_INDEX_PATH):
+    """
+    Downloads company_tickers.json and rewrites the on-disk index. Returns the entry count.
+    """
+    resp = http_client.get(SEC_TICKERS_URL, "sec_tickers", headers={'User-Agent': SEC_USER_AGENT})
+    resp.raise_for_status()
+    rows = [
+        (val['ticker'].upper(), int(val['cik_str']), val.get('title'))
+        for val in resp.json().values()
+    ]
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM ciks")
+            conn.executemany("INSERT OR REPLACE INTO ciks (ticker, cik, title) VALUES (?, ?, ?)", rows)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built_at', ?)", (str(time.time()),))
+    finally:
+        conn.close()
+    logger.info("Built CIK index with %d tickers at %s", len(rows), path)
+    return len(rows)
+
+
+def _read_index(path):
+    if not os.path.exists(path):
+        return None, 0.0
+    conn = _connect(path)
+    try:
+        mapping = dict(conn.execute("SELECT ticker, cik FROM ciks"))
+        row = conn.execute("SELECT value FROM meta WHERE key = 'built_at'").fetchone()
+    finally:
+        conn.close()
+    if not mapping:
+        return None, 0.0
+    return mapping, float(row[0]) if row else 0.0
+
+
+def _is_stale(built_at):
+    return time.time() - built_at > CIK_INDEX_MAX_AGE_HOURS * 3600
+
+
+def _refresh_in_background():
+    if _refreshing.is_set():
+        return
+    _refreshing.set()
+
+    def run():
+        global _index, _built_at
+        try:
+            build_index()
+            mapping, built_at = _read_index(CIK_INDEX_PATH)
+            if mapping:
+                with _lock:
+                    _index, _built_at = mapping, built_at
+        except Exception as e:
+            logger.warning("CIK index refresh failed, keeping current index: %s", e)
+        finally:
+            _refreshing.clear()
+
+    threading.Thread(target=run, name="cik-index-refresh", daemon=True).start()
+
+
+def _load():
+    global _index, _built_at
+    with _lock:
+        if _index is None:
+            mapping, built_at = _read_index(CIK_INDEX_PATH)
+            if mapping is None:
+                build_index()
+                mapping, built_at = _read_index(CIK_INDEX_PATH)
+            _index, _built_at = mapping or {}, built_at
+        index, built_at = _index, _built_at
+    if _is_stale(built_at):
+        _refresh_in_background()
+    return index
+
+
+def get_cik(ticker: str):
+    """
+    Returns the integer CIK for `ticker`, or None if SEC does not list it.
+    """
+    return _load().get(ticker.upper())
+
+
+if __name__ == "__main__":
+    build_index()
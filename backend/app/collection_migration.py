@@ -0,0 +1,93 @@
+"""
+Moves vectors from the shared `cognivest_docs` collection into per-ticker collections.
+
+    python -m app.collection_migration [--page-size 1000] [--delete-source]
+
+Vectors are copied page by page with their stored embeddings (nothing is re-embedded)
+and upserted, so the migration can be interrupted and re-run. The source collection is
+only deleted with --delete-source and after every shard holds at least as many vectors
+as were copied into it.
+"""
+import argparse
+from collections import Counter
+from app import rag_pipeline, query_cache, database
+
+MIGRATION_PAGE_SIZE = 1000
+
+
+def _source_collection():
+    try:
+        return rag_pipeline.get_chroma_client().get_collection(name=rag_pipeline.SHARED_COLLECTION_NAME)
+    except Exception:
+        return None
+
+
+def migrate(page_size=MIGRATION_PAGE_SIZE, delete_source=False):
+    """
+    Copies every vector into its ticker's shard. Returns {ticker: vectors copied}.
+    """
+    source = _source_collection()
+    if source is None:
+        print(f"No '{rag_pipeline.SHARED_COLLECTION_NAME}' collection found; nothing to migrate.")
+        return {}
+
+    total = source.count()
+    print(f"Migrating {total} vectors from '{rag_pipeline.SHARED_COLLECTION_NAME}'...")
+    copied = Counter()
+    skipped = 0
+    offset = 0
+    while offset < total:
+        page = source.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+
+        by_ticker = {}
+        for i, doc_id in enumerate(page["ids"]):
+            ticker = (page["metadatas"][i] or {}).get("ticker")
+            if not ticker:
+                skipped += 1
+                continue
+            group = by_ticker.setdefault(ticker, {"ids": [], "embeddings": [], "documents": [], "metadatas": []})
+            group["ids"].append(doc_id)
+            group["embeddings"].append(page["embeddings"][i])
+            group["documents"].append(page["documents"][i])
+            group["metadatas"].append(page["metadatas"][i])
+
+        for ticker, group in by_ticker.items():
+            # Route explicitly to the ticker shard whatever CHROMA_COLLECTION_LAYOUT is set to.
+            shard = rag_pipeline.get_chroma_client().get_or_create_collection(
+                name=rag_pipeline.ticker_collection_name(ticker)
+            )
+            shard.upsert(**group)
+            copied[ticker] += len(group["ids"])
+        print(f"  {offset}/{total} vectors processed")
+
+    if skipped:
+        print(f"Skipped {skipped} vectors without ticker metadata.")
+    for ticker in copied:
+        query_cache.invalidate_ticker(ticker)
+
+    if delete_source:
+        short = {
+            ticker: count for ticker, count in copied.items()
+            if rag_pipeline.get_chroma_client().get_collection(name=rag_pipeline.ticker_collection_name(ticker)).count() < count
+        }
+        if short or skipped:
+            print(f"Keeping source collection: {len(short)} shards incomplete, {skipped} vectors unrouted.")
+        else:
+            rag_pipeline.get_chroma_client().delete_collection(name=rag_pipeline.SHARED_COLLECTION_NAME)
+            rag_pipeline.forget_collection(rag_pipeline.SHARED_COLLECTION_NAME)
+            print(f"Deleted '{rag_pipeline.SHARED_COLLECTION_NAME}'.")
+
+    print(f"Migrated {sum(copied.values())} vectors into {len(copied)} ticker collections.")
+    return dict(copied)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split the shared vector collection into per-ticker collections.")
+    parser.add_argument("--page-size", type=int, default=MIGRATION_PAGE_SIZE)
+    parser.add_argument("--delete-source", action="store_true")
+    args = parser.parse_args()
+    database.init_db()
+    migrate(args.page_size, args.delete_source)
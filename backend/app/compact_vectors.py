@@ -0,0 +1,355 @@
+"""
+Compact (float16 / int8) copies of each ticker collection's vectors for search.
+
+With VECTOR_STORAGE set to "float16" or "int8", `rag_pipeline.search_vectors` scans these
+arrays instead of querying Chroma's float32 HNSW index:
+
+    float16  exact-order scan of half-precision vectors (half the memory of float32)
+    int8     scan of per-vector scaled int8 codes (about a quarter), then the best
+             n_results * RESCORE_MULTIPLIER candidates are rescored against the float16
+             copy, which is memory-mapped so only those rows are read
+
+Vectors are unit length (see `embedding_engine.normalize_embedding`), so scores are dot
+products and distances are reported as 2 - 2 * cosine, matching Chroma's squared L2.
+
+Each collection is a directory of append-only segments (`<segment>.npz` with ids, int8
+codes and scales, plus `<segment>.f16.npy`) listed by `manifest.json`. An upsert writes
+one new segment holding just its vectors; a re-upserted id is served from its newest
+segment. Segments are merged into one when the appended rows outgrow the oldest segment
+or there are more than MAX_SEGMENTS, so each vector is rewritten O(log n) times. Writers
+in any process serialize on a file lock, the manifest is swapped in last, and files it
+no longer lists are kept for RETIRED_FILE_SECONDS so readers still holding the previous
+manifest can finish loading it. Build or refresh the copies of an existing store with
+`python -m app.compact_vectors`.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+import uuid
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+# "float32": Chroma's own index only; "float16" or "int8": search the compact copies
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+COMPACT_VECTOR_DIR = os.getenv("COMPACT_VECTOR_DIR", os.path.join(current_dir, "..", "compact_vectors"))
+# int8 candidates rescored at float16 precision, as a multiple of n_results
+RESCORE_MULTIPLIER = int(os.getenv("RESCORE_MULTIPLIER", "4"))
+
+# Rows converted to float32 at a time while scanning, bounding the per-query scratch memory
+SCAN_BLOCK_ROWS = 2048
+MAX_SEGMENTS = 16
+RETIRED_FILE_SECONDS = 600
+
+_loaded = {}
+_write_lock = threading.Lock()
+
+
+def quantize_int8(vectors):
+    """
+    Symmetric per-vector int8 quantization. Returns (codes, scales) with
+    vectors ~= codes * scales[:, None].
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _scan(matrix, query):
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+        np.dot(block, query, out=scores[start:start + len(block)])
+    return scores
+
+
+class SegmentRows:
+    """
+    Row view over the memory-mapped float16 arrays of several segments, limited to the
+    live rows; indexing with a slice or an array of row numbers reads just those rows.
+    """
+
+    def __init__(self, arrays, live):
+        self._arrays = arrays
+        self._offsets = np.cumsum([0] + [len(a) for a in arrays])
+        self._live = live
+        self.shape = (len(live), arrays[0].shape[1] if arrays else 0)
+
+    def __len__(self):
+        return len(self._live)
+
+    @property
+    def nbytes(self):
+        return self.shape[0] * self.shape[1] * 2
+
+    def __getitem__(self, index):
+        rows = self._live[index]
+        out = np.empty((len(rows), self.shape[1]), dtype=np.float16)
+        segment = np.searchsorted(self._offsets, rows, side="right") - 1
+        for s in np.unique(segment):
+            mask = segment == s
+            out[mask] = self._arrays[s][rows[mask] - self._offsets[s]]
+        return out
+
+
+class CompactVectors:
+    def __init__(self, ids, codes, scales, halves):
+        self.ids = ids
+        self.codes = codes
+        self.scales = scales
+        self.halves = halves
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self, storage):
+        if storage == "int8":
+            return self.codes.nbytes + self.scales.nbytes
+        return self.halves.nbytes
+
+    def search(self, query, n_results, storage):
+        """
+        Returns [(id, distance)] for the n_results nearest vectors.
+        """
+        if not len(self.ids):
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        n_results = min(n_results, len(self.ids))
+        if storage == "int8":
+            approx = _scan(self.codes, query) * self.scales
+            shortlist = min(len(self.ids), n_results * RESCORE_MULTIPLIER)
+            rows = np.argpartition(-approx, shortlist - 1)[:shortlist]
+            rows.sort()
+            scores = np.asarray(self.halves[rows], dtype=np.float32) @ query
+        else:
+            rows = np.arange(len(self.ids))
+            scores = _scan(self.halves, query)
+        best = np.argsort(-scores)[:n_results]
+        return [(str(self.ids[rows[i]]), max(0.0, float(2.0 - 2.0 * scores[i]))) for i in best]
+
+
+def _directory(name):
+    return os.path.join(COMPACT_VECTOR_DIR, name)
+
+
+def _manifest_path(name):
+    return os.path.join(_directory(name), "manifest.json")
+
+
+def _segment_paths(name, segment):
+    return os.path.join(_directory(name), f"{segment}.npz"), os.path.join(_directory(name), f"{segment}.f16.npy")
+
+
+def _read_manifest(name):
+    try:
+        with open(_manifest_path(name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _load_segments(name, manifest):
+    ids, codes, scales, halves = [], [], [], []
+    for segment in manifest["segments"]:
+        npz_path, halves_path = _segment_paths(name, segment["id"])
+        with np.load(npz_path) as data:
+            ids.append(data["ids"])
+            codes.append(data["codes"])
+            scales.append(data["scales"])
+        halves.append(np.load(halves_path, mmap_mode="r"))
+    if not ids:
+        return CompactVectors(np.asarray([], dtype=str), np.empty((0, 0), np.int8), np.empty(0, np.float32),
+                              SegmentRows([], np.empty(0, np.int64)))
+    all_ids = np.concatenate(ids)
+    # The newest copy of a re-upserted id wins: keep each id's last row.
+    _, last_from_end = np.unique(all_ids[::-1], return_index=True)
+    live = np.sort(len(all_ids) - 1 - last_from_end)
+    return CompactVectors(all_ids[live], np.concatenate(codes)[live], np.concatenate(scales)[live],
+                          SegmentRows(halves, live))
+
+
+def load(name):
+    """
+    The collection's compact vectors, or None if none were written. Reloaded when another
+    process has written to them.
+    """
+    for attempt in range(3):
+        try:
+            stat = os.stat(_manifest_path(name))
+        except FileNotFoundError:
+            _loaded.pop(name, None)
+            return None
+        # Every manifest write is a rename, so a new inode means new contents.
+        version = (stat.st_ino, stat.st_mtime_ns)
+        cached = _loaded.get(name)
+        if cached and cached[0] == version:
+            return cached[1]
+        manifest = _read_manifest(name)
+        if manifest is None:
+            continue
+        try:
+            vectors = _load_segments(name, manifest)
+        except FileNotFoundError:
+            # A merge retired a segment between reading the manifest and opening it.
+            continue
+        _loaded[name] = (version, vectors)
+        return vectors
+    raise RuntimeError(f"Compact vectors for {name} kept changing while loading")
+
+
+@contextlib.contextmanager
+def _locked(name):
+    """
+    Serializes writers to one collection across threads and processes.
+    """
+    os.makedirs(_directory(name), exist_ok=True)
+    with _write_lock, open(os.path.join(_directory(name), ".lock"), "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_segment(name, ids, halves):
+    segment = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    npz_path, halves_path = _segment_paths(name, segment)
+    codes, scales = quantize_int8(halves)
+    # Written under temporary names: only the manifest makes a segment visible.
+    np.save(halves_path + ".tmp.npy", halves)
+    os.replace(halves_path + ".tmp.npy", halves_path)
+    np.savez(npz_path + ".tmp.npz", ids=np.asarray(ids, dtype=str), codes=codes, scales=scales)
+    os.replace(npz_path + ".tmp.npz", npz_path)
+    return {"id": segment, "rows": len(ids)}
+
+
+def _write_manifest(name, manifest):
+    tmp = _manifest_path(name) + f".{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, _manifest_path(name))
+
+
+def _remove_retired(name, manifest):
+    """
+    Deletes segment files the manifest no longer lists once they are old enough that no
+    reader can still be loading them.
+    """
+    keep = {segment["id"] for segment in manifest["segments"]}
+    cutoff = time.time() - RETIRED_FILE_SECONDS
+    for entry in os.scandir(_directory(name)):
+        segment = entry.name.split(".", 1)[0]
+        if entry.name.startswith(".") or entry.name.startswith("manifest") or segment in keep:
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def _rewrite(name, manifest, ids, halves):
+    """
+    Replaces every segment with one holding `ids` / `halves`.
+    """
+    segments = [_write_segment(name, ids, halves)] if len(ids) else []
+    retired = manifest["segments"] if manifest else []
+    manifest = {"dims": int(halves.shape[1]) if len(ids) else (manifest or {}).get("dims"), "segments": segments}
+    _write_manifest(name, manifest)
+    # Retired segments age out from now, not from when they were written.
+    for segment in retired:
+        for path in _segment_paths(name, segment["id"]):
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(path)
+    _remove_retired(name, manifest)
+
+
+def upsert(name, ids, embeddings):
+    """
+    Adds or replaces vectors by id, appending one segment.
+    """
+    new = np.asarray(embeddings, dtype=np.float16)
+    if not len(new):
+        return
+    with _locked(name):
+        manifest = _read_manifest(name) or {"dims": int(new.shape[1]), "segments": []}
+        if manifest["dims"] is not None and manifest["segments"] and manifest["dims"] != new.shape[1]:
+            raise ValueError(
+                f"{name} holds {manifest['dims']}-dimension vectors, got {new.shape[1]}; re-ingest after changing EMBEDDING_DIMENSIONS"
+            )
+        manifest["dims"] = int(new.shape[1])
+        manifest["segments"].append(_write_segment(name, list(ids), new))
+        oldest = manifest["segments"][0]["rows"]
+        appended = sum(segment["rows"] for segment in manifest["segments"][1:])
+        if len(manifest["segments"]) > MAX_SEGMENTS or (len(manifest["segments"]) > 1 and appended >= oldest):
+            current = _load_segments(name, manifest)
+            _rewrite(name, manifest, current.ids, current.halves[:])
+        else:
+            _write_manifest(name, manifest)
+
+
+def delete(name, ids):
+    """
+    Removes vectors by id. Returns how many were removed.
+    """
+    with _locked(name):
+        manifest = _read_manifest(name)
+        if manifest is None:
+            return 0
+        current = _load_segments(name, manifest)
+        doomed = set(ids)
+        keep = np.array([str(i) not in doomed for i in current.ids], dtype=bool)
+        removed = int((~keep).sum())
+        if removed:
+            rows = np.flatnonzero(keep)
+            _rewrite(name, manifest, current.ids[keep], current.halves[rows])
+        return removed
+
+
+def rebuild(name, collection, page_size=1000):
+    """
+    Replaces the compact copy of one collection with the float32 vectors stored in Chroma.
+    Returns the number of vectors written.
+    """
+    ids, vectors = [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        if not len(page["ids"]):
+            break
+        offset += len(page["ids"])
+        ids.extend(page["ids"])
+        vectors.extend(page["embeddings"])
+    halves = np.asarray(vectors, dtype=np.float16).reshape(len(ids), -1)
+    with _locked(name):
+        _rewrite(name, _read_manifest(name), np.asarray(ids, dtype=str), halves)
+    return len(ids)
+
+
+def rebuild_from_vector_store(page_size=1000):
+    """
+    Writes compact copies of every collection from the float32 vectors in ChromaDB.
+    """
+    from app import rag_pipeline
+
+    for name in rag_pipeline.list_collection_names():
+        collection = rag_pipeline.get_chroma_client().get_collection(name=name)
+        count = rebuild(name, collection, page_size)
+        print(f"Wrote compact vectors for '{name}' ({count} vectors)")
+
+
+if __name__ == "__main__":
+    rebuild_from_vector_store()
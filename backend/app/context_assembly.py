@@ -0,0 +1,123 @@
+"""
+Turns retrieved hits into a bounded prompt context.
+
+Hits are taken in relevance order (the order retrieval ranked them). Near-duplicates are
+dropped using word-shingle overlap, text shared with an already selected chunk at its
+edges (overlapping chunk windows) is trimmed, and what remains is packed into
+CONTEXT_TOKEN_BUDGET tokens. Each call reports how many prompt tokens this saved
+against concatenating every hit.
+"""
+import os
+import re
+from app import chunking
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Share of a chunk's shingles already present in a selected chunk that makes it a duplicate
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+SHINGLE_WORDS = 5
+# Shortest shared edge worth trimming; shorter matches are coincidence.
+MIN_OVERLAP_CHARS = 40
+# Do not bother adding a truncated chunk with less room than this left.
+MIN_PARTIAL_TOKENS = 64
+SEPARATOR = "\n\n"
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """
+    Hashes of every run of `size` consecutive (lower-cased) words.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def _containment(candidate, selected):
+    if not candidate:
+        return 1.0
+    return len(candidate & selected) / len(candidate)
+
+
+def _trim_edge_overlap(text, selected_texts):
+    """
+    Removes a prefix of `text` that repeats the end of a selected chunk, or a suffix that
+    repeats the start of one. Returns (text, characters removed).
+    """
+    original = len(text)
+    for other in selected_texts:
+        probe = text[:MIN_OVERLAP_CHARS]
+        if len(probe) == MIN_OVERLAP_CHARS:
+            pos = other.find(probe)
+            if pos != -1 and text.startswith(other[pos:]):
+                text = text[len(other) - pos:].lstrip()
+        probe = text[-MIN_OVERLAP_CHARS:]
+        if len(probe) == MIN_OVERLAP_CHARS:
+            pos = other.find(probe)
+            end = pos + MIN_OVERLAP_CHARS
+            if pos != -1 and text.endswith(other[:end]):
+                text = text[:len(text) - end].rstrip()
+    return text, original - len(text)
+
+
+def assemble_context(hits, token_budget=None, duplicate_threshold=None):
+    """
+    Returns (context, used_hits, report) for hits shaped like `rag_pipeline.search_vectors`
+    results.
+    """
+    token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+    duplicate_threshold = CONTEXT_DUPLICATE_THRESHOLD if duplicate_threshold is None else duplicate_threshold
+    separator_tokens = chunking.count_tokens(SEPARATOR)
+
+    report = {
+        "chunks_in": len(hits),
+        "chunks_used": 0,
+        "duplicates_removed": 0,
+        "overlap_chars_trimmed": 0,
+        "truncated": 0,
+        "dropped_over_budget": 0,
+        "tokens_in": 0,
+        "tokens_used": 0,
+        "tokens_saved": 0,
+    }
+    seen_shingles = set()
+    parts = []
+    used = []
+    used_tokens = 0
+
+    for hit in hits:
+        text = (hit.get('document') or "").strip()
+        if not text:
+            continue
+        report["tokens_in"] += chunking.count_tokens(text) + separator_tokens
+
+        chunk_shingles = shingles(text)
+        if _containment(chunk_shingles, seen_shingles) >= duplicate_threshold:
+            report["duplicates_removed"] += 1
+            continue
+        text, trimmed = _trim_edge_overlap(text, parts)
+        report["overlap_chars_trimmed"] += trimmed
+        if not text:
+            report["duplicates_removed"] += 1
+            continue
+
+        tokens = chunking.count_tokens(text) + separator_tokens
+        room = token_budget - used_tokens
+        if tokens > room:
+            if room - separator_tokens < MIN_PARTIAL_TOKENS:
+                report["dropped_over_budget"] += 1
+                continue
+            text = chunking.truncate_to_tokens(text, room - separator_tokens)
+            tokens = chunking.count_tokens(text) + separator_tokens
+            report["truncated"] += 1
+
+        parts.append(text)
+        used.append(hit)
+        used_tokens += tokens
+        seen_shingles |= chunk_shingles
+
+    report["chunks_used"] = len(used)
+    report["tokens_used"] = used_tokens
+    report["tokens_saved"] = max(0, report["tokens_in"] - used_tokens)
+    return SEPARATOR.join(parts), used, report
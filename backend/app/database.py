@@ -1,12 +1,16 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime
+from sqlalchemy import create_engine, inspect, text, Column, String, Integer, DateTime, Text, UniqueConstraint, Index
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 import datetime
+import logging
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
 
 engine = create_engine(
@@ -22,9 +26,66 @@ class Task(Base):
     id = Column(String, primary_key=True, index=True)
     status = Column(String, default="PENDING")
     message = Column(String)
+    # JSON: per-stage timings, e.g. {"fetch": {"sec": {"seconds": 4.2, "status": "ok", "documents": 152}}}
+    timings = Column(Text)
+    # Job queue fields (see app.worker)
+    ticker = Column(String, index=True)
+    attempts = Column(Integer, default=0)
+    run_after = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+# At most one queued or running job per ticker, so concurrent requests cannot both enqueue one
+_ACTIVE_TASK = Task.status.in_(("PENDING", "PROCESSING"))
+Index("uq_tasks_active_ticker", Task.ticker, unique=True, sqlite_where=_ACTIVE_TASK, postgresql_where=_ACTIVE_TASK)
+
+class SecLedger(Base):
+    """
+    Per-ticker HTTP validators for the EDGAR submissions feed, used for conditional re-fetches.
+    """
+    __tablename__ = "sec_ledger"
+
+    ticker = Column(String, primary_key=True, index=True)
+    etag = Column(String)
+    last_modified = Column(String)
+    checked_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class IndexedFiling(Base):
+    """
+    SEC filings whose chunks have been embedded and stored, by accession number.
+    """
+    __tablename__ = "indexed_filings"
+    __table_args__ = (UniqueConstraint("ticker", "accession_number", name="uq_indexed_filing"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ticker = Column(String, index=True)
+    accession_number = Column(String, index=True)
+    form = Column(String)
+    report_date = Column(String)
+    indexed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class IngestionBatch(Base):
+    """
+    A bulk ingestion request; `task_ids` is a JSON list of the member Task ids.
+    """
+    __tablename__ = "ingestion_batches"
+
+    id = Column(String, primary_key=True, index=True)
+    task_ids = Column(Text)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class TickerGeneration(Base):
+    """
+    Per-ticker corpus version, bumped whenever a ticker's stored documents change, so every
+    process can tell that its cached retrievals and answers for the ticker are stale.
+    """
+    __tablename__ = "ticker_generations"
+
+    ticker = Column(String, primary_key=True)
+    generation = Column(Integer, default=0, nullable=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -32,5 +93,51 @@ def get_db():
     finally:
         db.close()
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+_initialized = False
+
+def add_missing_columns():
+    """
+    Adds columns declared on the models but missing from existing tables (create_all never
+    alters a table), e.g. the Task timing and queue fields on a database created earlier.
+    Existing rows get the column's scalar default, or NULL. Returns the "table.column" names added.
+    """
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+                if column.default is not None and column.default.is_scalar:
+                    conn.execute(text(f'UPDATE {table.name} SET "{column.name}" = :value'), {"value": column.default.arg})
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+def add_missing_indexes():
+    """
+    Creates indexes declared on the models but missing from existing tables. A unique index
+    that existing rows violate is skipped with a warning.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with engine.begin() as conn:
+                    index.create(bind=conn, checkfirst=True)
+            except IntegrityError as e:
+                logger.warning("Could not create index %s: %s", index.name, e)
+
+def init_db():
+    """
+    Creates missing tables and columns. Called once at API / worker startup rather than on import.
+    """
+    global _initialized
+    if not _initialized:
+        Base.metadata.create_all(bind=engine)
+        add_missing_columns()
+        add_missing_indexes()
+        _initialized = True
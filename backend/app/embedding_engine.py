@@ -0,0 +1,193 @@
+import logging
+import math
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.embedding_cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "gemini-embedding-001"
+# gemini-embedding-001 returns 3072 dimensions. Smaller sizes (768 and 1536 are the
+# recommended ones) come back un-normalized, so vectors are normalized before storage or
+# search. Changing this requires re-ingesting: stored and query vectors must match.
+FULL_EMBEDDING_DIMENSIONS = 3072
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", str(FULL_EMBEDDING_DIMENSIONS)))
+
+# embed_content accepts up to 100 contents per request.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "50"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+
+def normalize_embedding(values):
+    norm = math.sqrt(sum(v * v for v in values))
+    return [v / norm for v in values] if norm else list(values)
+
+
+def cache_model_name(model, dimensions):
+    # Full-size vectors keep the plain model name so existing cache entries stay valid.
+    return model if dimensions == FULL_EMBEDDING_DIMENSIONS else f"{model}@{dimensions}"
+
+
+def is_rate_limit_error(error):
+    """
+    True for quota / overload errors that should be retried after a backoff.
+    """
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in (429, 503):
+        return True
+    message = str(error)
+    return "RESOURCE_EXHAUSTED" in message or "429" in message
+
+
+class EmbeddingEngine:
+    """
+    Embeds documents in multi-text batches with a bounded number of requests in flight.
+
+    Rate-limit errors put every worker into a shared cooldown that doubles on each
+    consecutive 429 and decays again after successful batches, instead of sleeping
+    a fixed amount between batches. With a `cache`, texts already embedded under the
+    same (model, task_type, normalized text) are served locally and never sent. A shared
+    `rate_limiter` (see app.rate_limit) paces requests across concurrent jobs.
+    """
+
+    def __init__(self, client=None, model=EMBEDDING_MODEL, task_type="RETRIEVAL_DOCUMENT",
+                 dimensions=EMBEDDING_DIMENSIONS, batch_size=EMBED_BATCH_SIZE, max_in_flight=EMBED_MAX_IN_FLIGHT,
+                 max_retries=EMBED_MAX_RETRIES, initial_backoff=1.0, max_backoff=60.0, cache=None, rate_limiter=None):
+        if client is None:
+            from app import rag_pipeline
+            client = rag_pipeline.get_client()
+        self.client = client
+        self.model = model
+        self.task_type = task_type
+        self.dimensions = dimensions
+        self.batch_size = max(1, min(batch_size, 100))
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+
+        self._lock = threading.Lock()
+        self._backoff = 0.0
+        self._resume_at = 0.0
+        self.batch_stats = []
+        self.last_run = {}
+
+    def _config(self):
+        from google.genai import types
+        if self.task_type == "RETRIEVAL_DOCUMENT":
+            return types.EmbedContentConfig(
+                task_type=self.task_type, title="Embedding of stock document", output_dimensionality=self.dimensions
+            )
+        return types.EmbedContentConfig(task_type=self.task_type, output_dimensionality=self.dimensions)
+
+    def _wait_for_cooldown(self):
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def _on_rate_limited(self):
+        with self._lock:
+            self._backoff = min(self.max_backoff, self._backoff * 2 if self._backoff else self.initial_backoff)
+            self._resume_at = max(self._resume_at, time.monotonic() + self._backoff)
+            return self._backoff
+
+    def _on_success(self):
+        with self._lock:
+            self._backoff = self._backoff / 2 if self._backoff > self.initial_backoff else 0.0
+
+    def _embed_batch(self, batch_number, total_batches, texts):
+        retries = 0
+        while True:
+            self._wait_for_cooldown()
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                result = self.client.models.embed_content(
+                    model=self.model,
+                    contents=texts,
+                    config=self._config()
+                )
+                vectors = [normalize_embedding(e.values) if e.values else None for e in result.embeddings]
+            except Exception as e:
+                if is_rate_limit_error(e) and retries < self.max_retries:
+                    retries += 1
+                    delay = self._on_rate_limited()
+                    logger.warning("Embedding batch %d/%d rate limited, backing off %.1fs (retry %d)", batch_number, total_batches, delay, retries)
+                    continue
+                logger.error("Error embedding batch %d/%d: %s", batch_number, total_batches, e)
+                return [None] * len(texts), retries
+
+            self._on_success()
+            latency = time.perf_counter() - start
+            stat = {
+                "batch": batch_number,
+                "size": len(texts),
+                "latency_s": round(latency, 4),
+                "texts_per_s": round(len(texts) / latency, 2) if latency > 0 else None,
+                "retries": retries,
+            }
+            with self._lock:
+                self.batch_stats.append(stat)
+            logger.debug("Embedded batch %d/%d: %d texts in %.2fs", batch_number, total_batches, len(texts), latency)
+            return vectors, retries
+
+    def embed(self, texts):
+        """
+        Embeds `texts`, returning one vector per input (None where embedding failed).
+        """
+        texts = list(texts)
+        self.batch_stats = []
+        embeddings = [None] * len(texts)
+
+        cache_model = cache_model_name(self.model, self.dimensions)
+        keys = [cache_key(cache_model, self.task_type, t) for t in texts] if self.cache is not None else []
+        cached = self.cache.get_many(keys) if self.cache is not None else {}
+        pending = []
+        for i, text in enumerate(texts):
+            if cached and keys[i] in cached:
+                embeddings[i] = cached[keys[i]]
+            else:
+                pending.append(i)
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        start = time.perf_counter()
+        results = []
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+                futures = [
+                    executor.submit(self._embed_batch, n + 1, len(batches), [texts[i] for i in batch])
+                    for n, batch in enumerate(batches)
+                ]
+                results = [f.result() for f in futures]
+        elapsed = time.perf_counter() - start
+
+        fresh = []
+        for batch, (vectors, _) in zip(batches, results):
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector
+                if self.cache is not None and vector is not None:
+                    fresh.append((keys[i], vector))
+        if fresh:
+            self.cache.put_many(fresh)
+
+        embedded = sum(1 for i in pending if embeddings[i] is not None)
+        self.last_run = {
+            "texts": len(texts),
+            "cache_hits": len(texts) - len(pending),
+            "embedded": embedded,
+            "batches": len(batches),
+            "seconds": round(elapsed, 3),
+            "texts_per_s": round(embedded / elapsed, 2) if embedded and elapsed > 0 else None,
+            "retries": sum(r for _, r in results),
+        }
+        logger.info("Embedding run finished", extra={"embedding_run": self.last_run})
+        return embeddings
@@ -0,0 +1,143 @@
+"""
+Local stand-ins for the Gemini client, for exercising the pipeline without network access.
+"""
+import asyncio
+import hashlib
+import math
+import random
+import threading
+import time
+
+
+class FakeRateLimitError(Exception):
+    code = 429
+
+    def __init__(self):
+        super().__init__("429 RESOURCE_EXHAUSTED (fake)")
+
+
+class _Embedding:
+    def __init__(self, values):
+        self.values = values
+
+
+class _EmbedResult:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+
+class _GenerateResult:
+    def __init__(self, text):
+        self.text = text
+
+
+def fake_vector(text, dimensions):
+    """
+    Deterministic unit vector derived from the text hash.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    values = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+def fake_answer(contents):
+    """
+    Deterministic answer that echoes the question and the amount of context it was given.
+    """
+    prompt = contents if isinstance(contents, str) else str(contents)
+    question = prompt.rsplit("Question:", 1)[-1].strip()
+    return f"Based on {len(prompt)} characters of context: a deterministic answer to '{question}'."
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def _embed(self, contents):
+        owner = self.owner
+        with owner._lock:
+            owner.embed_calls += 1
+            call_number = owner.embed_calls
+        if owner.rate_limit_every and call_number % owner.rate_limit_every == 0:
+            raise FakeRateLimitError()
+        if isinstance(contents, str):
+            contents = [contents]
+        with owner._lock:
+            owner.embedded_texts += len(contents)
+        return _EmbedResult([_Embedding(fake_vector(text, owner.dimensions)) for text in contents])
+
+    def _generate(self, contents):
+        with self.owner._lock:
+            self.owner.generate_calls += 1
+        return _GenerateResult(fake_answer(contents))
+
+    def embed_content(self, model, contents, config=None):
+        if self.owner.latency:
+            time.sleep(self.owner.latency)
+        return self._embed(contents)
+
+    def generate_content(self, model, contents, config=None):
+        if self.owner.generation_latency:
+            time.sleep(self.owner.generation_latency)
+        return self._generate(contents)
+
+    def generate_content_stream(self, model, contents, config=None):
+        words = self._generate(contents).text.split(" ")
+        for i, word in enumerate(words):
+            if self.owner.generation_latency:
+                time.sleep(self.owner.generation_latency / len(words))
+            yield _GenerateResult(word if i == 0 else " " + word)
+
+
+class _FakeAsyncModels(_FakeModels):
+    async def embed_content(self, model, contents, config=None):
+        if self.owner.latency:
+            await asyncio.sleep(self.owner.latency)
+        return self._embed(contents)
+
+    async def generate_content(self, model, contents, config=None):
+        if self.owner.generation_latency:
+            await asyncio.sleep(self.owner.generation_latency)
+        return self._generate(contents)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        # Like the real client: awaiting the call yields an async iterator of partial responses.
+        words = self._generate(contents).text.split(" ")
+        latency = self.owner.generation_latency
+
+        async def stream():
+            for i, word in enumerate(words):
+                if latency:
+                    await asyncio.sleep(latency / len(words))
+                yield _GenerateResult(word if i == 0 else " " + word)
+
+        return stream()
+
+
+class _FakeAio:
+    def __init__(self, owner):
+        self.models = _FakeAsyncModels(owner)
+
+
+class FakeGeminiClient:
+    """
+    Mimics the subset of `genai.Client` the pipeline uses, sync (`models`) and async (`aio.models`).
+
+    `latency` / `generation_latency` add a fixed delay per embedding / generation call and
+    `rate_limit_every` makes every Nth embedding call fail with a 429, so batching,
+    backoff and concurrency can be observed locally.
+    """
+
+    def __init__(self, dimensions=768, latency=0.0, rate_limit_every=0, generation_latency=0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.generation_latency = generation_latency
+        self.rate_limit_every = rate_limit_every
+        self.embed_calls = 0
+        self.embedded_texts = 0
+        self.generate_calls = 0
+        self._lock = threading.Lock()
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
@@ -0,0 +1,344 @@
+"""
+Shared client for upstream HTTP sources (SEC EDGAR, Alpha Vantage).
+
+One keep-alive `requests.Session` per host with a bounded connection pool, gzip
+negotiation, (connect, read) timeouts and retries on transient 5xx. Responses are kept in
+an on-disk cache with a freshness window per source; stale entries with an ETag or
+Last-Modified are revalidated with a conditional request. Only requests that reach the
+network draw from the source's shared rate limiter.
+
+HTTP_MODE selects how the cache is used:
+    live    serve fresh cache entries, fetch everything else (default)
+    record  always fetch, and store every response
+    replay  serve only from the cache and never touch the network, for offline tests and
+            benchmarks over a directory captured with "record"
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urlsplit, urlencode, parse_qsl, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app import rate_limit, observability
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join(current_dir, "..", "http_cache"))
+HTTP_CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "2048"))
+HTTP_MODE = os.getenv("HTTP_MODE", "live")
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+CONNECT_TIMEOUT = 5.0
+
+
+
+def _alpha_vantage_cacheable(response):
+    # Rate-limit and quota notices come back as 200s with a Note/Information body.
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    return not (isinstance(body, dict) and ({"Note", "Information", "Error Message"} & body.keys()))
+
+
+# ttl: seconds a cached response is served without asking the upstream again
+# timeout: read timeout; limiter: rate_limit bucket drawn from on network requests
+# cacheable: optional predicate on a 200 response; responses it rejects are not stored
+SOURCES = {
+    "sec_tickers": {"ttl": 24 * 3600, "timeout": 60, "limiter": "sec"},
+    "sec_submissions": {"ttl": 600, "timeout": 30, "limiter": "sec"},
+    # Archived filings never change once published.
+    "sec_archives": {"ttl": 30 * 24 * 3600, "timeout": 30, "limiter": "sec"},
+    "alpha_vantage": {"ttl": 900, "timeout": 20, "limiter": "alpha_vantage", "cacheable": _alpha_vantage_cacheable},
+}
+
+# Query parameters left out of cache keys, so recordings do not depend on credentials.
+SECRET_PARAMS = {"apikey"}
+CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since"}
+STREAM_CHUNK_BYTES = 64 * 1024
+# The cache directory is pruned after this many bytes written or seconds elapsed
+PRUNE_EVERY_BYTES = 64 * 1024 * 1024
+PRUNE_EVERY_SECONDS = 600
+
+requests_total = observability.counter(
+    "cognivest_http_requests_total", "Upstream HTTP requests by source and cache result.",
+    labels=("source", "result")
+)
+
+
+class ReplayMissError(requests.exceptions.ConnectionError):
+    """
+    Raised in replay mode for a request that was never recorded.
+    """
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_prune_lock = threading.Lock()
+_written_since_prune = 0
+_last_prune = 0.0
+
+
+def _session(host):
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            retries = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = "gzip, deflate"
+            _sessions[host] = session
+        return session
+
+
+def cache_key(url):
+    parts = urlsplit(url)
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if k.lower() not in SECRET_PARAMS))
+    normalized = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ""))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class UpstreamResponse:
+    """
+    The parts of `requests.Response` callers use, backed by the network or the cache.
+    """
+
+    def __init__(self, status_code, headers, url, body=None, body_path=None, live=None,
+                 from_cache=False, on_complete=None):
+        self.status_code = status_code
+        self.headers = requests.structures.CaseInsensitiveDict(headers or {})
+        self.url = url
+        self.from_cache = from_cache
+        self._body = body
+        self._body_path = body_path
+        self._live = live
+        self._on_complete = on_complete
+
+    @property
+    def content(self):
+        if self._body is None:
+            if self._body_path is not None:
+                with open(self._body_path, "rb") as f:
+                    self._body = f.read()
+            elif self._live is not None:
+                self._body = b"".join(self.iter_content())
+        return self._body
+
+    @property
+    def text(self):
+        return self.content.decode(self.headers.get("X-Cache-Encoding") or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error for {self.url}", response=self)
+
+    def iter_content(self, chunk_size=STREAM_CHUNK_BYTES):
+        if self._body is not None:
+            for i in range(0, len(self._body), chunk_size):
+                yield self._body[i:i + chunk_size]
+        elif self._body_path is not None:
+            with open(self._body_path, "rb") as f:
+                for piece in iter(lambda: f.read(chunk_size), b""):
+                    yield piece
+        elif self._live is not None:
+            # Tee the live stream into the cache; it is only stored if read to the end.
+            sink = tempfile.NamedTemporaryFile(dir=HTTP_CACHE_DIR, delete=False) if self._on_complete else None
+            try:
+                for piece in self._live.iter_content(chunk_size=chunk_size):
+                    if sink:
+                        sink.write(piece)
+                    yield piece
+                if sink:
+                    sink.close()
+                    self._on_complete(sink.name)
+                    sink = None
+            finally:
+                if sink:
+                    sink.close()
+                    os.unlink(sink.name)
+
+    def close(self):
+        if self._live is not None:
+            self._live.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _paths(key):
+    return os.path.join(HTTP_CACHE_DIR, key + ".json"), os.path.join(HTTP_CACHE_DIR, key + ".body")
+
+
+def _read_entry(key):
+    meta_path, body_path = _paths(key)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if os.path.exists(body_path) else None
+
+
+def _write_meta(key, meta):
+    meta_path, _ = _paths(key)
+    fd, tmp = tempfile.mkstemp(dir=HTTP_CACHE_DIR)
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def _store(key, url, status, headers, encoding=None, body_file=None, body=None):
+    """
+    Writes a 200 response to the cache: the body first, then the metadata that makes it visible.
+    """
+    _, body_path = _paths(key)
+    if body_file is None:
+        fd, body_file = tempfile.mkstemp(dir=HTTP_CACHE_DIR)
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+    os.replace(body_file, body_path)
+    size = os.path.getsize(body_path)
+    kept = {k: v for k, v in headers.items() if k.lower() in ("content-type", "etag", "last-modified")}
+    if encoding:
+        kept["X-Cache-Encoding"] = encoding
+    _write_meta(key, {"url": url, "status": status, "headers": kept, "fetched_at": time.time()})
+    _maybe_prune(size)
+
+
+def record(url, body, headers=None):
+    """
+    Stores `body` as the recorded 200 response for `url`, e.g. to build replay fixtures.
+    """
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    _store(cache_key(url), url, 200, headers or {}, body=body)
+
+
+def _maybe_prune(written):
+    """
+    Prunes once enough has been written or enough time has passed, rather than listing
+    the directory on every store.
+    """
+    global _written_since_prune, _last_prune
+    with _prune_lock:
+        _written_since_prune += written
+        now = time.monotonic()
+        if _written_since_prune < PRUNE_EVERY_BYTES and now - _last_prune < PRUNE_EVERY_SECONDS:
+            return
+        _written_since_prune = 0
+        _last_prune = now
+    _prune()
+
+
+def _prune():
+    limit = HTTP_CACHE_MAX_MB * 1024 * 1024
+    entries = []
+    total = 0
+    for name in os.listdir(HTTP_CACHE_DIR):
+        if name.endswith(".body"):
+            path = os.path.join(HTTP_CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-5]))
+            total += stat.st_size
+    for _, size, key in sorted(entries):
+        if total <= limit:
+            break
+        for path in _paths(key):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        total -= size
+
+
+def _cached_response(key, meta, url):
+    return UpstreamResponse(meta["status"], meta["headers"], url, body_path=_paths(key)[1], from_cache=True)
+
+
+def get(url, source, headers=None, stream=False, timeout=None, deadline=None):
+    """
+    GET `url` as `source` (a key of SOURCES). With `stream=True` the body is read lazily
+    through `iter_content`. Requests carrying their own conditional headers bypass the
+    cache so the caller sees the upstream's 304. With a `deadline` (a time.monotonic()
+    value) no network request starts after it (rate_limit.DeadlineExceeded is raised) and
+    the timeouts are cut to the time left.
+    """
+    config = SOURCES[source]
+    headers = dict(headers or {})
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    key = cache_key(url)
+    entry = _read_entry(key)
+    caller_conditional = any(h.lower() in CONDITIONAL_HEADERS for h in headers)
+
+    if HTTP_MODE == "replay":
+        if entry is None:
+            requests_total.inc(source=source, result="replay_miss")
+            raise ReplayMissError(f"No recorded response for {url}")
+        requests_total.inc(source=source, result="replay")
+        return _cached_response(key, entry, url)
+
+    use_cache = HTTP_MODE == "live" and not caller_conditional
+    if use_cache and entry and time.time() - entry["fetched_at"] < config["ttl"]:
+        requests_total.inc(source=source, result="hit")
+        return _cached_response(key, entry, url)
+
+    if use_cache and entry:
+        if entry["headers"].get("ETag"):
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+    rate_limit.limiter(config["limiter"]).acquire(deadline=deadline)
+    connect_timeout, read_timeout = CONNECT_TIMEOUT, timeout or config["timeout"]
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise rate_limit.DeadlineExceeded(f"Deadline passed before requesting {url}")
+        connect_timeout, read_timeout = min(connect_timeout, remaining), min(read_timeout, remaining)
+    session = _session(urlsplit(url).netloc.lower())
+    resp = session.get(url, headers=headers, stream=stream, timeout=(connect_timeout, read_timeout))
+
+    if resp.status_code == 304 and use_cache and entry:
+        resp.close()
+        entry["fetched_at"] = time.time()
+        _write_meta(key, entry)
+        requests_total.inc(source=source, result="revalidated")
+        return _cached_response(key, entry, url)
+
+    requests_total.inc(source=source, result="miss")
+    if resp.status_code != 200:
+        return UpstreamResponse(resp.status_code, resp.headers, url, body=None if stream else resp.content,
+                                live=resp if stream else None)
+    cacheable = config.get("cacheable")
+    if stream:
+        def on_complete(path):
+            if cacheable and not cacheable(UpstreamResponse(200, resp.headers, url, body_path=path)):
+                os.unlink(path)
+                return
+            _store(key, url, 200, resp.headers, resp.encoding, body_file=path)
+
+        return UpstreamResponse(resp.status_code, resp.headers, url, live=resp, on_complete=on_complete)
+    body = resp.content
+    response = UpstreamResponse(resp.status_code, resp.headers, url, body=body)
+    if cacheable and not cacheable(response):
+        requests_total.inc(source=source, result="uncacheable")
+    else:
+        _store(key, url, 200, resp.headers, resp.encoding, body=body)
+    return response
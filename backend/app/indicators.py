@@ -0,0 +1,248 @@
+"""
+Technical indicators over daily closes from the price store.
+
+Indicators are computed for many tickers at once: closes are stacked into a matrix
+(one row per ticker, right-aligned and NaN-padded on the left) and every kernel works
+on whole columns. Results are cached per (ticker, indicator) together with the last bar
+date they cover; when new bars arrive only those bars are computed, from the trailing
+closes (window indicators) or the carried state (recursive ones).
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from app import price_store
+
+INDICATOR_CACHE_SIZE = int(os.getenv("INDICATOR_CACHE_SIZE", "20000"))
+DEFAULT_INDICATORS = "sma_20,sma_50,ema_20,rsi_14,volatility_20,drawdown"
+DEFAULT_WINDOWS = {"sma": 20, "ema": 20, "rsi": 14, "volatility": 20, "drawdown": None}
+TRADING_DAYS_PER_YEAR = 252
+
+_SPEC = re.compile(r"^([a-z]+)(?:_(\d+))?$")
+
+
+def parse_indicators(names: str):
+    """
+    "sma_20,rsi_14,drawdown" -> [("sma", 20), ("rsi", 14), ("drawdown", None)].
+    Raises ValueError for unknown indicators or bad windows.
+    """
+    specs = []
+    for name in names.split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        match = _SPEC.match(name)
+        if not match or match.group(1) not in DEFAULT_WINDOWS:
+            raise ValueError(f"Unknown indicator '{name}'")
+        kind, window = match.group(1), match.group(2)
+        if DEFAULT_WINDOWS[kind] is None:
+            window = None
+        else:
+            window = int(window) if window else DEFAULT_WINDOWS[kind]
+            if window < 2:
+                raise ValueError(f"Window for '{name}' must be at least 2")
+        if (kind, window) not in specs:
+            specs.append((kind, window))
+    return specs
+
+
+def indicator_name(spec):
+    kind, window = spec
+    return kind if window is None else f"{kind}_{window}"
+
+
+def _rolling_mean(x, window):
+    n, length = x.shape
+    valid = ~np.isnan(x)
+    sums = np.zeros((n, length + 1))
+    counts = np.zeros((n, length + 1))
+    np.cumsum(np.where(valid, x, 0.0), axis=1, out=sums[:, 1:])
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+    window_sums = sums[:, window:] - sums[:, :-window]
+    window_counts = counts[:, window:] - counts[:, :-window]
+    out = np.full((n, length), np.nan)
+    out[:, window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return out
+
+
+def _sma(x, window, state):
+    return _rolling_mean(x, window), state
+
+
+def _volatility(x, window, state):
+    """
+    Annualized standard deviation of daily log returns over `window` returns.
+    """
+    returns = np.full(x.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[:, 1:] = np.log(x[:, 1:] / x[:, :-1])
+    mean = _rolling_mean(returns, window)
+    mean_sq = _rolling_mean(returns * returns, window)
+    variance = np.maximum(mean_sq - mean * mean, 0.0) * window / (window - 1)
+    return np.sqrt(variance) * np.sqrt(TRADING_DAYS_PER_YEAR), state
+
+
+def _ema(x, window, state):
+    alpha = 2.0 / (window + 1)
+    current = state[:, 0].copy()
+    out = np.full(x.shape, np.nan)
+    for t in range(x.shape[1]):
+        col = x[:, t]
+        has = ~np.isnan(col)
+        current = np.where(has, np.where(np.isnan(current), col, current + alpha * (col - current)), current)
+        out[has, t] = current[has]
+    return out, current[:, None]
+
+
+def _rsi(x, window, state):
+    """
+    Relative strength index with Wilder smoothing, seeded from the first price change.
+    """
+    prev, avg_gain, avg_loss, seen = (state[:, i].copy() for i in range(4))
+    out = np.full(x.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for t in range(x.shape[1]):
+            col = x[:, t]
+            has = ~np.isnan(col)
+            step = has & ~np.isnan(prev)
+            change = col - prev
+            gain = np.maximum(change, 0.0)
+            loss = np.maximum(-change, 0.0)
+            first = seen == 1
+            avg_gain = np.where(step, np.where(first, gain, avg_gain + (gain - avg_gain) / window), avg_gain)
+            avg_loss = np.where(step, np.where(first, loss, avg_loss + (loss - avg_loss) / window), avg_loss)
+            seen = seen + has
+            prev = np.where(has, col, prev)
+            rsi = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+            ready = step & (seen > window)
+            out[ready, t] = rsi[ready]
+    return out, np.column_stack([prev, avg_gain, avg_loss, seen])
+
+
+def _drawdown(x, window, state):
+    """
+    Fractional distance below the running maximum close (0 at a new high).
+    """
+    running = np.fmax.accumulate(np.column_stack([state[:, 0], x]), axis=1)[:, 1:]
+    with np.errstate(invalid="ignore"):
+        out = x / running - 1.0
+    last = running[:, -1:] if running.shape[1] else state
+    return out, last
+
+
+# kind -> (kernel, trailing closes needed before the first new bar, initial state row)
+KERNELS = {
+    "sma": (_sma, lambda window: window - 1, None),
+    "volatility": (_volatility, lambda window: window, None),
+    "ema": (_ema, lambda window: 0, [np.nan]),
+    "rsi": (_rsi, lambda window: 0, [np.nan, np.nan, np.nan, 0.0]),
+    "drawdown": (_drawdown, lambda window: 0, [np.nan]),
+}
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+cache_stats = {"hits": 0, "incremental": 0, "full": 0}
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        for key in cache_stats:
+            cache_stats[key] = 0
+
+
+def _stack_right_aligned(sequences):
+    width = max(len(seq) for seq in sequences)
+    matrix = np.full((len(sequences), width), np.nan)
+    for row, seq in zip(matrix, sequences):
+        if len(seq):
+            row[width - len(seq):] = seq
+    return matrix
+
+
+def _run_kernel(spec, jobs):
+    """
+    jobs: [(ticker, closes_for_kernel, new_bar_count, state_row)] -> [new values per job]
+    """
+    kind, window = spec
+    kernel, _, initial = KERNELS[kind]
+    matrix = _stack_right_aligned([job[1] for job in jobs])
+    states = np.array([job[3] for job in jobs], dtype=np.float64) if initial is not None else None
+    values, new_states = kernel(matrix, window, states)
+    results = []
+    for i, (_, _, new_bars, _) in enumerate(jobs):
+        tail = values[i, values.shape[1] - new_bars:] if new_bars else values[i, :0]
+        results.append((tail, None if new_states is None else new_states[i]))
+    return results
+
+
+def compute_many(histories, specs):
+    """
+    histories: {ticker: price_store history dict}; specs: output of parse_indicators.
+    Returns {ticker: {indicator name: array aligned with history["dates"]}}.
+    """
+    results = {ticker: {} for ticker in histories}
+    with _lock:
+        for spec in specs:
+            kind, window = spec
+            _, warmup_fn, initial = KERNELS[kind]
+            warmup = warmup_fn(window)
+            # Fresh and incremental jobs run as separate matrices so a few full
+            # histories do not pad hundreds of one-bar updates to full width.
+            jobs = {"full": [], "incremental": []}
+            for ticker, history in histories.items():
+                close, dates = history["close"], history["dates"]
+                n = len(close)
+                entry = _cache.get((ticker, spec))
+                if (entry and 0 < entry["n"] <= n and dates[entry["n"] - 1] == entry["last_date"]
+                        and close[entry["n"] - 1] == entry["last_close"]):
+                    new_bars = n - entry["n"]
+                    if not new_bars:
+                        _cache.move_to_end((ticker, spec))
+                        cache_stats["hits"] += 1
+                        results[ticker][indicator_name(spec)] = entry["values"]
+                        continue
+                    kind_of_job, base, state = "incremental", entry["values"], entry["state"]
+                else:
+                    new_bars, kind_of_job, base, state = n, "full", np.empty(0), initial
+                seq = close[max(0, n - new_bars - warmup):]
+                jobs[kind_of_job].append((ticker, seq, new_bars, state, base))
+
+            for kind_of_job, group in jobs.items():
+                if not group:
+                    continue
+                cache_stats[kind_of_job] += len(group)
+                computed = _run_kernel(spec, [job[:4] for job in group])
+                for (ticker, _, _, _, base), (tail, state) in zip(group, computed):
+                    values = np.concatenate([base, tail])
+                    history = histories[ticker]
+                    if len(values):
+                        _cache[(ticker, spec)] = {
+                            "n": len(values),
+                            "last_date": history["dates"][-1],
+                            "last_close": history["close"][-1],
+                            "values": values,
+                            "state": state,
+                        }
+                        _cache.move_to_end((ticker, spec))
+                    results[ticker][indicator_name(spec)] = values
+            while len(_cache) > INDICATOR_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return results
+
+
+def get_indicators(tickers, specs):
+    """
+    Indicators for each ticker over its full stored history, plus the history itself.
+    """
+    histories = {ticker.upper(): price_store.get_history(ticker) for ticker in tickers}
+    return histories, compute_many(histories, specs)
+
+
+def to_json_values(values):
+    """
+    Array -> list with NaN (warm-up periods) as None.
+    """
+    rounded = np.round(values, 6)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
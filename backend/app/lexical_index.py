@@ -0,0 +1,188 @@
+"""
+Local BM25 index over ingested chunks, kept next to the vector store.
+
+Chunks are indexed in an SQLite FTS5 table as they are upserted into ChromaDB, so exact
+terms ("EBITDA", "Item 1A", segment names) that dense similarity misses can be found
+lexically and fused with the vector ranking in `rag_pipeline`.
+"""
+import os
+import re
+import hashlib
+import sqlite3
+import threading
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(current_dir, "..", "lexical_index.db"))
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from", "has", "have",
+    "how", "in", "is", "it", "its", "of", "on", "or", "that", "the", "their", "this", "to", "was",
+    "were", "what", "when", "which", "who", "why", "will", "with", "about", "company", "s",
+}
+
+
+_HEX_ID = re.compile(r"^[0-9a-f]{15}")
+
+
+def _rowid(doc_id):
+    # Document ids are hex digests; 60 bits of one is a stable, collision-safe rowid.
+    # Ids in any other form (uuid4 ids of vectors stored before content hashing) are
+    # hashed first.
+    if not _HEX_ID.match(doc_id):
+        doc_id = hashlib.sha256(doc_id.encode("utf-8")).hexdigest()
+    return int(doc_id[:15], 16)
+
+
+def build_match_query(question):
+    """
+    FTS5 query matching any meaningful term of the question against the chunk text.
+    Returns None when the question has no searchable terms.
+    """
+    terms = []
+    for token in _TOKEN.findall(question.lower()):
+        if token not in STOPWORDS and token not in terms:
+            terms.append(token)
+    if not terms:
+        return None
+    any_term = " OR ".join('"%s"' % term for term in terms)
+    return f"content : ({any_term})"
+
+
+class LexicalIndex:
+    """
+    Inverted index of chunk text with BM25 ranking (SQLite FTS5, Porter stemming).
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._create_table()
+
+    def _create_table(self):
+        # The ticker is stored, not tokenized: it is filtered by equality, since a stemmed
+        # ticker column would let "CAR" match "CARS".
+        existing = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'chunks'").fetchone()
+        if existing and "ticker UNINDEXED" in existing[0]:
+            return
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE chunks_new USING fts5("
+            " ticker UNINDEXED, content, doc_id UNINDEXED, source UNINDEXED, link UNINDEXED,"
+            " tokenize = 'porter unicode61')"
+        )
+        if existing:
+            # Index files written before the ticker column was unindexed
+            self._conn.execute(
+                "INSERT INTO chunks_new (rowid, ticker, content, doc_id, source, link)"
+                " SELECT rowid, ticker, content, doc_id, source, link FROM chunks"
+            )
+            self._conn.execute("DROP TABLE chunks")
+        self._conn.execute("ALTER TABLE chunks_new RENAME TO chunks")
+
+    def add_documents(self, ticker, ids, documents, metadatas):
+        """
+        Indexes (or re-indexes) chunks under their vector-store ids.
+        """
+        rows = [
+            (_rowid(doc_id), ticker.upper(), text, doc_id, (meta or {}).get("source"), (meta or {}).get("link"))
+            for doc_id, text, meta in zip(ids, documents, metadatas)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE rowid = ?", [(row[0],) for row in rows])
+            self._conn.executemany(
+                "INSERT INTO chunks (rowid, ticker, content, doc_id, source, link) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def delete_documents(self, ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE rowid = ?", [(_rowid(doc_id),) for doc_id in ids])
+
+    def optimize(self):
+        """
+        Merges the FTS5 segments and vacuums the file, returning space freed by deletes.
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT INTO chunks(chunks) VALUES ('optimize')")
+            self._conn.execute("VACUUM")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def search(self, ticker, question, n_results=20):
+        """
+        Top BM25 matches as hits shaped like `rag_pipeline.search_vectors` results, with the
+        BM25 score (lower is better) in place of a distance.
+        """
+        match = build_match_query(question)
+        if match is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, content, source, link, bm25(chunks) AS score"
+                " FROM chunks WHERE chunks MATCH ? AND ticker = ? ORDER BY score LIMIT ?",
+                (match, ticker.upper(), n_results)
+            ).fetchall()
+        return [
+            {
+                "id": doc_id,
+                "document": content,
+                "metadata": {"ticker": ticker, "source": source, "link": link},
+                "score": score,
+            }
+            for doc_id, content, source, link, score in rows
+        ]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM chunks").fetchone()[0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LexicalIndex()
+        return _index
+
+
+def rebuild_from_vector_store(page_size=1000):
+    """
+    Indexes every chunk already stored in ChromaDB (for corpora ingested before this index).
+    """
+    from app import rag_pipeline
+
+    index = get_lexical_index()
+    total = 0
+    for name in rag_pipeline.list_collection_names():
+        collection = rag_pipeline.get_chroma_client().get_collection(name=name)
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+            by_ticker = {}
+            for doc_id, text, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                ticker = (meta or {}).get("ticker")
+                if ticker:
+                    group = by_ticker.setdefault(ticker, ([], [], []))
+                    group[0].append(doc_id)
+                    group[1].append(text)
+                    group[2].append(meta)
+            for ticker, (ids, texts, metas) in by_ticker.items():
+                index.add_documents(ticker, ids, texts, metas)
+                total += len(ids)
+        print(f"Indexed collection '{name}' ({offset} chunks)")
+    print(f"Lexical index now holds {len(index)} chunks ({total} indexed in this run).")
+    return total
+
+
+if __name__ == "__main__":
+    rebuild_from_vector_store()
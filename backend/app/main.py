@@ -1,12 +1,40 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Depends
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
+from typing import List, Optional
 from sqlalchemy.orm import Session
-import uuid
-from app import database, tasks, rag_pipeline
-import requests
+import json
+import time
+import asyncio
+import datetime
+from app import database, rag_pipeline, progress, worker, price_store, indicators, observability, query_cache
+import os
 
-app = FastAPI(title="Cognivest API")
+observability.configure_logging()
+
+# Create the Gemini / Chroma clients and import the ingestion stack at startup instead of
+# on the first request that needs them (slower start, no first-request penalty).
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "false").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database.init_db()
+    await run_in_threadpool(query_cache.start_generation_refresh)
+    if INGESTION_MODE == "inline":
+        # Tasks this API was running when it last stopped will never finish.
+        db = database.SessionLocal()
+        try:
+            await run_in_threadpool(worker.abandon_orphaned_tasks, db)
+        finally:
+            db.close()
+    if STARTUP_WARMUP:
+        await run_in_threadpool(rag_pipeline.warm_up)
+    yield
+
+app = FastAPI(title="Cognivest API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -17,6 +45,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/task-status/{task_id}), not by raw path, to bound cardinality.
+        route = request.scope.get("route")
+        observability.http_seconds.observe(
+            time.perf_counter() - start,
+            method=request.method, route=getattr(route, "path", "unmatched"), status=status
+        )
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus text exposition of this API process's counters and histograms.
+    """
+    return PlainTextResponse(observability.render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Dependency
 def get_db():
     db = database.SessionLocal()
@@ -25,77 +76,315 @@ def get_db():
     finally:
         db.close()
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 class TickerRequest(BaseModel):
     ticker: str
 
+class TickerBatchRequest(BaseModel):
+    tickers: List[str]
+
 class QueryRequest(BaseModel):
     question: str
     ticker: str
 
+class BatchQueryRequest(BaseModel):
+    question: str
+    tickers: List[str]
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Cognivest API (Gemini Edition)"}
 
+# "queue": jobs go to the durable queue drained by `python -m app.worker`.
+# "inline": run ingestion in this process with BackgroundTasks (no worker needed).
+INGESTION_MODE = os.getenv("INGESTION_MODE", "queue")
+
+def run_ingestion_inline(ticker: str, task_id: str):
+    # The ingestion stack (yfinance, BeautifulSoup, embedding engine) is imported by the
+    # worker only when the API runs ingestion itself.
+    worker.run_inline(ticker, task_id)
+
+# Plain `def`: FastAPI runs these in its threadpool, so the blocking SQLAlchemy
+# session never holds up the event loop.
 @app.post("/process-document")
-async def process_document(request: TickerRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    task_id = str(uuid.uuid4())
+def process_document(request: TickerRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    task, created = worker.enqueue_ingestion(db, request.ticker)
+    if not created:
+        return {"message": "Processing already in progress", "task_id": task.id}
     
-    # Create initial task record
-    new_task = database.Task(id=task_id, status="PENDING", message="Task initiated")
-    db.add(new_task)
-    db.commit()
+    if INGESTION_MODE == "inline":
+        # Only tasks run by this process go on the in-memory progress bus; queued ones are
+        # followed through the database.
+        progress.bus.publish(task.id, "PENDING", task.message)
+        # Mark the job as taken so queue workers, if any, leave it alone.
+        worker.start_inline(task)
+        db.commit()
+        background_tasks.add_task(run_ingestion_inline, task.ticker, task.id)
     
-    # Add background task
-    background_tasks.add_task(tasks.process_ticker_documents, request.ticker, task_id)
+    return {"message": "Processing started", "task_id": task.id}
+
+MAX_BATCH_TICKERS = int(os.getenv("MAX_BATCH_TICKERS", "1000"))
+
+@app.post("/process-documents/batch")
+def process_documents_batch(request: TickerBatchRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Queues ingestion for a watchlist. Fetch and embed calls from all jobs share the
+    per-upstream rate limiters, so the batch runs as fast as the limits allow.
+    """
+    if len(request.tickers) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TICKERS} tickers per batch")
     
-    return {"message": "Processing started", "task_id": task_id}
+    batch, batch_tasks = worker.enqueue_batch(db, request.tickers)
+    for task in batch_tasks:
+        if task.status == "PENDING" and (task.attempts or 0) == 0:
+            if INGESTION_MODE == "inline":
+                progress.bus.publish(task.id, "PENDING", task.message)
+                worker.start_inline(task)
+                background_tasks.add_task(run_ingestion_inline, task.ticker, task.id)
+    db.commit()
+    
+    return {
+        "message": "Batch queued",
+        "batch_id": batch.id,
+        "tasks": [{"ticker": t.ticker, "task_id": t.id} for t in batch_tasks]
+    }
+
+@app.get("/batch-status/{batch_id}")
+def get_batch_status(batch_id: str, db: Session = Depends(get_db)):
+    status = worker.batch_status(db, batch_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
+
+def read_task_state(task_id: str):
+    db = database.SessionLocal()
+    try:
+        task = db.query(database.Task).filter(database.Task.id == task_id).first()
+        if not task:
+            return None
+        return {
+            "task_id": task_id,
+            "status": task.status,
+            "message": task.message,
+            "timings": json.loads(task.timings) if task.timings else None
+        }
+    finally:
+        db.close()
 
 @app.get("/task-status/{task_id}")
-async def get_status(task_id: str, db: Session = Depends(get_db)):
-    task = db.query(database.Task).filter(database.Task.id == task_id).first()
-    if not task:
+def get_status(task_id: str):
+    # Polling fallback. The progress bus only knows tasks run by this process (inline
+    # mode), whose live progress is answered from memory; everything else, including
+    # queued tasks run by workers, is read from the DB.
+    latest = progress.bus.latest(task_id)
+    if latest and latest["status"] not in progress.TERMINAL_STATUSES:
+        return {"status": latest["status"], "message": latest["message"], "timings": None}
+    state = read_task_state(task_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Task not found")
-    return {"status": task.status, "message": task.message}
+    return {"status": state["status"], "message": state["message"], "timings": state["timings"]}
 
-@app.get("/api/stock-data/{ticker}")
-def get_stock_data(ticker: str):
+# Seconds between DB reads when following a task run by a worker process
+TASK_EVENTS_POLL_SECONDS = float(os.getenv("TASK_EVENTS_POLL_SECONDS", "1"))
+TASK_EVENTS_HEARTBEAT_SECONDS = 15.0
+
+@app.get("/task-events/{task_id}")
+async def task_events(task_id: str):
     """
-    Fetches daily time series data for a given stock ticker from Alpha Vantage.
+    Server-sent progress events for an ingestion task, ending with SUCCESS or FAILURE.
     """
-    API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
-    OUTPUT_SIZE = "compact" # "full" - full data (20 years) | "compact" - latest 100
-    url = (
-        f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY"
-        f"&symbol={ticker}&apikey={API_KEY}&outputsize={OUTPUT_SIZE}"
+    local = progress.bus.latest(task_id)
+    state = local or await run_in_threadpool(read_task_state, task_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    async def local_events():
+        async for event in progress.bus.subscribe(task_id, heartbeat=TASK_EVENTS_HEARTBEAT_SECONDS):
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event("progress", event)
+    
+    async def stored_events():
+        # Queued tasks run in a worker process: relay the Task row as it changes.
+        current = state
+        sent = None
+        quiet = 0.0
+        while True:
+            if current and (current["status"], current["message"]) != sent:
+                yield sse_event("progress", current)
+                sent = (current["status"], current["message"])
+                quiet = 0.0
+                if current["status"] in progress.TERMINAL_STATUSES:
+                    return
+            elif quiet >= TASK_EVENTS_HEARTBEAT_SECONDS:
+                yield ": keep-alive\n\n"
+                quiet = 0.0
+            await asyncio.sleep(TASK_EVENTS_POLL_SECONDS)
+            quiet += TASK_EVENTS_POLL_SECONDS
+            current = await run_in_threadpool(read_task_state, task_id)
+    
+    async def events():
+        if state["status"] in progress.TERMINAL_STATUSES:
+            yield sse_event("progress", state)
+            return
+        source = local_events() if local else stored_events()
+        async for event in source:
+            yield event
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
+
+CHART_DEFAULT_DAYS = int(os.getenv("CHART_DEFAULT_DAYS", "365"))
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+
+def check_ticker(ticker: str):
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        return price_store.validate_ticker(ticker)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if "Time Series (Daily)" not in data:
-            return {"error": "Could not retrieve time series data. The API limit might be reached or the ticker is invalid."}
+@app.get("/api/stock-data/{ticker}")
+def get_stock_data(ticker: str, start: Optional[str] = None, end: Optional[str] = None,
+                   max_points: int = Query(CHART_MAX_POINTS, ge=0)):
+    """
+    Daily closes for a ticker from the local price store, as ApexCharts points.
+    Defaults to the last year; `max_points` caps the series by bucketing bars (0: no cap).
+    """
+    check_ticker(ticker)
+    if start is None and end is None:
+        start = (datetime.date.today() - datetime.timedelta(days=CHART_DEFAULT_DAYS)).isoformat()
+    try:
+        bars = price_store.get_bars(ticker, start=start, end=end, max_points=max_points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date range: {e}")
 
-        time_series = data["Time Series (Daily)"]
+    if not len(bars["dates"]):
+        return {"error": "Could not retrieve price data. The ticker may be invalid."}
 
-        # Format the data for ApexCharts: [{ x: date, y: price }]
-        chart_data = [
-            {"x": date, "y": float(values["4. close"])}
-            for date, values in time_series.items()
-        ]
-        # Sort by date ascending
-        chart_data.sort(key=lambda item: item['x'])
+    return {"ticker": ticker, "data": price_store.to_chart_points(bars)}
 
-        return {"ticker": ticker, "data": chart_data}
 
-    except requests.exceptions.RequestException as e:
-        return {"error": f"Error fetching stock data: {e}"}
-    
+def parse_indicator_specs(names: Optional[str]):
+    try:
+        specs = indicators.parse_indicators(names or indicators.DEFAULT_INDICATORS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not specs:
+        raise HTTPException(status_code=400, detail="No indicators requested")
+    return specs
+
+@app.get("/api/indicators/{ticker}")
+def get_ticker_indicators(ticker: str, names: Optional[str] = Query(None, alias="indicators"),
+                          start: Optional[str] = None, end: Optional[str] = None,
+                          max_points: int = Query(CHART_MAX_POINTS, ge=0)):
+    """
+    Indicator series for one ticker, aligned with its daily closes. `indicators` is a
+    comma-separated list such as "sma_20,ema_50,rsi_14,volatility_20,drawdown".
+    """
+    check_ticker(ticker)
+    specs = parse_indicator_specs(names)
+    histories, results = indicators.get_indicators([ticker], specs)
+    history = histories[ticker.upper()]
+    if not len(history["dates"]):
+        return {"error": "Could not retrieve price data. The ticker may be invalid."}
+
+    if start is None and end is None:
+        start = (datetime.date.today() - datetime.timedelta(days=CHART_DEFAULT_DAYS)).isoformat()
+    series = dict(results[ticker.upper()], dates=history["dates"], close=history["close"])
+    try:
+        series = price_store.slice_range(series, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date range: {e}")
+    n = len(series["dates"])
+    if max_points and n > max_points:
+        # Indicators are point-in-time values, so each bucket keeps its last bar.
+        _, ends = price_store.bucket_bounds(n, max_points)
+        series = {key: values[ends] for key, values in series.items()}
+
+    return {
+        "ticker": ticker,
+        "dates": price_store.date_strings(series["dates"]),
+        "close": series["close"].tolist(),
+        "indicators": {name: indicators.to_json_values(series[name]) for name in results[ticker.upper()]},
+    }
+
+@app.get("/api/indicators")
+def get_latest_indicators(tickers: str, names: Optional[str] = Query(None, alias="indicators")):
+    """
+    Latest indicator values for a comma-separated list of tickers, computed in one batch.
+    """
+    symbols = [t.strip().upper() for t in tickers.split(",") if t.strip()]
+    if not symbols:
+        raise HTTPException(status_code=400, detail="No tickers provided")
+    if len(symbols) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TICKERS} tickers per request")
+    for symbol in symbols:
+        check_ticker(symbol)
+    specs = parse_indicator_specs(names)
+    histories, results = indicators.get_indicators(symbols, specs)
+
+    latest = {}
+    for symbol in symbols:
+        history = histories[symbol]
+        if not len(history["dates"]):
+            latest[symbol] = None
+            continue
+        values = {name: indicators.to_json_values(series[-1:])[0] for name, series in results[symbol].items()}
+        latest[symbol] = dict(values, date=str(history["dates"][-1]), close=float(history["close"][-1]))
+    return {"indicators": latest}
+
 
 @app.post("/api/query")
 async def query_rag(request: QueryRequest):
-    context = rag_pipeline.query_vectors(request.question, request.ticker)
-    
-    answer = rag_pipeline.generate_answer(context, request.question)
+    answer = await rag_pipeline.answer_question_async(request.question, request.ticker)
     
     return {"answer": answer}
+
+
+@app.post("/api/query/stream")
+async def query_rag_stream(request: QueryRequest):
+    """
+    Server-sent events: `sources` first, then `token` events while the answer is generated,
+    then `done` (or `error`).
+    """
+    async def events():
+        async for event, data in rag_pipeline.stream_answer(request.question, request.ticker):
+            yield sse_event(event, data)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Disable proxy buffering (nginx) so tokens reach the browser as they are produced.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+MAX_BATCH_QUERY_TICKERS = int(os.getenv("MAX_BATCH_QUERY_TICKERS", "50"))
+
+@app.post("/api/query/batch")
+async def query_rag_batch(request: BatchQueryRequest):
+    """
+    One question for many tickers, as server-sent events: an `answer` event per ticker in
+    completion order, then `done`.
+    """
+    tickers = list(dict.fromkeys(t.strip() for t in request.tickers if t.strip()))
+    if not tickers:
+        raise HTTPException(status_code=400, detail="No tickers provided")
+    if len(tickers) > MAX_BATCH_QUERY_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERY_TICKERS} tickers per batch")
+    
+    async def events():
+        async for event, data in rag_pipeline.answer_batch(request.question, tickers):
+            yield sse_event(event, data)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,240 @@
+"""
+Logging setup, timing spans and Prometheus-style metrics.
+
+`span("embed")` times a pipeline stage into the `cognivest_stage_duration_seconds`
+histogram (and counts failures); `render_metrics()` produces the Prometheus text
+exposition format served on /metrics. Metrics are per process: each ingestion worker
+can expose its own endpoint with `python -m app.worker --metrics-port`.
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "text" for humans, "json" for log shippers
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    """
+    Installs a root handler once per process. Safe to call repeatedly.
+    """
+    root = logging.getLogger()
+    if getattr(configure_logging, "_configured", False):
+        return
+    handler = logging.StreamHandler()
+    if (fmt or LOG_FORMAT) == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel((level or LOG_LEVEL).upper())
+    configure_logging._configured = True
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def totals(self):
+        """
+        {label values: (count, sum)} for every series.
+        """
+        with self._lock:
+            return {key: (series["count"], series["sum"]) for key, series in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_label_text(names, key + (f'{bound:g}',))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {series['count']}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {series['count']}")
+        return lines
+
+
+_registry = []
+
+
+def counter(name, help_text, labels=()):
+    metric = Counter(name, help_text, labels)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, help_text, labels, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = histogram(
+    "cognivest_stage_duration_seconds", "Time spent per pipeline stage.", labels=("stage",)
+)
+stage_errors = counter(
+    "cognivest_stage_errors_total", "Pipeline stage executions that raised.", labels=("stage",)
+)
+stage_items = counter(
+    "cognivest_stage_items_total", "Items (documents, chunks, vectors) handled per stage.", labels=("stage",)
+)
+http_seconds = histogram(
+    "cognivest_http_request_duration_seconds", "API request latency until response headers.",
+    labels=("method", "route", "status")
+)
+context_tokens_saved = counter(
+    "cognivest_context_tokens_saved_total", "Prompt tokens removed by context deduplication and budgeting."
+)
+
+
+@contextmanager
+def span(stage, items=None):
+    """
+    Times the enclosed block as `stage`. `items` (if given) is added to the stage's item
+    counter on success.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+    if items:
+        stage_items.inc(items, stage=stage)
+
+
+def observe_stage(stage, seconds, items=None):
+    """
+    Records a stage duration measured elsewhere (e.g. accumulated over a stream).
+    """
+    if seconds is None or math.isnan(seconds):
+        return
+    stage_seconds.observe(max(0.0, seconds), stage=stage)
+    if items:
+        stage_items.inc(items, stage=stage)
+
+
+def stage_summary():
+    """
+    {stage: {"calls", "seconds", "items", "errors"}} accumulated in this process so far.
+    """
+    summary = {}
+    for (stage,), (count, seconds) in stage_seconds.totals().items():
+        summary[stage] = {"calls": count, "seconds": seconds, "items": 0, "errors": 0}
+    for field, metric in (("items", stage_items), ("errors", stage_errors)):
+        for (stage,), value in metric.values().items():
+            summary.setdefault(stage, {"calls": 0, "seconds": 0.0, "items": 0, "errors": 0})[field] = int(value)
+    return summary
+
+
+class TimedIterator:
+    """
+    Wraps an iterator and accumulates the time spent producing its items in `.seconds`.
+    Timing nested streams with one of these per layer gives per-stage time by subtraction.
+    """
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.seconds = 0.0
+        self.items = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.items += 1
+        return item
@@ -0,0 +1,240 @@
+"""
+Local daily OHLCV store behind the chart endpoints.
+
+Bars are kept per ticker as columnar NumPy arrays (one .npz file each) and cached in
+memory. Prices are split- and dividend-adjusted, as yfinance returns them by default. A
+request only goes to yfinance when bars newer than the last stored one can exist, and then
+fetches just the missing date range; when that range contains a split or dividend, which
+re-adjusts every earlier bar, the full history is fetched again instead. Range slicing,
+downsampling and JSON serialization are vectorized.
+"""
+import logging
+import os
+import re
+import time
+import datetime
+import threading
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", os.path.join(current_dir, "..", "price_store"))
+PRICE_HISTORY_YEARS = int(os.getenv("PRICE_HISTORY_YEARS", "20"))
+# Minimum seconds between upstream checks for a ticker that may be missing bars
+PRICE_REFRESH_SECONDS = float(os.getenv("PRICE_REFRESH_SECONDS", "3600"))
+# Ticker histories kept in memory, least recently used evicted first
+PRICE_MEMORY_TICKERS = int(os.getenv("PRICE_MEMORY_TICKERS", "256"))
+
+COLUMNS = ("open", "high", "low", "close", "volume")
+TICKER_PATTERN = re.compile(r"^[A-Z0-9.\-]{1,10}$")
+
+_memory = OrderedDict()
+_last_checked = {}
+_memory_lock = threading.Lock()
+# Fixed pool of per-ticker locks, so arbitrary tickers cannot grow it
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def validate_ticker(ticker: str):
+    """
+    Upper-cased ticker, or ValueError if it is not a plausible symbol (it becomes a file name).
+    """
+    symbol = (ticker or "").strip().upper()
+    if not TICKER_PATTERN.match(symbol):
+        raise ValueError(f"Invalid ticker '{ticker}'")
+    return symbol
+
+
+def _lock_for(ticker):
+    return _locks[hash(ticker) % len(_locks)]
+
+
+def _remember(ticker, history):
+    with _memory_lock:
+        _memory[ticker] = history
+        _memory.move_to_end(ticker)
+        while len(_memory) > PRICE_MEMORY_TICKERS:
+            evicted, _ = _memory.popitem(last=False)
+            _last_checked.pop(evicted, None)
+
+
+def _recall(ticker):
+    with _memory_lock:
+        history = _memory.get(ticker)
+        if history is not None:
+            _memory.move_to_end(ticker)
+        return history
+
+
+def _path(ticker):
+    return os.path.join(PRICE_STORE_DIR, f"{ticker}.npz")
+
+
+def _empty():
+    history = {"dates": np.array([], dtype="datetime64[D]")}
+    for column in COLUMNS:
+        history[column] = np.array([], dtype=np.float64)
+    return history
+
+
+def _load(ticker):
+    path = _path(ticker)
+    if not os.path.exists(path):
+        return _empty()
+    with np.load(path) as data:
+        if "adjusted" not in data.files:
+            # Written with unadjusted prices; fetched again in full.
+            return _empty()
+        return {key: data[key] for key in ("dates",) + COLUMNS}
+
+
+def _save(ticker, history):
+    os.makedirs(PRICE_STORE_DIR, exist_ok=True)
+    tmp_path = _path(ticker) + ".tmp.npz"
+    np.savez(tmp_path, adjusted=np.array(True), **history)
+    os.replace(tmp_path, _path(ticker))
+
+
+def _last_expected_bar(today=None):
+    """
+    Most recent weekday strictly before today; today's bar is only final after the close.
+    """
+    day = (today or datetime.date.today()) - datetime.timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= datetime.timedelta(days=1)
+    return np.datetime64(day, "D")
+
+
+def _fetch(ticker, start):
+    """
+    Adjusted bars from `start` on, and whether a split or dividend falls in that range.
+    """
+    import yfinance as yf
+
+    hist = yf.Ticker(ticker).history(start=str(start))
+    if hist is None or hist.empty:
+        return _empty(), False
+    index = hist.index
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    history = {"dates": index.values.astype("datetime64[D]")}
+    for column in COLUMNS:
+        history[column] = hist[column.capitalize()].to_numpy(dtype=np.float64)
+    actions = any(
+        column in hist and (hist[column].fillna(0) != 0).any() for column in ("Dividends", "Stock Splits")
+    )
+    return history, actions
+
+
+def _merge(existing, fresh):
+    if not len(fresh["dates"]):
+        return existing
+    # Refetched bars replace stored ones from the first fresh date on (the last stored bar
+    # may have been a partial intraday one).
+    keep = existing["dates"] < fresh["dates"][0]
+    return {key: np.concatenate([existing[key][keep], fresh[key]]) for key in existing}
+
+
+def get_history(ticker: str):
+    """
+    Full stored daily history for `ticker` as a dict of equal-length arrays, fetching only
+    missing bars when the local copy may be stale. Raises ValueError for invalid tickers.
+    """
+    ticker = validate_ticker(ticker)
+    with _lock_for(ticker):
+        history = _recall(ticker)
+        if history is None:
+            history = _load(ticker)
+            _remember(ticker, history)
+
+        last_stored = history["dates"][-1] if len(history["dates"]) else None
+        stale = last_stored is None or last_stored < _last_expected_bar()
+        recently_checked = time.time() - _last_checked.get(ticker, 0) < PRICE_REFRESH_SECONDS
+        if stale and not recently_checked:
+            _last_checked[ticker] = time.time()
+            full_start = datetime.date.today() - datetime.timedelta(days=365 * PRICE_HISTORY_YEARS)
+            refetched = False
+            try:
+                if last_stored is None:
+                    fresh, _ = _fetch(ticker, full_start)
+                else:
+                    fresh, actions = _fetch(ticker, last_stored.astype(datetime.date))
+                    if actions:
+                        logger.info("Corporate action for %s; refetching its adjusted history", ticker)
+                        fresh, _ = _fetch(ticker, full_start)
+                        refetched = True
+            except Exception as e:
+                logger.warning("Error fetching price history for %s: %s", ticker, e)
+                fresh = _empty()
+            if len(fresh["dates"]):
+                history = fresh if refetched else _merge(history, fresh)
+                _remember(ticker, history)
+                _save(ticker, history)
+        return history
+
+
+def slice_range(history, start=None, end=None):
+    """
+    Bars with start <= date <= end (ISO date strings or None), via binary search.
+    """
+    dates = history["dates"]
+    lo = np.searchsorted(dates, np.datetime64(start, "D"), side="left") if start else 0
+    hi = np.searchsorted(dates, np.datetime64(end, "D"), side="right") if end else len(dates)
+    return {key: values[lo:hi] for key, values in history.items()}
+
+
+def bucket_bounds(n, max_points):
+    """
+    First and last index of each of `max_points` near-equal buckets over `n` bars.
+    """
+    starts = np.linspace(0, n, max_points, endpoint=False).astype(np.int64)
+    ends = np.append(starts[1:], n) - 1
+    return starts, ends
+
+
+def downsample(history, max_points):
+    """
+    Aggregates bars into at most `max_points` OHLCV buckets (first open, max high, min low,
+    last close, summed volume), each labelled with its last date.
+    """
+    n = len(history["dates"])
+    if not max_points or n <= max_points:
+        return history
+    starts, ends = bucket_bounds(n, max_points)
+    return {
+        "dates": history["dates"][ends],
+        "open": history["open"][starts],
+        "high": np.maximum.reduceat(history["high"], starts),
+        "low": np.minimum.reduceat(history["low"], starts),
+        "close": history["close"][ends],
+        "volume": np.add.reduceat(history["volume"], starts),
+    }
+
+
+def get_bars(ticker: str, start=None, end=None, max_points=None):
+    return downsample(slice_range(get_history(ticker), start, end), max_points)
+
+
+def date_strings(dates):
+    return np.datetime_as_string(dates, unit="D").tolist()
+
+
+def to_chart_points(history):
+    """
+    [{"x": date, "y": close}] for ApexCharts.
+    """
+    dates = date_strings(history["dates"])
+    closes = history["close"].tolist()
+    return [{"x": d, "y": c} for d, c in zip(dates, closes)]
+
+
+def to_columns(history):
+    """
+    Column-oriented JSON: {"dates": [...], "open": [...], ...}.
+    """
+    result = {"dates": date_strings(history["dates"])}
+    for column in COLUMNS:
+        result[column] = history[column].tolist()
+    return result
@@ -0,0 +1,83 @@
+"""
+In-process pub/sub for ingestion task progress.
+
+Ingestion publishes every progress message here (from worker threads); API handlers
+stream them to clients over SSE, and the polling endpoint answers from the latest
+event in memory. The bus only sees tasks run by its own process (inline ingestion);
+tasks run by queue workers are followed through their Task rows, which record state
+transitions and periodic progress messages.
+"""
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+
+TERMINAL_STATUSES = {"SUCCESS", "FAILURE"}
+# Latest events kept for late subscribers and polling clients
+MAX_TRACKED_TASKS = 10000
+
+
+class ProgressBus:
+    def __init__(self, max_tracked=MAX_TRACKED_TASKS):
+        self.max_tracked = max_tracked
+        self._latest = OrderedDict()
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, task_id, status, message=None, **extra):
+        event = dict(extra, task_id=task_id, status=status, message=message, timestamp=time.time())
+        with self._lock:
+            self._latest[task_id] = event
+            self._latest.move_to_end(task_id)
+            while len(self._latest) > self.max_tracked:
+                self._latest.popitem(last=False)
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, event)
+        return event
+
+    def latest(self, task_id):
+        with self._lock:
+            return self._latest.get(task_id)
+
+    async def subscribe(self, task_id, heartbeat=15.0):
+        """
+        Async iterator of events for `task_id`, starting with the latest known one. Yields
+        None every `heartbeat` seconds without news so callers can keep connections alive.
+        Ends after a terminal event.
+        """
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=100))
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(entry)
+            current = self._latest.get(task_id)
+        try:
+            if current:
+                yield current
+                if current["status"] in TERMINAL_STATUSES:
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(entry[1].get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(task_id)
+                if subscribers is not None:
+                    subscribers.discard(entry)
+                    if not subscribers:
+                        del self._subscribers[task_id]
+
+
+def _offer(queue, event):
+    # A subscriber that stopped reading loses its oldest progress messages, never the newest.
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+bus = ProgressBus()
@@ -0,0 +1,176 @@
+"""
+In-process caches for the /api/query path.
+
+- query embeddings, keyed by normalized question text
+- retrieval results and final answers, keyed by ticker and normalized question (answers
+  also by a hash of the retrieved document ids)
+
+Ticker-scoped entries embed a per-ticker generation number; ingesting or deleting
+documents for a ticker bumps it, which makes every older entry for that ticker unreachable
+at once. The generation lives in the database (TickerGeneration), so a bump made by a
+queue worker or the compaction job reaches the API's caches within
+GENERATION_REFRESH_SECONDS: a background thread re-reads every ticker's generation at that
+interval, and cache lookups only read its in-memory copy.
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app import database
+from app.embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "5000"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Seconds between background re-reads of the ticker generations from the database
+GENERATION_REFRESH_SECONDS = float(os.getenv("GENERATION_REFRESH_SECONDS", "1"))
+
+
+class TTLCache:
+    """
+    Thread-safe LRU mapping whose entries also expire `ttl` seconds after insertion.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+query_embeddings = TTLCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
+retrievals = TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+answers = TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+
+# ticker -> generation, as last read from the database or bumped by this process
+_generations = {}
+_generations_lock = threading.Lock()
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def normalize_question(question):
+    return normalize_text(question).casefold()
+
+
+def _remember_generation(ticker, generation):
+    # Generations only grow; a read that started before a local bump must not undo it.
+    with _generations_lock:
+        _generations[ticker] = max(_generations.get(ticker, 0), generation)
+
+
+def refresh_generations():
+    """
+    Re-reads every ticker's generation from the database.
+    """
+    db = database.SessionLocal()
+    try:
+        rows = db.query(database.TickerGeneration.ticker, database.TickerGeneration.generation).all()
+    except SQLAlchemyError as e:
+        logger.warning("Could not read the cache generations: %s", e)
+        return
+    finally:
+        db.close()
+    for ticker, generation in rows:
+        _remember_generation(ticker, generation)
+
+
+def _refresh_periodically():
+    while True:
+        time.sleep(GENERATION_REFRESH_SECONDS)
+        refresh_generations()
+
+
+def start_generation_refresh():
+    """
+    Loads the generations and starts the background refresh, once per process. The API
+    calls this at startup; otherwise the first cache lookup does.
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None:
+            return
+        refresh_generations()
+        _refresher = threading.Thread(target=_refresh_periodically, name="cache-generations", daemon=True)
+        _refresher.start()
+
+
+def ticker_generation(ticker):
+    if _refresher is None:
+        start_generation_refresh()
+    with _generations_lock:
+        return _generations.get(ticker.upper(), 0)
+
+
+def invalidate_ticker(ticker):
+    """
+    Drops cached retrievals and answers for `ticker` in every process; call after its
+    stored documents change.
+    """
+    ticker = ticker.upper()
+    Generation = database.TickerGeneration
+    db = database.SessionLocal()
+    try:
+        updated = db.query(Generation).filter(Generation.ticker == ticker).update(
+            {Generation.generation: Generation.generation + 1}, synchronize_session=False
+        )
+        if not updated:
+            db.add(Generation(ticker=ticker, generation=1))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another process created the row first.
+            db.rollback()
+            db.query(Generation).filter(Generation.ticker == ticker).update(
+                {Generation.generation: Generation.generation + 1}, synchronize_session=False
+            )
+            db.commit()
+        generation = db.get(Generation, ticker).generation
+    finally:
+        db.close()
+    _remember_generation(ticker, generation)
+
+
+def retrieval_key(ticker, question, n_results):
+    return (ticker.upper(), ticker_generation(ticker), normalize_question(question), n_results)
+
+
+def answer_key(ticker, question, doc_ids):
+    ids_hash = hashlib.sha256("\x1f".join(doc_ids).encode("utf-8")).hexdigest()
+    return (ticker.upper(), ticker_generation(ticker), normalize_question(question), ids_hash)
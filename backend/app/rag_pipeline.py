@@ -1,51 +1,162 @@
 import os
-from google import genai
-from google.genai import types
-import chromadb
-from chromadb.utils import embedding_functions
+import re
+import time
+import logging
+import asyncio
+import hashlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from app import query_cache, lexical_index, context_assembly, observability, compact_vectors
+from app.embedding_engine import EMBEDDING_DIMENSIONS, normalize_embedding
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
-    print("Warning: GEMINI_API_KEY not found in environment variables.")
-
-client = genai.Client(api_key=GEMINI_API_KEY)
+    logger.warning("GEMINI_API_KEY not found in environment variables.")
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
-persist_directory = os.path.join(current_dir, "..", "chroma_db")
+persist_directory = os.getenv("CHROMA_PERSIST_DIR", os.path.join(current_dir, "..", "chroma_db"))
+
+# The Gemini SDK and ChromaDB are slow to import and open; both are created on first use
+# (or by `warm_up`) so importing this module stays cheap. Tests may assign either directly.
+client = None
+chroma_client = None
+_clients_lock = threading.Lock()
+
+# "ticker": one collection (HNSW index) per ticker, so a query searches only its shard.
+# "shared": the original single collection filtered by ticker metadata at query time.
+COLLECTION_LAYOUT = os.getenv("CHROMA_COLLECTION_LAYOUT", "ticker")
+SHARED_COLLECTION_NAME = "cognivest_docs"
+TICKER_COLLECTION_PREFIX = "ticker_"
+
+_collections = {}
+_collections_lock = threading.Lock()
+
+# "hybrid": dense and BM25 candidates fused with reciprocal rank fusion; "vector": dense only.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each ranking before fusion, as a multiple of n_results
+HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "4"))
+RRF_K = 60
+
+EMBEDDING_MODEL = "gemini-embedding-001"
+GENERATION_MODEL = "gemini-2.5-flash-lite"
+
+# Gemini generation calls in flight at once for one /api/query/batch request
+BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "8"))
 
-chroma_client = chromadb.PersistentClient(path=persist_directory)
-collection = chroma_client.get_or_create_collection(name="cognivest_docs")
+# ChromaDB queries are blocking; the async request path runs them on this bounded pool
+# so they never stall the event loop.
+VECTOR_SEARCH_WORKERS = int(os.getenv("VECTOR_SEARCH_WORKERS", "8"))
+vector_search_executor = ThreadPoolExecutor(max_workers=VECTOR_SEARCH_WORKERS, thread_name_prefix="vector-search")
 
-def get_gemini_embedding(text):
+def get_client():
+    global client
+    if client is None:
+        with _clients_lock:
+            if client is None:
+                from google import genai
+                client = genai.Client(api_key=GEMINI_API_KEY)
+    return client
+
+def get_chroma_client():
+    global chroma_client
+    if chroma_client is None:
+        with _clients_lock:
+            if chroma_client is None:
+                import chromadb
+                chroma_client = chromadb.PersistentClient(path=persist_directory)
+    return chroma_client
+
+def warm_up():
     """
-    Generates embedding using Gemini optimized for document retrieval.
+    Creates the Gemini and Chroma clients and imports the ingestion stack now, so the
+    first request does not pay for it.
     """
-    try:
-        result = client.models.embed_content(
-            model="gemini-embedding-001",
-            contents=text,
-            config=types.EmbedContentConfig(
-                task_type="RETRIEVAL_DOCUMENT",
-                title="Embedding of stock document"
-            )
-        )
-        return result.embeddings[0].values
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return []
+    get_client()
+    get_chroma_client()
+    from app import tasks  # noqa: F401
 
-def generate_answer(context, question):
+def embed_config(task_type, title=None):
+    from google.genai import types
+    if title:
+        return types.EmbedContentConfig(task_type=task_type, title=title, output_dimensionality=EMBEDDING_DIMENSIONS)
+    return types.EmbedContentConfig(task_type=task_type, output_dimensionality=EMBEDDING_DIMENSIONS)
+
+def ticker_collection_name(ticker: str):
+    """
+    Shard name for a ticker. Characters Chroma does not allow in names are replaced, with a
+    hash suffix so distinct tickers never share a shard.
+    """
+    symbol = ticker.strip().lower()
+    safe = re.sub(r"[^a-z0-9_-]", "-", symbol)
+    name = f"{TICKER_COLLECTION_PREFIX}{safe}"
+    if safe != symbol or not safe[-1:].isalnum():
+        name += "-" + hashlib.sha1(symbol.encode("utf-8")).hexdigest()[:8]
+    return name
+
+def get_collection(ticker: str, create: bool = True):
+    """
+    Routes a ticker to its collection. With create=False returns None when the ticker has
+    no collection yet, so queries for unknown tickers do not create empty shards.
+    """
+    name = SHARED_COLLECTION_NAME if COLLECTION_LAYOUT == "shared" else ticker_collection_name(ticker)
+    with _collections_lock:
+        handle = _collections.get(name)
+        if handle is not None:
+            return handle
+        if create:
+            handle = get_chroma_client().get_or_create_collection(name=name)
+        else:
+            try:
+                handle = get_chroma_client().get_collection(name=name)
+            except Exception:
+                return None
+        _collections[name] = handle
+        return handle
+
+def forget_collection(name: str):
     """
-    Generates an answer using Gemini based on the provided context.
+    Drops a cached handle, e.g. after the collection was deleted.
     """
+    with _collections_lock:
+        _collections.pop(name, None)
+
+def _collection_missing(error):
+    # A cached handle outlives its collection when another process deletes it (e.g. the
+    # shared-layout migration with --delete-source).
+    from chromadb.errors import NotFoundError
+    return isinstance(error, NotFoundError)
+
+def list_collection_names():
+    # Chroma >= 0.6 returns names, older versions return Collection objects.
+    return [getattr(c, "name", c) for c in get_chroma_client().list_collections()]
+
+def uses_compact_vectors():
+    # Compact copies are kept per ticker shard; the shared layout always uses Chroma's index.
+    return compact_vectors.VECTOR_STORAGE != "float32" and COLLECTION_LAYOUT == "ticker"
+
+def upsert_documents(ticker: str, ids, embeddings, documents, metadatas):
+    collection = get_collection(ticker)
     try:
-        print(f"\n--- Generating Answer ---")
-        print(f"Question: {question}")
-        
-        prompt = f"""
+        collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+    except Exception as e:
+        if not _collection_missing(e):
+            raise
+        forget_collection(collection.name)
+        collection = get_collection(ticker)
+        collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+    if uses_compact_vectors():
+        compact_vectors.upsert(collection.name, ids, embeddings)
+
+ERROR_ANSWER = "I'm sorry, I encountered an error while processing your request."
+
+def build_prompt(context, question):
+    return f"""
         You are a helpful investment assistant for Cognivest.
         Use the following context to answer the user's question.
         If the answer is not in the context, say you don't know.
@@ -56,61 +167,459 @@ def generate_answer(context, question):
         Question:
         {question}
         """
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite", 
-            contents=prompt
-        )
-        
-        print(f"Generated Answer: {response.text}")
-        print("-------------------------")
-        return response.text
+
+def _finish_reason(response):
+    candidates = getattr(response, "candidates", None) or []
+    reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    return getattr(reason, "name", reason)
+
+def _completed(text, finish_reason):
+    """
+    Whether a generation ran to its natural end with some text: no safety block, no
+    token limit hit, no empty response. Responses without a finish reason count as complete.
+    """
+    return bool(text and text.strip()) and finish_reason in (None, "STOP")
+
+def _generated(response):
+    text = response.text
+    finish_reason = _finish_reason(response)
+    logger.debug("Generated answer (%s): %s", finish_reason, text)
+    if not (text and text.strip()):
+        logger.warning("Gemini returned no answer text (finish reason %s)", finish_reason)
+        return ERROR_ANSWER, False
+    return text, _completed(text, finish_reason)
+
+def generate_answer(context, question):
+    """
+    Generates an answer using Gemini based on the provided context. Returns (answer,
+    complete); the answer is ERROR_ANSWER on failure.
+    """
+    try:
+        logger.debug("Generating answer for question: %s", question)
+        with observability.span("generate"):
+            response = get_client().models.generate_content(
+                model=GENERATION_MODEL, 
+                contents=build_prompt(context, question)
+            )
+        return _generated(response)
     except Exception as e:
-        print(f"Error generating answer: {e}")
-        return "I'm sorry, I encountered an error while processing your request."
+        logger.error("Error generating answer: %s", e)
+        return ERROR_ANSWER, False
 
-def query_vectors(question: str, ticker: str, n_results: int = 5):
+async def generate_answer_async(context, question):
     """
-    Queries ChromaDB for relevant documents.
+    Non-blocking `generate_answer` on the async Gemini client.
     """
     try:
-        print(f"\n--- Querying Vectors ---")
-        print(f"Query: {question} (Ticker: {ticker})")
-        
-        # We need to embed the query first
-        query_embedding = client.models.embed_content(
-            model="gemini-embedding-001",
-            contents=question,
-            config=types.EmbedContentConfig(
-                task_type="RETRIEVAL_QUERY"
+        logger.debug("Generating answer for question: %s", question)
+        with observability.span("generate"):
+            response = await get_client().aio.models.generate_content(
+                model=GENERATION_MODEL,
+                contents=build_prompt(context, question)
             )
+        return _generated(response)
+    except Exception as e:
+        logger.error("Error generating answer: %s", e)
+        return ERROR_ANSWER, False
+
+def embed_query(question: str):
+    """
+    Embeds a question for retrieval, reusing the vector for repeated (normalized) questions.
+    """
+    key = query_cache.normalize_question(question)
+    cached = query_cache.query_embeddings.get(key)
+    if cached is not None:
+        return cached
+    
+    with observability.span("embed_query"):
+        result = get_client().models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=question,
+            config=embed_config("RETRIEVAL_QUERY")
         )
-        
-        results = collection.query(
-            query_embeddings=[query_embedding.embeddings[0].values],
-            n_results=n_results,
-            where={"ticker": ticker}
+    vector = normalize_embedding(result.embeddings[0].values)
+    query_cache.query_embeddings.set(key, vector)
+    return vector
+
+async def embed_query_async(question: str):
+    key = query_cache.normalize_question(question)
+    cached = query_cache.query_embeddings.get(key)
+    if cached is not None:
+        return cached
+    
+    with observability.span("embed_query"):
+        result = await get_client().aio.models.embed_content(
+            model=EMBEDDING_MODEL,
+            contents=question,
+            config=embed_config("RETRIEVAL_QUERY")
         )
-        
-        context = ""
-        if results['documents']:
-            print(f"Found {len(results['documents'][0])} relevant documents.")
-            
-            context_parts = []
-            for i, doc in enumerate(results['documents'][0]):
-                meta = results['metadatas'][0][i] if results['metadatas'] else {}
-                source = meta.get('source', 'Unknown')
-                link = meta.get('link', 'No link')
-                
-                print(f"[Doc {i+1}] Source: {source} | Link: {link}")
-                print(f"Preview: {doc[:200]}...")
-                context_parts.append(doc)
-                
-            context = "\n\n".join(context_parts)
-        else:
-            print("No relevant documents found.")
-            
-        return context
+    vector = normalize_embedding(result.embeddings[0].values)
+    query_cache.query_embeddings.set(key, vector)
+    return vector
+
+def retrieve(question: str, ticker: str, n_results: int = 5):
+    """
+    Returns the top matches for a ticker as [{"id", "document", "metadata", "distance"}].
+    Results are cached until new documents for the ticker are ingested.
+    """
+    key = query_cache.retrieval_key(ticker, question, n_results)
+    cached = query_cache.retrievals.get(key)
+    if cached is not None:
+        return cached
+    
+    hits = search(embed_query(question), question, ticker, n_results)
+    query_cache.retrievals.set(key, hits)
+    return hits
+
+# Seconds between rebuilds of a collection's compact copy found out of step with Chroma
+COMPACT_REPAIR_INTERVAL = 300
+_compact_repairs = {}
+_compact_repairs_lock = threading.Lock()
+
+compact_fallbacks_total = observability.counter(
+    "cognivest_compact_vector_fallbacks_total", "Queries served from Chroma because the compact copy was missing or stale."
+)
+
+def _repair_compact(collection):
+    """
+    Rebuilds the collection's compact copy from Chroma in the background, at most once per
+    COMPACT_REPAIR_INTERVAL, so a missing or partial copy is not bypassed forever.
+    """
+    now = time.monotonic()
+    with _compact_repairs_lock:
+        if now - _compact_repairs.get(collection.name, -COMPACT_REPAIR_INTERVAL) < COMPACT_REPAIR_INTERVAL:
+            return
+        _compact_repairs[collection.name] = now
+    logger.warning("Compact vectors for %s missing or stale; using the Chroma index while they are rebuilt.", collection.name)
+
+    def rebuild():
+        try:
+            count = compact_vectors.rebuild(collection.name, collection)
+            logger.info("Rebuilt compact vectors for %s (%d vectors)", collection.name, count)
+        except Exception as e:
+            logger.exception("Rebuilding compact vectors for %s failed: %s", collection.name, e)
+
+    threading.Thread(target=rebuild, name=f"compact-repair-{collection.name}", daemon=True).start()
+
+def search_compact(collection, query_embedding, n_results: int):
+    """
+    `search_vectors` over the collection's float16 / int8 copy. Returns None when the copy
+    is missing or out of step with Chroma, so the caller falls back to the HNSW index.
+    """
+    vectors = compact_vectors.load(collection.name)
+    if vectors is None or len(vectors) != collection.count():
+        compact_fallbacks_total.inc()
+        _repair_compact(collection)
+        return None
+    ranked = vectors.search(query_embedding, n_results, compact_vectors.VECTOR_STORAGE)
+    if not ranked:
+        return []
+    found = collection.get(ids=[doc_id for doc_id, _ in ranked], include=["documents", "metadatas"])
+    rows = {
+        doc_id: (doc, meta)
+        for doc_id, doc, meta in zip(found['ids'], found['documents'], found['metadatas'] or [{}] * len(found['ids']))
+    }
+    return [
+        {"id": doc_id, "document": rows[doc_id][0], "metadata": rows[doc_id][1], "distance": distance}
+        for doc_id, distance in ranked if doc_id in rows
+    ]
+
+def search_vectors(query_embedding, ticker: str, n_results: int = 5):
+    collection = get_collection(ticker, create=False)
+    if collection is None:
+        return []
+    try:
+        return _search_collection(collection, query_embedding, ticker, n_results)
+    except Exception as e:
+        if not _collection_missing(e):
+            raise
+        forget_collection(collection.name)
+        collection = get_collection(ticker, create=False)
+        if collection is None:
+            return []
+        return _search_collection(collection, query_embedding, ticker, n_results)
+
+def _search_collection(collection, query_embedding, ticker: str, n_results: int):
+    if uses_compact_vectors():
+        hits = search_compact(collection, query_embedding, n_results)
+        if hits is not None:
+            return hits
+    # A ticker shard holds only that ticker's vectors, so no metadata filter is needed.
+    where = {"ticker": ticker} if COLLECTION_LAYOUT == "shared" else None
+    results = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=n_results,
+        where=where
+    )
+    
+    hits = []
+    if results['documents']:
+        for i, doc in enumerate(results['documents'][0]):
+            hits.append({
+                "id": results['ids'][0][i],
+                "document": doc,
+                "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
+                "distance": results['distances'][0][i] if results.get('distances') else None
+            })
+    return hits
+
+def fuse_rankings(rankings, n_results, k=RRF_K):
+    """
+    Reciprocal rank fusion: each document scores sum(1 / (k + rank)) over the rankings it
+    appears in. Keeps the first-seen hit (dense hits carry a distance) for each id.
+    """
+    scores = {}
+    hits = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            scores[hit['id']] = scores.get(hit['id'], 0.0) + 1.0 / (k + rank + 1)
+            hits.setdefault(hit['id'], hit)
+    ordered = sorted(scores, key=scores.get, reverse=True)[:n_results]
+    return [
+        {
+            "id": doc_id,
+            "document": hits[doc_id]['document'],
+            "metadata": hits[doc_id]['metadata'],
+            "distance": hits[doc_id].get('distance'),
+        }
+        for doc_id in ordered
+    ]
+
+def search(query_embedding, question: str, ticker: str, n_results: int = 5):
+    """
+    Blocking retrieval in the configured RETRIEVAL_MODE.
+    """
+    with observability.span("retrieve"):
+        if RETRIEVAL_MODE != "hybrid":
+            return search_vectors(query_embedding, ticker, n_results)
+        candidates = n_results * HYBRID_CANDIDATE_MULTIPLIER
+        dense = search_vectors(query_embedding, ticker, candidates)
+        try:
+            lexical = lexical_index.get_lexical_index().search(ticker, question, candidates)
+        except Exception as e:
+            logger.warning("Lexical search failed, using dense results only: %s", e)
+            lexical = []
+        return fuse_rankings([dense, lexical], n_results)
+
+async def retrieve_async(question: str, ticker: str, n_results: int = 5, query_embedding=None):
+    """
+    `retrieve` for the event loop: async embedding call, index searches on the executor.
+    Pass `query_embedding` to reuse a vector already computed for the question.
+    """
+    key = query_cache.retrieval_key(ticker, question, n_results)
+    cached = query_cache.retrievals.get(key)
+    if cached is not None:
+        return cached
+    
+    if query_embedding is None:
+        query_embedding = await embed_query_async(question)
+    loop = asyncio.get_running_loop()
+    hits = await loop.run_in_executor(
+        vector_search_executor,
+        functools.partial(search, query_embedding, question, ticker, n_results)
+    )
+    query_cache.retrievals.set(key, hits)
+    return hits
+
+def prepare_context(hits):
+    """
+    Deduplicates and packs hits into the context token budget.
+    Returns (context, used_hits, report).
+    """
+    if not hits:
+        logger.info("No relevant documents found.")
+        return "", [], context_assembly.assemble_context([])[2]
+    
+    with observability.span("context"):
+        context, used, report = context_assembly.assemble_context(hits)
+    observability.context_tokens_saved.inc(report['tokens_saved'])
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, hit in enumerate(used):
+            meta = hit['metadata'] or {}
+            logger.debug(
+                "[Doc %d] Source: %s | Link: %s | Preview: %s...",
+                i + 1, meta.get('source', 'Unknown'), meta.get('link', 'No link'), hit['document'][:200]
+            )
+    logger.info(
+        "Context: %d/%d chunks, %d tokens (%d saved; %d duplicates removed)",
+        report['chunks_used'], report['chunks_in'], report['tokens_used'],
+        report['tokens_saved'], report['duplicates_removed'],
+        extra={"context": report}
+    )
+    return context, used, report
+
+def _retrieve_for_answer(question: str, ticker: str, n_results: int):
+    try:
+        logger.info("Querying vectors for %s: %s", ticker, question)
+        return retrieve(question, ticker, n_results)
+    except Exception as e:
+        logger.error("Error querying vectors for %s: %s", ticker, e)
+        return []
+
+async def _retrieve_for_answer_async(question: str, ticker: str, n_results: int, query_embedding=None):
+    try:
+        logger.info("Querying vectors for %s: %s", ticker, question)
+        return await retrieve_async(question, ticker, n_results, query_embedding=query_embedding)
     except Exception as e:
-        print(f"Error querying vectors: {e}")
-        return ""
+        logger.error("Error querying vectors for %s: %s", ticker, e)
+        return []
+
+def prepare_answer(question: str, ticker: str, hits, with_sources: bool = False):
+    """
+    Everything every answer path does before calling the model: the answer-cache lookup
+    and, on a miss (or when `with_sources`), the packed context. Returns a dict with
+    "key", "cached" (the cached answer or None), "context", "used" and "report".
+    """
+    key = query_cache.answer_key(ticker, question, [hit['id'] for hit in hits])
+    prepared = {"key": key, "cached": query_cache.answers.get(key), "context": None, "used": [], "report": None}
+    if prepared["cached"] is not None:
+        logger.info("Answer served from cache.")
+        if not with_sources:
+            return prepared
+    prepared["context"], prepared["used"], prepared["report"] = prepare_context(hits)
+    return prepared
+
+def remember_answer(prepared, answer, complete=True):
+    """
+    Caches only answers that are non-empty and ran to completion, so a failed, blocked or
+    cut-off generation is retried next time instead of being served from memory.
+    """
+    if complete and answer != ERROR_ANSWER and answer.strip():
+        query_cache.answers.set(prepared["key"], answer)
+
+def answer_question(question: str, ticker: str, n_results: int = 5):
+    """
+    Retrieval + generation with caching. A repeated question over the same retrieved
+    documents is answered from memory without any Gemini call.
+    """
+    prepared = prepare_answer(question, ticker, _retrieve_for_answer(question, ticker, n_results))
+    if prepared["cached"] is not None:
+        return prepared["cached"]
+    answer, complete = generate_answer(prepared["context"], question)
+    remember_answer(prepared, answer, complete)
+    return answer
+
+async def answer_question_async(question: str, ticker: str, n_results: int = 5):
+    """
+    `answer_question` on the async Gemini client; safe to await from request handlers.
+    """
+    prepared = prepare_answer(question, ticker, await _retrieve_for_answer_async(question, ticker, n_results))
+    if prepared["cached"] is not None:
+        return prepared["cached"]
+    answer, complete = await generate_answer_async(prepared["context"], question)
+    remember_answer(prepared, answer, complete)
+    return answer
+
+def source_summaries(hits):
+    """
+    Client-facing description of the retrieved documents.
+    """
+    return [
+        {
+            "id": hit['id'],
+            "source": (hit['metadata'] or {}).get('source', 'Unknown'),
+            "link": (hit['metadata'] or {}).get('link', 'No link'),
+            "preview": hit['document'][:200]
+        }
+        for hit in hits
+    ]
+
+async def stream_answer(question: str, ticker: str, n_results: int = 5):
+    """
+    Async generator of (event, data) pairs for streaming responses: one "sources" event as
+    soon as retrieval finishes, then "token" events as Gemini produces text, then "done".
+    """
+    hits = await _retrieve_for_answer_async(question, ticker, n_results)
+    prepared = prepare_answer(question, ticker, hits, with_sources=True)
+    yield "sources", source_summaries(prepared["used"])
+    
+    if prepared["cached"] is not None:
+        yield "token", prepared["cached"]
+        yield "done", {"cached": True}
+        return
+    
+    parts = []
+    finish_reason = None
+    try:
+        logger.debug("Generating streamed answer for question: %s", question)
+        with observability.span("generate"):
+            stream = await get_client().aio.models.generate_content_stream(
+                model=GENERATION_MODEL,
+                contents=build_prompt(prepared["context"], question)
+            )
+            async for chunk in stream:
+                finish_reason = _finish_reason(chunk) or finish_reason
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield "token", chunk.text
+    except Exception as e:
+        logger.error("Error generating answer: %s", e)
+        if not parts:
+            yield "token", ERROR_ANSWER
+        yield "error", {"message": str(e)}
+        return
+    
+    # Only reached when the client read the whole stream; a disconnect closes the
+    # generator at its last yield and nothing is cached.
+    answer = "".join(parts)
+    if not answer.strip():
+        logger.warning("Gemini returned no answer text (finish reason %s)", finish_reason)
+        yield "token", ERROR_ANSWER
+    remember_answer(prepared, answer, _completed(answer, finish_reason))
+    yield "done", {"cached": False, "context": prepared["report"]}
+
+
+async def _answer_for_ticker(question: str, ticker: str, query_embedding, n_results: int, generation_slots):
+    started = time.perf_counter()
+    hits = await _retrieve_for_answer_async(question, ticker, n_results, query_embedding=query_embedding)
+    
+    result = {"ticker": ticker, "answer": ERROR_ANSWER, "sources": [], "cached": False, "error": True, "context_tokens": 0}
+    try:
+        prepared = prepare_answer(question, ticker, hits, with_sources=True)
+        answer = prepared["cached"]
+        result.update(sources=source_summaries(prepared["used"]), context_tokens=prepared["report"]["tokens_used"],
+                      cached=answer is not None)
+        if answer is None:
+            async with generation_slots:
+                answer, complete = await generate_answer_async(prepared["context"], question)
+            remember_answer(prepared, answer, complete)
+        result.update(answer=answer, error=answer == ERROR_ANSWER)
+    except Exception as e:
+        logger.exception("Error answering for %s: %s", ticker, e)
+    
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+async def answer_batch(question: str, tickers, n_results: int = 5):
+    """
+    Async generator answering one question for many tickers. The question is embedded
+    once, per-ticker searches run concurrently on the vector-search executor, and at most
+    BATCH_GENERATION_CONCURRENCY generations run at a time. Yields ("answer", result) in
+    completion order, then ("done", summary).
+    """
+    started = time.perf_counter()
+    logger.info("Batch query over %d tickers: %s", len(tickers), question)
+    try:
+        query_embedding = await embed_query_async(question)
+    except Exception as e:
+        logger.error("Error embedding question: %s", e)
+        yield "error", {"message": str(e)}
+        return
+    
+    generation_slots = asyncio.Semaphore(BATCH_GENERATION_CONCURRENCY)
+    pending = [
+        asyncio.ensure_future(_answer_for_ticker(question, ticker, query_embedding, n_results, generation_slots))
+        for ticker in tickers
+    ]
+    failed = 0
+    try:
+        for next_done in asyncio.as_completed(pending):
+            result = await next_done
+            failed += result["error"]
+            yield "answer", result
+    finally:
+        # The client went away mid-batch: stop the remaining generations.
+        for task in pending:
+            task.cancel()
+    
+    yield "done", {"answered": len(tickers) - failed, "failed": failed, "seconds": round(time.perf_counter() - started, 3)}
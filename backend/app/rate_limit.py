@@ -0,0 +1,106 @@
+"""
+Token-bucket rate limiters shared by every thread and worker process on the host.
+
+Bucket state lives in a small SQLite file and is updated inside an IMMEDIATE
+transaction, so concurrent ingestion jobs draw from one budget per upstream instead of
+each pacing itself with fixed sleeps.
+"""
+import os
+import time
+import sqlite3
+import threading
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", os.path.join(current_dir, "..", "rate_limits.db"))
+
+# requests per second, burst capacity
+UPSTREAM_LIMITS = {
+    # SEC fair-access policy allows 10 requests/second per client.
+    "sec": (float(os.getenv("SEC_RATE_PER_SEC", "8")), float(os.getenv("SEC_BURST", "8"))),
+    # Free Alpha Vantage keys allow 5 requests/minute.
+    "alpha_vantage": (float(os.getenv("ALPHA_VANTAGE_RATE_PER_SEC", "0.083")), float(os.getenv("ALPHA_VANTAGE_BURST", "5"))),
+    "gemini": (float(os.getenv("GEMINI_RATE_PER_SEC", "10")), float(os.getenv("GEMINI_BURST", "10"))),
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised by `TokenBucket.acquire` when the tokens cannot be had before the deadline.
+    """
+
+
+class TokenBucket:
+    def __init__(self, name, rate, capacity, path=RATE_LIMIT_DB):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _try_take(self, tokens):
+        """
+        Takes `tokens` if available; otherwise returns the seconds until they will be.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            available = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+            if available >= tokens:
+                available -= tokens
+                wait = 0.0
+            else:
+                wait = (tokens - available) / self.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, available, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self, tokens=1.0, deadline=None):
+        """
+        Blocks until `tokens` are available and takes them. Returns the seconds spent waiting.
+        With a `deadline` (a time.monotonic() value) raises DeadlineExceeded instead of
+        waiting past it; no tokens are taken then.
+        """
+        waited = 0.0
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded(f"{self.name} rate limit: deadline passed after waiting {waited:.1f}s")
+            wait = self._try_take(tokens)
+            if wait <= 0:
+                return waited
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise DeadlineExceeded(f"{self.name} rate limit: next token in {wait:.1f}s, after the deadline")
+            time.sleep(wait)
+            waited += wait
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def limiter(upstream):
+    """
+    The shared bucket for an upstream in UPSTREAM_LIMITS ("sec", "alpha_vantage", "gemini").
+    """
+    with _buckets_lock:
+        if upstream not in _buckets:
+            rate, capacity = UPSTREAM_LIMITS[upstream]
+            _buckets[upstream] = TokenBucket(upstream, rate, capacity)
+        return _buckets[upstream]
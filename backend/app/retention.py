@@ -0,0 +1,268 @@
+"""
+Retention rules and compaction for the vector store.
+
+Every vector carries `doc_type`, `ingested_at` and, for filings, `form`, `accession_number`
+and `report_date` (see `tasks.vector_metadata`). Compaction expires:
+
+- news ingested more than NEWS_RETENTION_DAYS ago
+- filings superseded by newer ones: per ticker and form only the FILING_VERSIONS_KEPT
+  most recent accessions (by report date) are kept
+
+Expired ids are deleted in bulk from the compact vector copies, the BM25 index and then
+the Chroma collections; a collection that fails is reported and retried on the next run. Collections are never dropped, even when emptied, since other
+processes hold handles to them. Tickers with an ingestion task pending or running are
+left alone until the next run. Vectors stored before this metadata existed are
+classified from their text and link, and stamped with the current time, so they age out
+like the rest. IndexedFiling rows are kept, so superseded filings are not downloaded again.
+
+Runs periodically in the worker pool (COMPACTION_INTERVAL_HOURS), or once with
+`python -m app.retention [--dry-run] [--vacuum]`.
+"""
+import os
+import re
+import json
+import time
+import logging
+import argparse
+from app import rag_pipeline, compact_vectors, query_cache, observability, database, worker
+from app.lexical_index import get_lexical_index
+
+logger = logging.getLogger(__name__)
+
+# 0 disables a rule
+NEWS_RETENTION_DAYS = float(os.getenv("NEWS_RETENTION_DAYS", "30"))
+FILING_VERSIONS_KEPT = int(os.getenv("FILING_VERSIONS_KEPT", "1"))
+COMPACTION_INTERVAL_HOURS = float(os.getenv("COMPACTION_INTERVAL_HOURS", "24"))
+COMPACTION_PAGE_SIZE = 1000
+DELETE_BATCH_SIZE = 5000
+
+_FILING_TEXT = re.compile(r"^SEC Filing (\S+) (?:\((\d{4}-\d{2}-\d{2})\)|- Date: (\d{4}-\d{2}-\d{2}))")
+_ARCHIVE_LINK = re.compile(r"/Archives/edgar/data/\d+/(\d{10})(\d{2})(\d{6})/")
+
+deleted_total = observability.counter(
+    "cognivest_compaction_deleted_total", "Vectors removed by compaction, by retention rule.", labels=("reason",)
+)
+
+
+def classify_legacy(document, meta):
+    """
+    Retention metadata for a vector stored without it, inferred from the chunk text and link.
+    """
+    meta = dict(meta or {})
+    link = meta.get("link") or ""
+    archive = _ARCHIVE_LINK.search(link)
+    match = _FILING_TEXT.match(document or "")
+    if meta.get("source") == "SEC" or archive or match:
+        meta["doc_type"] = "filing"
+        if match:
+            meta.setdefault("form", match.group(1))
+            meta.setdefault("report_date", match.group(2) or match.group(3))
+        if archive:
+            meta.setdefault("accession_number", "-".join(archive.groups()))
+    else:
+        meta["doc_type"] = "news"
+    meta["ingested_at"] = int(time.time())
+    return meta
+
+
+def expired_ids(entries, now=None):
+    """
+    Applies the retention rules to [(id, metadata)]. Returns {id: reason}.
+    """
+    now = now or time.time()
+    expired = {}
+    news_cutoff = now - NEWS_RETENTION_DAYS * 86400 if NEWS_RETENTION_DAYS > 0 else None
+    filings = {}
+    for doc_id, meta in entries:
+        if meta.get("doc_type") == "news":
+            if news_cutoff is not None and meta.get("ingested_at", now) < news_cutoff:
+                expired[doc_id] = "news_age"
+        elif meta.get("doc_type") == "filing" and meta.get("accession_number"):
+            key = (meta.get("ticker"), meta.get("form"))
+            versions = filings.setdefault(key, {})
+            versions.setdefault(meta["accession_number"], (meta.get("report_date") or "", []))[1].append(doc_id)
+
+    if FILING_VERSIONS_KEPT > 0:
+        for versions in filings.values():
+            ordered = sorted(versions.items(), key=lambda item: (item[1][0], item[0]), reverse=True)
+            for _, (_, ids) in ordered[FILING_VERSIONS_KEPT:]:
+                for doc_id in ids:
+                    expired[doc_id] = "superseded_filing"
+    return expired
+
+
+def _scan(collection, dry_run=False):
+    """
+    All (id, metadata) pairs of a collection, stamping legacy vectors on the way (unless
+    `dry_run`).
+    """
+    entries = []
+    legacy = []
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=COMPACTION_PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        for doc_id, meta in zip(page["ids"], page["metadatas"]):
+            if meta and "doc_type" in meta and "ingested_at" in meta:
+                entries.append((doc_id, meta))
+            else:
+                legacy.append(doc_id)
+
+    for start in range(0, len(legacy), COMPACTION_PAGE_SIZE):
+        ids = legacy[start:start + COMPACTION_PAGE_SIZE]
+        page = collection.get(ids=ids, include=["documents", "metadatas"])
+        metas = [classify_legacy(doc, meta) for doc, meta in zip(page["documents"], page["metadatas"])]
+        if not dry_run:
+            collection.update(ids=page["ids"], metadatas=metas)
+        entries.extend(zip(page["ids"], metas))
+    return entries, len(legacy)
+
+
+def active_tickers():
+    """
+    Tickers with an ingestion task pending or running, whose vectors are being written.
+    Tasks orphaned by a stopped API process (`worker.is_orphaned`) do not count.
+    """
+    db = database.SessionLocal()
+    try:
+        tasks = db.query(database.Task).filter(
+            database.Task.status.in_(worker.ACTIVE_STATUSES), database.Task.ticker.isnot(None)
+        ).all()
+        return {task.ticker.upper() for task in tasks if not worker.is_orphaned(task)}
+    finally:
+        db.close()
+
+
+def _directory_bytes(path):
+    total = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _file_bytes(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def _compact_collection(name, index, busy, report, dry_run):
+    """
+    Applies the retention rules to one collection, adding to `report`. Returns the busy
+    tickers that were skipped.
+    """
+    collection = rag_pipeline.get_chroma_client().get_collection(name=name)
+    entries, stamped = _scan(collection, dry_run)
+    report["legacy_stamped"] += stamped
+    skipped = {meta.get("ticker") for _, meta in entries if (meta.get("ticker") or "").upper() in busy}
+    entries = [(doc_id, meta) for doc_id, meta in entries if (meta.get("ticker") or "").upper() not in busy]
+    expired = expired_ids(entries)
+    if not expired:
+        return skipped
+
+    tickers = {meta.get("ticker") for doc_id, meta in entries if doc_id in expired}
+    reasons = {}
+    for reason in expired.values():
+        reasons[reason] = reasons.get(reason, 0) + 1
+    sample = collection.get(ids=[next(iter(expired))], include=["embeddings"])["embeddings"]
+    dims = len(sample[0]) if len(sample) else 0
+    report["collections"][name] = {"vectors": len(entries), "deleted": len(expired), "reasons": reasons}
+    if dry_run:
+        _count_deleted(report, expired, reasons, dims)
+        return skipped
+
+    # The derived copies go first: if anything fails, the ids are still in Chroma and
+    # the next run deletes them again.
+    ids = list(expired)
+    compact_vectors.delete(name, ids)
+    for batch_start in range(0, len(ids), DELETE_BATCH_SIZE):
+        batch = ids[batch_start:batch_start + DELETE_BATCH_SIZE]
+        index.delete_documents(batch)
+        collection.delete(ids=batch)
+    _count_deleted(report, expired, reasons, dims)
+    for reason, count in reasons.items():
+        deleted_total.inc(count, reason=reason)
+    for ticker in tickers:
+        if ticker:
+            query_cache.invalidate_ticker(ticker)
+    return skipped
+
+
+def _count_deleted(report, expired, reasons, dims):
+    report["deleted"] += len(expired)
+    report["vector_bytes_reclaimed"] += len(expired) * dims * 4
+    for reason, count in reasons.items():
+        report["reasons"][reason] = report["reasons"].get(reason, 0) + count
+
+
+def compact(dry_run=False, vacuum=False):
+    """
+    Deletes every expired vector. Returns a report of what was removed and the disk space
+    before and after.
+    """
+    index = get_lexical_index()
+    report = {
+        "dry_run": dry_run,
+        "collections": {},
+        "deleted": 0,
+        "legacy_stamped": 0,
+        "skipped_tickers": [],
+        "failed_collections": {},
+        "reasons": {},
+        "vector_bytes_reclaimed": 0,
+        "disk_before": {
+            "chroma": _directory_bytes(rag_pipeline.persist_directory),
+            "lexical": _file_bytes(index.path),
+            "compact": _directory_bytes(compact_vectors.COMPACT_VECTOR_DIR),
+        },
+    }
+    start = time.perf_counter()
+    busy = active_tickers()
+    skipped = set()
+    for name in rag_pipeline.list_collection_names():
+        try:
+            skipped |= _compact_collection(name, index, busy, report, dry_run)
+        except Exception as e:
+            logger.exception("Compaction of collection %s failed: %s", name, e)
+            report["failed_collections"][name] = str(e)
+
+    report["skipped_tickers"] = sorted(skipped)
+    if vacuum and not dry_run and report["deleted"]:
+        index.optimize()
+    report["disk_after"] = {
+        "chroma": _directory_bytes(rag_pipeline.persist_directory),
+        "lexical": _file_bytes(index.path),
+        "compact": _directory_bytes(compact_vectors.COMPACT_VECTOR_DIR),
+    }
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info("Compaction finished: %d vectors deleted", report["deleted"], extra={"compaction": report})
+    return report
+
+
+def run_periodically(interval_hours=COMPACTION_INTERVAL_HOURS, stop=None):
+    """
+    Compacts every `interval_hours` until `stop` (a threading.Event) is set.
+    """
+    while True:
+        try:
+            compact()
+        except Exception as e:
+            logger.exception("Compaction failed: %s", e)
+        if stop is None:
+            time.sleep(interval_hours * 3600)
+        elif stop.wait(interval_hours * 3600):
+            return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete vectors expired by the retention rules.")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be deleted without deleting")
+    parser.add_argument("--vacuum", action="store_true", help="also rebuild the BM25 index file to release space")
+    args = parser.parse_args()
+    observability.configure_logging()
+    database.init_db()
+    print(json.dumps(compact(dry_run=args.dry_run, vacuum=args.vacuum), indent=2))
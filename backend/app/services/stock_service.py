@@ -1,38 +1,24 @@
+import logging
 import yfinance as yf
-import pandas as pd
+import datetime
+from app import price_store
+
+logger = logging.getLogger(__name__)
 
 def get_stock_data(ticker: str):
     """
-    Fetches historical stock data for the given ticker using yfinance.
-    Returns a list of dictionaries with date, open, high, low, close.
+    Returns the last year of daily bars for the ticker from the local price store,
+    as a list of dictionaries with date, open, high, low, close, volume.
     """
     try:
-        # Fetch data for the last 1 year or so to populate the chart
-        stock = yf.Ticker(ticker)
-        # 1y is a good default for a chart
-        hist = stock.history(period="1y") 
-        
-        # Reset index to get Date as a column
-        hist.reset_index(inplace=True)
-        
-        # Select relevant columns and rename if necessary (though frontend expects specific format)
-        # Looking at frontend StockChart.vue might verify format, but usually Date, Close is enough.
-        # Let's return Date, Open, High, Low, Close, Volume for potential candlestick charts
-        
-        data = []
-        for index, row in hist.iterrows():
-            data.append({
-                "date": row["Date"].strftime("%Y-%m-%d"),
-                "open": row["Open"],
-                "high": row["High"],
-                "low": row["Low"],
-                "close": row["Close"],
-                "volume": row["Volume"]
-            })
-            
-        return data
+        start = (datetime.date.today() - datetime.timedelta(days=365)).isoformat()
+        bars = price_store.get_bars(ticker, start=start)
+        columns = price_store.to_columns(bars)
+        keys = ["date"] + list(price_store.COLUMNS)
+        rows = zip(columns["dates"], *(columns[c] for c in price_store.COLUMNS))
+        return [dict(zip(keys, row)) for row in rows]
     except Exception as e:
-        print(f"Error fetching stock data for {ticker}: {e}")
+        logger.error("Error fetching stock data for %s: %s", ticker, e)
         return []
 
 def get_stock_info(ticker: str):
@@ -43,5 +29,5 @@ def get_stock_info(ticker: str):
         stock = yf.Ticker(ticker)
         return stock.info
     except Exception as e:
-        print(f"Error fetching stock info for {ticker}: {e}")
+        logger.error("Error fetching stock info for %s: %s", ticker, e)
         return {}
@@ -1,15 +1,19 @@
 import os
-import requests
-import uuid
-import yfinance as yf
-from alpha_vantage.timeseries import TimeSeries
-from app import rag_pipeline, database
-from app.database import Task
+from app import rag_pipeline, database, cik_index, text_stream, chunking, query_cache, progress, rate_limit, observability, http_client
+from app.embedding_engine import EmbeddingEngine
+from app.embedding_cache import get_embedding_cache, document_id
+from app.lexical_index import get_lexical_index
+from app.database import Task, SecLedger, IndexedFiling
 from sqlalchemy.orm import Session
 import datetime
-from bs4 import BeautifulSoup
 import re
 import time
+import json
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
 
 # Alpha Vantage Setup
 ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
@@ -18,7 +22,41 @@ ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
 # SEC requires a user agent in the format: "AppName/Version (Email)" or similar.
 SEC_USER_AGENT = os.getenv("SEC_API_USER_AGENT", "CognivestAI/1.0 (cognivest_dev@example.com)")
 
+SEC_STREAM_CHUNK_BYTES = 64 * 1024
+
+# Documents pulled from the fetch stage per embed + upsert round; bounds memory for streamed filings.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "200"))
+
+# Per-document fields kept for the SEC ledger once the chunk text itself is released
+LEDGER_KEYS = ("id", "accession_number", "form", "report_date", "download_failed", "sec_validators")
+
+# Per-source deadlines for the concurrent fetch stage (seconds)
+FETCH_TIMEOUTS = {
+    "sec": float(os.getenv("FETCH_TIMEOUT_SEC", "120")),
+    "alpha_vantage": float(os.getenv("FETCH_TIMEOUT_ALPHA_VANTAGE", "20")),
+    "yfinance": float(os.getenv("FETCH_TIMEOUT_YFINANCE", "20")),
+}
+
+# Progress messages are also written to the Task row at most this often (seconds), for
+# clients following a task that runs in another process
+PROGRESS_PERSIST_SECONDS = float(os.getenv("PROGRESS_PERSIST_SECONDS", "2"))
+_persisted_at = {}
+
 def update_task_db(db: Session, task_id: str, status: str, message: str = None):
+    """
+    Publishes progress to in-process subscribers. The Task row is written on status
+    transitions and otherwise at most every PROGRESS_PERSIST_SECONDS.
+    """
+    previous = progress.bus.latest(task_id)
+    progress.bus.publish(task_id, status, message)
+    now = time.monotonic()
+    transition = previous is None or previous["status"] != status
+    if not transition and now - _persisted_at.get(task_id, 0) < PROGRESS_PERSIST_SECONDS:
+        return
+    if status in progress.TERMINAL_STATUSES:
+        _persisted_at.pop(task_id, None)
+    else:
+        _persisted_at[task_id] = now
     task = db.query(Task).filter(Task.id == task_id).first()
     if task:
         task.status = status
@@ -26,10 +64,20 @@ def update_task_db(db: Session, task_id: str, status: str, message: str = None):
             task.message = message
         db.commit()
 
+def record_task_timings(db: Session, task_id: str, stage: str, timings: dict):
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if task:
+        current = json.loads(task.timings) if task.timings else {}
+        current[stage] = timings
+        task.timings = json.dumps(current)
+        db.commit()
+
 def clean_html_content(html_content):
     """
     Cleans HTML content to extract text.
     """
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_content, 'html.parser')
     
     # Remove script and style elements
@@ -64,52 +112,157 @@ def chunk_text(text, chunk_size=2000, overlap=200):
         
     return chunks
 
-def fetch_sec_filings(ticker: str):
+def get_indexed_accessions(db: Session, ticker: str):
+    rows = db.query(IndexedFiling.accession_number).filter(IndexedFiling.ticker == ticker.upper()).all()
+    return {row[0] for row in rows}
+
+def save_sec_validators(db: Session, ticker: str, validators: dict):
+    """
+    Stores the submissions feed ETag/Last-Modified so the next run can send a conditional request.
+    """
+    if not validators:
+        return
+    ledger = db.query(SecLedger).filter(SecLedger.ticker == ticker.upper()).first()
+    if not ledger:
+        ledger = SecLedger(ticker=ticker.upper())
+        db.add(ledger)
+    ledger.etag = validators.get("etag")
+    ledger.last_modified = validators.get("last_modified")
+    ledger.checked_at = datetime.datetime.utcnow()
+    db.commit()
+
+def record_sec_ingestion(db: Session, ticker: str, sec_docs: list, stored_ids: set):
+    """
+    Marks filings as indexed once every one of their chunks has been stored, then
+    advances the submissions validators. Filings with any failed chunk stay unrecorded
+    so the next run retries them.
+    """
+    filings = {}
+    for d in sec_docs:
+        acc = d.get("accession_number")
+        if not acc:
+            continue
+        entry = filings.setdefault(acc, {"form": d.get("form"), "report_date": d.get("report_date"), "complete": True})
+        if d.get("download_failed") or d.get("id") not in stored_ids:
+            entry["complete"] = False
+
+    already = get_indexed_accessions(db, ticker)
+    for acc, entry in filings.items():
+        if entry["complete"] and acc not in already:
+            db.add(IndexedFiling(
+                ticker=ticker.upper(),
+                accession_number=acc,
+                form=entry["form"],
+                report_date=entry["report_date"]
+            ))
+    db.commit()
+
+    if all(entry["complete"] for entry in filings.values()):
+        validators = next((d["sec_validators"] for d in sec_docs if d.get("sec_validators")), None)
+        save_sec_validators(db, ticker, validators)
+
+def iter_filing_documents(filing: dict, headers: dict):
     """
-    Fetches recent 10-K/10-Q filings from SEC EDGAR, downloads full text, and chunks it.
+    Streams one filing: the response is read incrementally, parsed event by event and
+    chunked on the fly, so peak memory is bounded by the chunk size rather than the
+    filing size and embedding can start before the download finishes.
+    """
+    form = filing["form"]
+    report_date = filing["report_date"]
+    doc_link = filing["link"]
+    logger.info("Fetching filing content from %s", doc_link)
+    
+    count = 0
+    try:
+        with http_client.get(doc_link, "sec_archives", headers=headers, stream=True) as doc_resp:
+            if doc_resp.status_code != 200:
+                logger.warning("Failed to download filing text from %s: HTTP %s", doc_link, doc_resp.status_code)
+                # Fallback
+                content = f"SEC Filing {form} - Date: {report_date}\nLink: {doc_link}\n(Content download failed)"
+                yield dict(filing, content=content, download_failed=True)
+                return
+            
+            # Download, parsing and chunking are interleaved; timing each layer of the
+            # stream separately gives per-stage time by subtraction.
+            download = observability.TimedIterator(doc_resp.iter_content(chunk_size=SEC_STREAM_CHUNK_BYTES))
+            text = observability.TimedIterator(
+                text_stream.iter_normalized_text(text_stream.iter_html_text(download))
+            )
+            chunks = observability.TimedIterator(chunking.iter_token_chunks(text))
+            for chunk in chunks:
+                count += 1
+                yield dict(
+                    filing,
+                    content=f"SEC Filing {form} ({report_date}) - Part {count}:\n{chunk}",
+                    metadata_suffix=f" - Part {count}"
+                )
+            observability.observe_stage("fetch", download.seconds)
+            observability.observe_stage("clean", text.seconds - download.seconds, items=count)
+            observability.observe_stage("chunk", chunks.seconds - text.seconds, items=count)
+        logger.info("Parsed %d chunks from %s %s", count, form, filing.get("accession_number"))
+    except Exception as doc_e:
+        logger.warning("Exception downloading %s after %d chunks: %s", doc_link, count, doc_e)
+        content = f"SEC Filing {form} - Date: {report_date}\nLink: {doc_link}\n(Download error: {doc_e})"
+        yield dict(filing, content=content, download_failed=True)
+
+def fetch_sec_filings(ticker: str, db: Session = None, deadline=None):
+    """
+    Fetches recent 10-K/10-Q filings from SEC EDGAR and returns an iterator of their chunks.
+    `deadline` (time.monotonic()) bounds the submissions lookup, not the filing downloads.
+
+    With a DB session the per-ticker ledger is consulted: the submissions feed is requested
+    conditionally (If-None-Match / If-Modified-Since) and filings whose accession number is
+    already indexed are skipped, so unchanged tickers cost a single 304.
     """
     try:
         headers = {'User-Agent': SEC_USER_AGENT}
-        print(f"Using SEC User-Agent: {SEC_USER_AGENT}")
+        logger.debug("Using SEC User-Agent: %s", SEC_USER_AGENT)
         
-        tickers_url = "https://www.sec.gov/files/company_tickers.json"
-        
-        resp = requests.get(tickers_url, headers=headers)
-        if resp.status_code != 200:
-            print(f"Failed to fetch SEC tickers: {resp.status_code}")
-            return []
-            
-        data = resp.json()
-        cik = None
+        # O(1) lookup in the shared local index; no download of company_tickers.json per task.
+        cik = cik_index.get_cik(ticker)
         ticker_upper = ticker.upper()
-        for key, val in data.items():
-            if val['ticker'] == ticker_upper:
-                cik = val['cik_str']
-                break
-                
+        
         if not cik:
-            print(f"CIK not found for {ticker}")
+            logger.warning("CIK not found for %s", ticker)
             return []
             
         # Pad CIK to 10 digits
         cik_str = str(cik).zfill(10)
-        print(f"Found CIK: {cik_str}")
+        logger.debug("Found CIK %s for %s", cik_str, ticker)
+        
+        indexed = set()
+        submissions_headers = dict(headers)
+        if db is not None:
+            indexed = get_indexed_accessions(db, ticker)
+            ledger = db.query(SecLedger).filter(SecLedger.ticker == ticker_upper).first()
+            if ledger and ledger.etag:
+                submissions_headers['If-None-Match'] = ledger.etag
+            if ledger and ledger.last_modified:
+                submissions_headers['If-Modified-Since'] = ledger.last_modified
         
         submissions_url = f"https://data.sec.gov/submissions/CIK{cik_str}.json"
-        resp = requests.get(submissions_url, headers=headers)
+        resp = http_client.get(submissions_url, "sec_submissions", headers=submissions_headers, deadline=deadline)
+        if resp.status_code == 304:
+            logger.info("Submissions for %s unchanged since last run. No new filings.", ticker_upper)
+            return []
         if resp.status_code != 200:
-             print(f"Failed to fetch submissions for CIK {cik_str}: {resp.status_code}")
+             logger.warning("Failed to fetch submissions for CIK %s: HTTP %s", cik_str, resp.status_code)
              return []
+        
+        validators = {
+            "etag": resp.headers.get('ETag'),
+            "last_modified": resp.headers.get('Last-Modified')
+        }
              
         filings = resp.json().get('filings', {}).get('recent', {})
         
-        documents = []
+        new_filings = []
         # Get last 1 relevant filing to avoid hitting limits or processing too much
         count = 0
         limit = 1 
         
         if not filings.get('form'):
-             print("No filings found.")
+             logger.info("No filings found for %s.", ticker_upper)
              return []
 
         for i, form in enumerate(filings.get('form', [])):
@@ -118,53 +271,43 @@ def fetch_sec_filings(ticker: str):
                 primary_doc = filings['primaryDocument'][i]
                 report_date = filings['reportDate'][i]
                 
-                # Construct link
-                doc_link = f"https://www.sec.gov/Archives/edgar/data/{int(cik_str)}/{acc_num.replace('-', '')}/{primary_doc}"
-                print(f"Fetching filing content from: {doc_link}")
+                count += 1
+                if acc_num in indexed:
+                    logger.info("Filing %s (%s) already indexed. Skipping.", acc_num, form)
+                    if count >= limit:
+                        break
+                    continue
                 
-                # Fetch full text
-                # Rate limiting: sleep briefly to be nice to SEC
-                time.sleep(0.2)
+                filing_meta = {
+                    "source": "SEC",
+                    "doc_type": "filing",
+                    "accession_number": acc_num,
+                    "form": form,
+                    "report_date": report_date,
+                    "sec_validators": validators
+                }
                 
-                try:
-                    doc_resp = requests.get(doc_link, headers=headers, timeout=30)
-                    if doc_resp.status_code == 200:
-                        print("Download successful. Cleaning HTML...")
-                        raw_text = clean_html_content(doc_resp.content)
-                        print(f"Total text length: {len(raw_text)}")
-                        
-                        chunks = chunk_text(raw_text)
-                        print(f"Parsed {len(chunks)} chunks from {form}")
-                        
-                        for idx, chunk in enumerate(chunks):
-                            documents.append({
-                                "content": f"SEC Filing {form} ({report_date}) - Part {idx+1}/{len(chunks)}:\n{chunk}",
-                                "source": "SEC",
-                                "link": doc_link,
-                                "metadata_suffix": f" - Part {idx+1}"
-                            })
-                    else:
-                        print(f"Failed to download filing text: {doc_resp.status_code}")
-                        # Fallback
-                        content = f"SEC Filing {form} - Date: {report_date}\nLink: {doc_link}\n(Content download failed)"
-                        documents.append({"content": content, "source": "SEC", "link": doc_link})
-                except Exception as doc_e:
-                    print(f"Exception downloading doc: {doc_e}")
-                    content = f"SEC Filing {form} - Date: {report_date}\nLink: {doc_link}\n(Download error: {doc_e})"
-                    documents.append({"content": content, "source": "SEC", "link": doc_link})
+                # Construct link
+                doc_link = f"https://www.sec.gov/Archives/edgar/data/{int(cik_str)}/{acc_num.replace('-', '')}/{primary_doc}"
+                new_filings.append(dict(filing_meta, link=doc_link))
                 
-                count += 1
                 if count >= limit:
                     break
-        return documents
+        
+        if not new_filings and db is not None:
+            # Everything current is already indexed; remember the validators for a cheap 304 next time.
+            save_sec_validators(db, ticker, validators)
+        
+        # Downloads happen lazily as the caller consumes the chunks.
+        return itertools.chain.from_iterable(
+            iter_filing_documents(filing, headers) for filing in new_filings
+        )
 
     except Exception as e:
-        print(f"Error fetching SEC filings: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error fetching SEC filings for %s: %s", ticker, e)
         return []
 
-def fetch_alpha_vantage_news(ticker: str):
+def fetch_alpha_vantage_news(ticker: str, deadline=None):
     """
     Fetches news sentiment using Alpha Vantage.
     """
@@ -173,19 +316,170 @@ def fetch_alpha_vantage_news(ticker: str):
     
     url = f"https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers={ticker}&apikey={ALPHA_VANTAGE_API_KEY}"
     try:
-        response = requests.get(url)
+        response = http_client.get(url, "alpha_vantage", timeout=FETCH_TIMEOUTS["alpha_vantage"], deadline=deadline)
         data = response.json()
         feed = data.get('feed', [])
         
         docs = []
         for item in feed[:5]: # Top 5 news
             content = f"Title: {item.get('title')}\nSummary: {item.get('summary')}\nSentiment: {item.get('overall_sentiment_score')}"
-            docs.append({"content": content, "source": item.get('source'), "link": item.get('url')})
+            docs.append({"content": content, "source": item.get('source'), "link": item.get('url'), "doc_type": "news"})
         return docs
     except Exception as e:
-        print(f"Error fetching Alpha Vantage news: {e}")
+        logger.warning("Error fetching Alpha Vantage news for %s: %s", ticker, e)
         return []
 
+def fetch_yfinance_news(ticker: str):
+    """
+    Fetches recent headlines from Yahoo Finance.
+    """
+    import yfinance as yf
+
+    yf_docs = []
+    try:
+        # yf.news might be empty or different structure depending on version
+        yf_news = yf.Ticker(ticker).news
+        if yf_news:
+            for item in yf_news:
+                yf_docs.append({
+                    "content": f"Title: {item.get('title')}\nPublisher: {item.get('publisher')}\n",
+                    "source": item.get('publisher'),
+                    "link": item.get('link'),
+                    "doc_type": "news"
+                })
+    except Exception as yfe:
+        logger.warning("Error fetching yfinance news for %s: %s", ticker, yfe)
+    return yf_docs
+
+def _fetch_sec_with_session(ticker: str, deadline=None):
+    # Sessions are not thread-safe, so the SEC fetcher gets its own for the ledger lookups.
+    db = database.SessionLocal()
+    try:
+        return fetch_sec_filings(ticker, db, deadline=deadline)
+    finally:
+        db.close()
+
+def fetch_all_sources(ticker: str):
+    """
+    Runs the SEC, Alpha Vantage and yfinance fetchers concurrently.
+
+    Each source has its own deadline (FETCH_TIMEOUTS); a source that fails or overruns
+    contributes no documents instead of holding up the others. For SEC the deadline covers
+    the lookups only; filing downloads stream later as the chunks are consumed. The
+    deadline is passed down to the rate limiters and HTTP client, so a fetcher left behind
+    after overrunning it does not queue for tokens or start new requests. Returns
+    ({source: documents}, {source: {"seconds", "status", "documents"}}).
+    """
+    fetchers = {
+        "sec": _fetch_sec_with_session,
+        "alpha_vantage": fetch_alpha_vantage_news,
+        # yfinance manages its own HTTP calls; it is only skipped if the deadline has passed.
+        "yfinance": lambda ticker, deadline: fetch_yfinance_news(ticker) if time.monotonic() < deadline else [],
+    }
+    results = {}
+    timings = {}
+    finished_at = {}
+
+    def timed(name, fetcher, deadline):
+        try:
+            with observability.span("fetch"):
+                return fetcher(ticker, deadline=deadline)
+        finally:
+            finished_at[name] = time.perf_counter()
+
+    start = time.perf_counter()
+    deadlines = {name: time.monotonic() + FETCH_TIMEOUTS[name] for name in fetchers}
+    executor = ThreadPoolExecutor(max_workers=len(fetchers), thread_name_prefix="fetch")
+    futures = {name: executor.submit(timed, name, fetcher, deadlines[name]) for name, fetcher in fetchers.items()}
+    try:
+        for name, future in futures.items():
+            remaining = max(0.0, start + FETCH_TIMEOUTS[name] - time.perf_counter())
+            try:
+                docs = future.result(timeout=remaining)
+                results[name] = docs or []
+                status = "ok"
+            except FutureTimeoutError:
+                results[name] = []
+                status = "timeout"
+                logger.warning("Fetching %s for %s exceeded %ss. Continuing without it.", name, ticker, FETCH_TIMEOUTS[name])
+            except Exception as e:
+                results[name] = []
+                status = "error"
+                logger.warning("Fetching %s for %s failed: %s", name, ticker, e)
+            elapsed = finished_at.get(name, time.perf_counter()) - start
+            # The SEC source is a lazy iterator; its documents are only counted while ingesting.
+            count = len(results[name]) if isinstance(results[name], list) else None
+            timings[name] = {"seconds": round(elapsed, 3), "status": status, "documents": count}
+    finally:
+        # Don't wait on a source that overran its deadline.
+        executor.shutdown(wait=False)
+    logger.info("Fetch stage for %s done", ticker, extra={"ticker": ticker, "timings": timings})
+    return results, timings
+
+def iter_batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def vector_metadata(ticker: str, doc: dict, ingested_at: int):
+    """
+    Metadata stored with each vector. `ingested_at`, `doc_type` and the filing fields drive
+    the retention rules in app.retention.
+    """
+    meta = {
+        "ticker": ticker,
+        "source": doc.get('source') or "Unknown",
+        "link": doc.get('link') or "Unknown",
+        "doc_type": doc.get('doc_type') or "news",
+        "ingested_at": ingested_at,
+    }
+    for key in ("form", "accession_number", "report_date"):
+        if doc.get(key):
+            meta[key] = doc[key]
+    return meta
+
+def embed_and_store(ticker: str, docs: list, engine: EmbeddingEngine):
+    """
+    Embeds one batch of documents and upserts it into ChromaDB. Returns the stored ids.
+    """
+    documents_text = [d['content'] for d in docs]
+    ingested_at = int(time.time())
+    metadatas = [vector_metadata(ticker, d, ingested_at) for d in docs]
+    # Content-derived ids: re-ingesting an unchanged chunk overwrites it instead of adding a duplicate.
+    ids = [d['id'] for d in docs]
+    
+    # Multi-document batches with bounded concurrency and adaptive backoff on 429s.
+    # Chunks are capped at CHUNK_MAX_TOKENS, well inside the model's 2048-token input limit.
+    with observability.span("embed", items=len(documents_text)):
+        embeddings = engine.embed(documents_text)
+    
+    # Filter valid
+    valid_indices = [i for i, e in enumerate(embeddings) if e is not None]
+    
+    if valid_indices:
+        logger.debug("Persisting %d vectors for %s", len(valid_indices), ticker)
+        with observability.span("upsert", items=len(valid_indices)):
+            rag_pipeline.upsert_documents(
+                ticker,
+                documents=[documents_text[i] for i in valid_indices],
+                embeddings=[embeddings[i] for i in valid_indices],
+                metadatas=[metadatas[i] for i in valid_indices],
+                ids=[ids[i] for i in valid_indices]
+            )
+            # Same chunks into the BM25 index, so hybrid retrieval sees exactly what is embedded.
+            get_lexical_index().add_documents(
+                ticker,
+                [ids[i] for i in valid_indices],
+                [documents_text[i] for i in valid_indices],
+                [metadatas[i] for i in valid_indices]
+            )
+    return {ids[i] for i in valid_indices}
+
 def process_ticker_documents(ticker: str, task_id: str):
     """
     Background task orchestrated.
@@ -201,83 +495,61 @@ def process_ticker_documents(ticker: str, task_id: str):
         db.commit()
     
     try:
-        update_task_db(db, task_id, "PROCESSING", "Fetching SEC 10-K Filings...")
-        sec_docs = fetch_sec_filings(ticker)
-        
-        update_task_db(db, task_id, "PROCESSING", "Fetching News...")
-        av_docs = fetch_alpha_vantage_news(ticker)
+        update_task_db(db, task_id, "PROCESSING", "Fetching SEC filings and news...")
+        fetched, fetch_timings = fetch_all_sources(ticker)
+        record_task_timings(db, task_id, "fetch", fetch_timings)
+        sec_docs = fetched["sec"]
+        av_docs = fetched["alpha_vantage"]
+        yf_docs = fetched["yfinance"]
+
+        engine = EmbeddingEngine(cache=get_embedding_cache(), rate_limiter=rate_limit.limiter("gemini"))
+        embed_totals = {}
+        seen_ids = set()
+        stored_ids = set()
+        ledger_docs = []
         
-        # Fallback/Additional news from yfinance
-        stock = yf.Ticker(ticker)
-        yf_news = stock.news
-        yf_docs = []
-        try:
-             # yf.news might be empty or different structure depending on version
-             if yf_news:
-                for item in yf_news:
-                     yf_docs.append({
-                         "content": f"Title: {item.get('title')}\nPublisher: {item.get('publisher')}\n",
-                         "source": item.get('publisher'),
-                         "link": item.get('link')
-                     })
-        except Exception as yfe:
-            print(f"YF News error: {yfe}")
-
-        all_docs = sec_docs + av_docs + yf_docs
+        # News first: it is already in memory, while the SEC iterator downloads and chunks
+        # the filing as it is consumed, one ingest batch at a time.
+        doc_stream = itertools.chain(av_docs, yf_docs, sec_docs)
+        for batch in iter_batches(doc_stream, INGEST_BATCH_SIZE):
+            unique = []
+            for d in batch:
+                d['id'] = document_id(ticker, d['content'])
+                if d.get('accession_number'):
+                    ledger_docs.append({k: d.get(k) for k in LEDGER_KEYS})
+                # Drop exact repeats (e.g. the same headline from two news feeds); they would share an id.
+                if d['id'] in seen_ids:
+                    continue
+                seen_ids.add(d['id'])
+                unique.append(d)
+            if not unique:
+                continue
+            
+            update_task_db(db, task_id, "PROCESSING", f"Embedding documents {len(seen_ids) - len(unique) + 1}-{len(seen_ids)} with Gemini...")
+            stored_ids |= embed_and_store(ticker, unique, engine)
+            for key, value in engine.last_run.items():
+                if isinstance(value, (int, float)) and key != "texts_per_s":
+                    embed_totals[key] = embed_totals.get(key, 0) + value
         
-        if not all_docs:
+        if not seen_ids:
             update_task_db(db, task_id, "SUCCESS", "No documents found.")
-            db.close()
             return
-
-        update_task_db(db, task_id, "PROCESSING", f"Embedding {len(all_docs)} documents with Gemini...")
-        print(f"Total documents to embed: {len(all_docs)}")
-        
-        documents_text = [d['content'] for d in all_docs]
-        metadatas = [{"ticker": ticker, "source": d.get('source') or "Unknown", "link": d.get('link') or "Unknown"} for d in all_docs]
-        ids = [str(uuid.uuid4()) for _ in all_docs]
         
-        embeddings = []
+        if embed_totals.get("seconds"):
+            embed_totals["texts_per_s"] = round(embed_totals.get("embedded", 0) / embed_totals["seconds"], 2)
+        record_task_timings(db, task_id, "embed", embed_totals)
         
-        # Process in batches to handle API limits / network stability
-        batch_size = 5
-        total_batches = (len(documents_text) + batch_size - 1) // batch_size
-        
-        for i in range(0, len(documents_text), batch_size):
-            batch_texts = documents_text[i:i+batch_size]
-            print(f"Embedding batch {i//batch_size + 1}/{total_batches}")
-            
-            for text in batch_texts:
-                # Truncate text if it's too long for embedding model? 
-                # gemini-embedding-001 has 2048 token input limit? 
-                # Our chunk size is 2000 chars ~ 500-800 tokens. Should be safe.
-                emb = rag_pipeline.get_gemini_embedding(text)
-                if emb and len(emb) > 0:
-                    embeddings.append(emb)
-                else:
-                    embeddings.append(None)
-            
-            # Brief pause between batches
-            time.sleep(0.5)
+        if ledger_docs:
+            record_sec_ingestion(db, ticker, ledger_docs, stored_ids)
         
-        # Filter valid
-        valid_indices = [i for i, e in enumerate(embeddings) if e is not None]
+        if stored_ids:
+            # Cached retrievals/answers for this ticker may no longer reflect the corpus.
+            query_cache.invalidate_ticker(ticker)
         
-        if valid_indices:
-            print(f"Persisting {len(valid_indices)} vectors to ChromaDB...")
-            rag_pipeline.collection.add(
-                documents=[documents_text[i] for i in valid_indices],
-                embeddings=[embeddings[i] for i in valid_indices],
-                metadatas=[metadatas[i] for i in valid_indices],
-                ids=[ids[i] for i in valid_indices]
-            )
-
-        update_task_db(db, task_id, "SUCCESS", f"Processed {len(valid_indices)} chunks successfully.")
+        update_task_db(db, task_id, "SUCCESS", f"Processed {len(stored_ids)} chunks successfully.")
         
     except Exception as e:
-        print(f"Task failed: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Ingestion task %s for %s failed: %s", task_id, ticker, e)
         update_task_db(db, task_id, "FAILURE", str(e))
     finally:
         db.close()
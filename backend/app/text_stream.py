@@ -0,0 +1,91 @@
+"""
+Incremental HTML -> text pipeline for large SEC filings.
+
+Everything here works on iterators so a filing can be chunked (`chunking.iter_token_chunks`)
+while it is still downloading: bytes are fed to lxml's event-driven parser (no DOM is
+built) and text is whitespace-normalized on the fly.
+"""
+import re
+from lxml import etree
+
+SKIPPED_TAGS = {"script", "style", "head", "title", "meta"}
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _TextCollector:
+    """
+    lxml parser target that keeps text outside of skipped tags, in document order.
+
+    The parser may split one text node across several `data` calls (e.g. at feed
+    boundaries), so data is buffered until the next tag event and emitted as one piece.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self._current = []
+        self._skip_depth = 0
+
+    def _flush(self):
+        if self._current:
+            if not self._skip_depth:
+                self.pieces.append("".join(self._current))
+            self._current = []
+
+    def start(self, tag, attrib):
+        self._flush()
+        if isinstance(tag, str) and tag.lower() in SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag):
+        self._flush()
+        if isinstance(tag, str) and tag.lower() in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data):
+        self._current.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        self._flush()
+        return None
+
+
+def iter_html_text(byte_chunks):
+    """
+    Yields raw text nodes from an iterable of HTML byte chunks.
+    """
+    collector = _TextCollector()
+    parser = etree.HTMLParser(target=collector)
+    fed = False
+    for chunk in byte_chunks:
+        if not chunk:
+            continue
+        parser.feed(chunk)
+        fed = True
+        if collector.pieces:
+            pieces, collector.pieces = collector.pieces, []
+            yield from pieces
+    if not fed:
+        # lxml raises "no element found" when closed without input.
+        return
+    parser.close()
+    yield from collector.pieces
+
+
+def iter_normalized_text(pieces):
+    """
+    Streaming equivalent of joining `pieces` with spaces, collapsing whitespace runs and
+    stripping the ends, i.e. what `clean_html_content` produces via `get_text(separator=' ')`.
+    """
+    started = False
+    for piece in pieces:
+        piece = _WHITESPACE.sub(" ", piece).strip()
+        if not piece:
+            continue
+        if started:
+            yield " "
+        yield piece
+        started = True
+
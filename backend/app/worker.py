@@ -0,0 +1,409 @@
+"""
+Durable ingestion job queue on top of the `tasks` table, and the worker pool that drains it.
+
+    python -m app.worker --concurrency 4 [--metrics-port 9100]
+
+The API only enqueues (`enqueue_ingestion`). Workers claim jobs with a compare-and-set
+UPDATE and hold a lease they keep renewing while the job runs; a job whose worker died is
+reclaimed once its lease expires. Failed jobs are retried with exponential backoff up to
+INGESTION_MAX_ATTEMPTS. Requests for a ticker that already has a queued or running job
+are coalesced onto that job (a unique index allows only one per ticker).
+
+Jobs the API runs itself (INGESTION_MODE=inline) hold a lease too, under an "api:" owner.
+Nothing retries them, so once such a lease expires the job is marked failed and the next
+request for the ticker starts a new one.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import argparse
+import datetime
+import logging
+import threading
+import contextlib
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import database, observability
+from app.database import Task, IngestionBatch
+
+logger = logging.getLogger(__name__)
+
+WORKER_CONCURRENCY = int(os.getenv("INGESTION_WORKERS", "2"))
+LEASE_SECONDS = int(os.getenv("INGESTION_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = float(os.getenv("INGESTION_RETRY_BASE_SECONDS", "30"))
+POLL_SECONDS = float(os.getenv("INGESTION_POLL_SECONDS", "2"))
+
+ACTIVE_STATUSES = ("PENDING", "PROCESSING")
+INLINE_OWNER_PREFIX = "api:"
+
+jobs_total = observability.counter(
+    "cognivest_ingestion_jobs_total", "Ingestion jobs finished by this worker.", labels=("outcome",)
+)
+
+
+def utcnow():
+    return datetime.datetime.utcnow()
+
+
+def inline_owner():
+    return f"{INLINE_OWNER_PREFIX}{socket.gethostname()}-{os.getpid()}"
+
+
+def is_orphaned(task, now=None):
+    """
+    Whether `task` was being run by an API process that has stopped: PROCESSING with an
+    expired (or, for rows from before inline leases, no) lease that no worker holds.
+    Worker jobs are never orphaned; other workers reclaim them.
+    """
+    if task.status != "PROCESSING":
+        return False
+    if task.lease_owner and not task.lease_owner.startswith(INLINE_OWNER_PREFIX):
+        return False
+    return task.lease_expires_at is None or task.lease_expires_at < (now or utcnow())
+
+
+def _abandon(task):
+    task.status = "FAILURE"
+    task.message = "Interrupted: the API process running it stopped"
+    task.lease_owner = None
+    task.lease_expires_at = None
+
+
+def abandon_orphaned_tasks(db: Session):
+    """
+    Marks every orphaned inline task failed. Returns how many there were.
+    """
+    now = utcnow()
+    orphaned = [task for task in db.query(Task).filter(Task.status == "PROCESSING").all() if is_orphaned(task, now)]
+    for task in orphaned:
+        _abandon(task)
+    db.commit()
+    if orphaned:
+        logger.warning("Marked %d interrupted inline tasks as failed.", len(orphaned))
+    return len(orphaned)
+
+
+def _active_task(db: Session, ticker: str):
+    return (
+        db.query(Task)
+        .filter(Task.ticker == ticker, Task.status.in_(ACTIVE_STATUSES))
+        .order_by(Task.created_at.asc())
+        .first()
+    )
+
+
+def enqueue_ingestion(db: Session, ticker: str):
+    """
+    Queues an ingestion job for `ticker`. Returns (task, created); when a job for the
+    ticker is already queued or running, that job is returned with created=False.
+    """
+    ticker = ticker.upper()
+    existing = _active_task(db, ticker)
+    if existing and is_orphaned(existing):
+        _abandon(existing)
+        db.commit()
+        existing = None
+    if existing:
+        return existing, False
+
+    task = Task(id=str(uuid.uuid4()), ticker=ticker, status="PENDING", message="Task queued",
+                attempts=0, run_after=utcnow())
+    db.add(task)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request queued one first.
+        db.rollback()
+        existing = _active_task(db, ticker)
+        if existing is None:
+            raise
+        return existing, False
+    return task, True
+
+
+def start_inline(task):
+    """
+    Marks a freshly queued task as run by this API process, under a lease that
+    `run_inline` renews, so queue workers leave it alone while this process is alive.
+    The caller commits.
+    """
+    task.status = "PROCESSING"
+    task.attempts = 1
+    task.lease_owner = inline_owner()
+    task.lease_expires_at = utcnow() + datetime.timedelta(seconds=LEASE_SECONDS)
+
+
+def enqueue_batch(db: Session, tickers):
+    """
+    Queues ingestion for many tickers at once (duplicates and already-active tickers are
+    coalesced) and records them as one batch. Returns (batch, tasks).
+    """
+    tasks = []
+    seen = set()
+    for ticker in tickers:
+        ticker = ticker.strip().upper()
+        if not ticker or ticker in seen:
+            continue
+        seen.add(ticker)
+        task, _ = enqueue_ingestion(db, ticker)
+        tasks.append(task)
+
+    batch = IngestionBatch(id=str(uuid.uuid4()), task_ids=json.dumps([t.id for t in tasks]))
+    db.add(batch)
+    db.commit()
+    return batch, tasks
+
+
+def batch_status(db: Session, batch_id: str):
+    """
+    Aggregate progress for a batch, or None if it does not exist.
+    """
+    batch = db.query(IngestionBatch).filter(IngestionBatch.id == batch_id).first()
+    if not batch:
+        return None
+    task_ids = json.loads(batch.task_ids or "[]")
+    rows = db.query(Task.id, Task.ticker, Task.status, Task.message).filter(Task.id.in_(task_ids)).all() if task_ids else []
+
+    counts = {}
+    for row in rows:
+        counts[row.status] = counts.get(row.status, 0) + 1
+    finished = counts.get("SUCCESS", 0) + counts.get("FAILURE", 0)
+    return {
+        "batch_id": batch_id,
+        "total": len(task_ids),
+        "finished": finished,
+        "progress": round(finished / len(task_ids), 4) if task_ids else 1.0,
+        "counts": counts,
+        "tasks": [
+            {"task_id": row.id, "ticker": row.ticker, "status": row.status, "message": row.message}
+            for row in rows
+        ],
+    }
+
+
+def _claimable():
+    now = utcnow()
+    return or_(
+        and_(Task.status == "PENDING", Task.ticker.isnot(None), Task.run_after <= now),
+        # Lease expired: the worker that held it is gone.
+        and_(Task.status == "PROCESSING", Task.ticker.isnot(None), Task.lease_expires_at < now),
+    )
+
+
+def claim_next(db: Session, worker_id: str):
+    """
+    Atomically claims the oldest runnable job, or returns None.
+    """
+    candidates = (
+        db.query(Task.id)
+        .filter(_claimable())
+        .order_by(Task.run_after.asc(), Task.created_at.asc())
+        .limit(10)
+        .all()
+    )
+    for (task_id,) in candidates:
+        claimed = (
+            db.query(Task)
+            .filter(Task.id == task_id, _claimable())
+            .update({
+                Task.status: "PROCESSING",
+                Task.message: "Claimed by worker",
+                Task.lease_owner: worker_id,
+                Task.lease_expires_at: utcnow() + datetime.timedelta(seconds=LEASE_SECONDS),
+                Task.attempts: Task.attempts + 1,
+            }, synchronize_session=False)
+        )
+        db.commit()
+        if claimed == 1:
+            return db.query(Task).filter(Task.id == task_id).first()
+    return None
+
+
+def _renew_lease(task_id: str, worker_id: str, stop: threading.Event):
+    while not stop.wait(LEASE_SECONDS / 3):
+        db = database.SessionLocal()
+        try:
+            db.query(Task).filter(Task.id == task_id, Task.lease_owner == worker_id).update(
+                {Task.lease_expires_at: utcnow() + datetime.timedelta(seconds=LEASE_SECONDS)},
+                synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            logger.warning("Lease renewal for task %s failed: %s", task_id, e)
+        finally:
+            db.close()
+
+
+@contextlib.contextmanager
+def _leased(task_id: str, owner: str):
+    """
+    Keeps renewing the task's lease while the block runs.
+    """
+    stop = threading.Event()
+    renewer = threading.Thread(target=_renew_lease, args=(task_id, owner, stop), daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        renewer.join()
+
+
+def _run_ticker(task_id: str, ticker: str, owner: str):
+    from app import tasks
+
+    with _leased(task_id, owner):
+        try:
+            tasks.process_ticker_documents(ticker, task_id)
+        except Exception as e:
+            logger.exception("Job %s crashed: %s", task_id, e)
+            db = database.SessionLocal()
+            try:
+                tasks.update_task_db(db, task_id, "FAILURE", str(e))
+            finally:
+                db.close()
+
+
+def run_inline(ticker: str, task_id: str):
+    """
+    Runs a task taken with `start_inline` in this process.
+    """
+    owner = inline_owner()
+    _run_ticker(task_id, ticker, owner)
+    db = database.SessionLocal()
+    try:
+        db.query(Task).filter(Task.id == task_id, Task.lease_owner == owner).update(
+            {Task.lease_owner: None, Task.lease_expires_at: None}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_job(task_id: str, ticker: str, worker_id: str):
+    _run_ticker(task_id, ticker, worker_id)
+
+    db = database.SessionLocal()
+    try:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        task.lease_owner = None
+        task.lease_expires_at = None
+        retry = task.status == "FAILURE" and (task.attempts or 0) < MAX_ATTEMPTS
+        if retry:
+            delay = RETRY_BASE_SECONDS * 2 ** ((task.attempts or 1) - 1)
+            task.status = "PENDING"
+            task.run_after = utcnow() + datetime.timedelta(seconds=delay)
+            task.message = f"Attempt {task.attempts} failed ({task.message}); retrying in {delay:.0f}s"
+        try:
+            db.commit()
+        except IntegrityError:
+            # A new job for the ticker was queued after this one failed; it replaces the retry.
+            db.rollback()
+            retry = False
+            db.query(Task).filter(Task.id == task_id).update(
+                {Task.lease_owner: None, Task.lease_expires_at: None}, synchronize_session=False
+            )
+            db.commit()
+            task = db.query(Task).filter(Task.id == task_id).first()
+        if retry:
+            logger.warning("Job %s for %s: %s", task_id, ticker, task.message)
+            jobs_total.inc(outcome="retry")
+        else:
+            jobs_total.inc(outcome="success" if task.status == "SUCCESS" else "failure")
+    finally:
+        db.close()
+
+
+def worker_loop(worker_id: str, stop: threading.Event = None):
+    database.init_db()
+    logger.info("Ingestion worker %s started.", worker_id)
+    while stop is None or not stop.is_set():
+        db = database.SessionLocal()
+        try:
+            task = claim_next(db, worker_id)
+            job = (task.id, task.ticker) if task else None
+        except Exception as e:
+            logger.warning("Worker %s failed to claim a job: %s", worker_id, e)
+            job = None
+        finally:
+            db.close()
+
+        if job is None:
+            time.sleep(POLL_SECONDS)
+            continue
+        logger.info("Worker %s running job %s for %s", worker_id, job[0], job[1])
+        run_job(job[0], job[1], worker_id)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = observability.render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int):
+    """
+    Serves this process's metrics on http://0.0.0.0:<port>/metrics from a daemon thread.
+    """
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving worker metrics on port %d", port)
+    return server
+
+
+def _process_main(index: int, metrics_port: int = None):
+    observability.configure_logging()
+    if metrics_port:
+        # One port per worker process, since metrics are kept in process memory.
+        serve_metrics(metrics_port + index)
+    worker_loop(f"{socket.gethostname()}-{os.getpid()}-{index}")
+
+
+def run_pool(concurrency: int = WORKER_CONCURRENCY, metrics_port: int = None):
+    """
+    Runs `concurrency` worker processes until interrupted. With `metrics_port`, worker i
+    exposes its metrics on metrics_port + i. Retention compaction runs in this parent
+    process every COMPACTION_INTERVAL_HOURS (0 disables it).
+    """
+    # Create tables once here so the spawned workers do not race to do it.
+    database.init_db()
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_process_main, args=(i, metrics_port), daemon=True)
+        for i in range(concurrency)
+    ]
+    for p in processes:
+        p.start()
+    from app import retention
+    if retention.COMPACTION_INTERVAL_HOURS > 0:
+        threading.Thread(target=retention.run_periodically, name="compaction", daemon=True).start()
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping ingestion workers...")
+        for p in processes:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ingestion worker pool.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="expose Prometheus metrics; worker i listens on this port + i")
+    args = parser.parse_args()
+    observability.configure_logging()
+    run_pool(args.concurrency, args.metrics_port)
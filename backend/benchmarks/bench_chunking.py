@@ -0,0 +1,74 @@
+"""
+Compares the fixed 2000/200-character chunker with the token-aware chunker.
+
+    python -m benchmarks.bench_chunking [--input filing.html|filing.txt] [--max-tokens 800] [--json]
+
+Without --input a synthetic filing is used. Reports chunk counts, token statistics
+(i.e. embedding inputs per filing) and chunking throughput for each strategy.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from app import chunking, tasks, text_stream
+from benchmarks.synthetic import synthetic_filing_text
+
+
+def load_text(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.lower().endswith((".htm", ".html")):
+        return "".join(text_stream.iter_normalized_text(text_stream.iter_html_text([raw])))
+    return "".join(text_stream.iter_normalized_text([raw.decode("utf-8", errors="replace")]))
+
+
+def measure(name, make_chunks, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = list(make_chunks(text))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tokens = [chunking.count_tokens(c) for c in chunks]
+    return {
+        "strategy": name,
+        "chunks": len(chunks),
+        "tokens_total": sum(tokens),
+        "tokens_mean": round(statistics.mean(tokens), 1) if tokens else 0,
+        "tokens_max": max(tokens) if tokens else 0,
+        "seconds": round(best, 4),
+        "mb_per_s": round(len(text) / 1e6 / best, 2) if best else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="filing HTML or plain text; defaults to a synthetic 10-K")
+    parser.add_argument("--chars", type=int, default=400_000, help="size of the synthetic filing")
+    parser.add_argument("--max-tokens", type=int, default=chunking.CHUNK_MAX_TOKENS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    text = load_text(args.input) if args.input else synthetic_filing_text(args.chars)
+    # Warm the tokenizer so its load time is not billed to the first strategy.
+    chunking.count_tokens("warm up")
+
+    results = [
+        measure("fixed_2000_chars", tasks.chunk_text, text, args.repeat),
+        measure(f"token_{args.max_tokens}", lambda t: chunking.iter_token_chunks(t, max_tokens=args.max_tokens), text, args.repeat),
+    ]
+
+    if args.json:
+        print(json.dumps({"input_chars": len(text), "results": results}, indent=2))
+        return
+    print(f"Input: {len(text):,} chars")
+    print(f"{'strategy':<20}{'chunks':>8}{'tokens':>10}{'mean':>8}{'max':>6}{'seconds':>10}{'MB/s':>8}")
+    for r in results:
+        print(f"{r['strategy']:<20}{r['chunks']:>8}{r['tokens_total']:>10}{r['tokens_mean']:>8}"
+              f"{r['tokens_max']:>6}{r['seconds']:>10}{r['mb_per_s']:>8}")
+
+
+if __name__ == "__main__":
+    main()
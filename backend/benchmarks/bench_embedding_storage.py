@@ -0,0 +1,129 @@
+"""
+Recall vs memory for embedding width and vector precision.
+
+    python -m benchmarks.bench_embedding_storage [--from-chroma] [--dims 3072,1536,768,256] [--json]
+
+With --from-chroma the corpus is every vector in CHROMA_PERSIST_DIR (ingested at full
+3072 dimensions); otherwise a synthetic clustered corpus is generated. A held-out sample
+of corpus vectors, plus noise, serves as queries. Ground truth is exact top-k search over
+the full-width float32 vectors.
+
+Narrower widths are taken by truncating and re-normalizing, which is how
+gemini-embedding-001's Matryoshka-trained `output_dimensionality` behaves. Each width is
+searched as float32, float16, int8 without rescoring and int8 rescored at float16
+(`app.compact_vectors`), reporting recall@k, bytes per vector and p50 scan latency.
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from app import compact_vectors
+
+
+def load_chroma_corpus():
+    from app import rag_pipeline
+
+    vectors = []
+    for name in rag_pipeline.list_collection_names():
+        collection = rag_pipeline.get_chroma_client().get_collection(name=name)
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings"], limit=1000, offset=offset)
+            if not len(page["ids"]):
+                break
+            offset += len(page["ids"])
+            vectors.extend(page["embeddings"])
+    if not vectors:
+        raise SystemExit("No vectors found in CHROMA_PERSIST_DIR.")
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def synthetic_corpus(size, dims, rng, clusters=200):
+    # Topic clusters with a decaying spectrum, roughly like real text embeddings.
+    spectrum = (1.0 / np.sqrt(np.arange(1, dims + 1))).astype(np.float32)
+    centers = rng.normal(size=(clusters, dims)).astype(np.float32) * spectrum
+    vectors = centers[rng.integers(0, clusters, size)] + 0.5 * rng.normal(size=(size, dims)).astype(np.float32) * spectrum
+    return vectors
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(corpus, queries, k):
+    return np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+
+def evaluate(corpus, queries, truth, k, storage):
+    """
+    Recall@k and p50 latency of one storage mode over an already-truncated corpus.
+    """
+    ids = np.arange(len(corpus)).astype(str)
+    if storage == "float32":
+        search = lambda q: [(i, None) for i in np.argsort(-(corpus @ q))[:k]]
+        nbytes = corpus.nbytes
+    else:
+        halves = corpus.astype(np.float16)
+        codes, scales = compact_vectors.quantize_int8(halves)
+        store = compact_vectors.CompactVectors(ids, codes, scales, halves)
+        mode = "int8" if storage.startswith("int8") else "float16"
+        nbytes = store.nbytes(mode)
+        compact_vectors.RESCORE_MULTIPLIER = 1 if storage == "int8-no-rescore" else 4
+        search = lambda q: store.search(q, k, mode)
+
+    hits = 0
+    latencies = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append(time.perf_counter() - start)
+        hits += len({int(i) for i, _ in found} & set(expected.tolist()))
+    return {
+        "storage": storage,
+        "recall": round(hits / truth.size, 4),
+        "bytes_per_vector": round(nbytes / len(corpus), 1),
+        "index_mb": round(nbytes / 1e6, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-chroma", action="store_true", help="use the vectors in CHROMA_PERSIST_DIR")
+    parser.add_argument("--corpus", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--dims", default="3072,1536,768,256")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(23)
+    full = load_chroma_corpus() if args.from_chroma else synthetic_corpus(args.corpus, 3072, rng)
+    held_out = rng.choice(len(full), size=min(args.queries, len(full) // 10), replace=False)
+    mask = np.ones(len(full), dtype=bool)
+    mask[held_out] = False
+    corpus_full = full[mask]
+    queries_full = full[held_out] + 0.1 * rng.normal(size=(len(held_out), full.shape[1])).astype(np.float32) * full[held_out].std()
+    truth = exact_top_k(normalize(corpus_full), normalize(queries_full), args.k)
+
+    results = []
+    for dims in [int(d) for d in args.dims.split(",")]:
+        corpus = normalize(corpus_full[:, :dims]).astype(np.float32)
+        queries = normalize(queries_full[:, :dims]).astype(np.float32)
+        for storage in ("float32", "float16", "int8-no-rescore", "int8"):
+            results.append(dict(evaluate(corpus, queries, truth, args.k, storage), dims=dims))
+
+    if args.json:
+        print(json.dumps({"corpus": len(corpus_full), "queries": len(held_out), "k": args.k, "results": results}, indent=2))
+        return
+    print(f"{len(corpus_full)} vectors, {len(held_out)} queries, recall@{args.k} vs exact 3072-dim float32")
+    print(f"{'dims':>6}{'storage':>18}{'recall':>9}{'B/vector':>10}{'index MB':>10}{'p50 ms':>9}")
+    for r in results:
+        print(f"{r['dims']:>6}{r['storage']:>18}{r['recall']:>9}{r['bytes_per_vector']:>10}{r['index_mb']:>10}{r['p50_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Offline end-to-end benchmark of ingestion (`tasks.process_ticker_documents`) and question
+answering (`rag_pipeline.answer_question_async`), per pipeline stage and corpus size.
+
+    python -m benchmarks.bench_end_to_end [--sizes 100000,400000,1600000] [--tickers 4]
+                                          [--output results.json] [--baseline previous.json] [--json]
+
+Every upstream is replaced locally:
+
+- SEC: company_tickers.json, submissions and filing HTML are replayed from an HTTP cache
+  directory (HTTP_MODE=replay) holding synthetic filings of each size, or, with
+  --recordings, a directory captured from a real run with HTTP_MODE=record
+- Alpha Vantage: a recorded news feed; yfinance news: fixed stand-in headlines
+- Gemini: `app.fakes.FakeGeminiClient` (deterministic vectors and answers, optional latency)
+- ChromaDB, the BM25 index, the SQL database and all caches: fresh temporary directories
+
+Each size runs in a fresh interpreter. Stage figures come from the same `observability`
+stage metrics served on /metrics: calls, total and mean seconds, and items per second
+(chunks for clean/chunk, texts for embed, vectors for upsert). --output writes the
+results as JSON; --baseline compares mean stage latency against such a file.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+INGEST_STAGES = ("fetch", "clean", "chunk", "embed", "upsert")
+QUERY_STAGES = ("embed_query", "retrieve", "context", "generate")
+QUESTIONS = [
+    "What drove revenue growth this year?",
+    "What are the main risk factors?",
+    "How did gross margin change?",
+    "What is the outlook for free cash flow?",
+    "How exposed is the company to foreign currency?",
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def write_recordings(http_client, tickers, filing_chars):
+    """
+    Fills the replay directory with one 10-K and a news feed per ticker.
+    """
+    from benchmarks.synthetic import synthetic_filing_html
+
+    company_tickers = {}
+    for i, ticker in enumerate(tickers):
+        cik = 1000 + i
+        accession = f"{cik:010d}-24-000001"
+        document = f"{ticker.lower()}-10k.htm"
+        company_tickers[str(i)] = {"cik_str": cik, "ticker": ticker, "title": f"{ticker} Holdings"}
+        http_client.record(
+            f"https://data.sec.gov/submissions/CIK{cik:010d}.json",
+            json.dumps({"filings": {"recent": {
+                "form": ["10-K"], "accessionNumber": [accession],
+                "primaryDocument": [document], "reportDate": ["2024-09-28"],
+            }}}),
+        )
+        http_client.record(
+            f"https://www.sec.gov/Archives/edgar/data/{cik}/{accession.replace('-', '')}/{document}",
+            synthetic_filing_html(filing_chars, seed=i),
+        )
+        http_client.record(
+            f"https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers={ticker}",
+            json.dumps({"feed": [
+                {"title": f"{ticker} headline {n}", "summary": f"{ticker} reported results for quarter {n}.",
+                 "overall_sentiment_score": 0.1 * n, "source": "Bench Wire", "url": f"https://example.com/{ticker}/{n}"}
+                for n in range(5)
+            ]}),
+        )
+    http_client.record("https://www.sec.gov/files/company_tickers.json", json.dumps(company_tickers))
+
+
+def stage_delta(after, before, stages):
+    report = {}
+    for stage in stages:
+        a = after.get(stage, {})
+        b = before.get(stage, {})
+        calls = a.get("calls", 0) - b.get("calls", 0)
+        seconds = a.get("seconds", 0.0) - b.get("seconds", 0.0)
+        items = a.get("items", 0) - b.get("items", 0)
+        report[stage] = {
+            "calls": calls,
+            "seconds": round(seconds, 4),
+            "mean_ms": round(seconds / calls * 1000, 3) if calls else None,
+            "items": items,
+            "items_per_s": round(items / seconds, 1) if items and seconds > 0 else None,
+            "errors": a.get("errors", 0) - b.get("errors", 0),
+        }
+    return report
+
+
+def run_size(args, filing_chars):
+    """
+    One corpus size, in this (fresh) process. Returns the result row.
+    """
+    root = tempfile.mkdtemp(prefix="cognivest-e2e-")
+    tickers = args.ticker_list.split(",") if args.ticker_list else [f"BENCH{i}" for i in range(args.tickers)]
+    os.environ.update({
+        "HTTP_MODE": "replay",
+        "HTTP_CACHE_DIR": args.recordings or os.path.join(root, "http"),
+        "CHROMA_PERSIST_DIR": os.path.join(root, "chroma"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(root, 'bench.db')}",
+        "LEXICAL_INDEX_PATH": os.path.join(root, "lexical.db"),
+        "EMBEDDING_CACHE_PATH": os.path.join(root, "embeddings.db"),
+        "RATE_LIMIT_DB": os.path.join(root, "rate_limits.db"),
+        "CIK_INDEX_PATH": os.path.join(root, "cik.db"),
+        "COMPACT_VECTOR_DIR": os.path.join(root, "compact"),
+        "EMBEDDING_DIMENSIONS": str(args.dims),
+        "GEMINI_API_KEY": "offline-benchmark",
+        "ALPHA_VANTAGE_API_KEY": "offline-benchmark",
+        # The fake client has no quota; the limiter would only add artificial waits.
+        "GEMINI_RATE_PER_SEC": "1000000",
+        "GEMINI_BURST": "1000000",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+    from app import database, http_client, observability, rag_pipeline, tasks
+    from app.fakes import FakeGeminiClient
+
+    observability.configure_logging()
+    if not args.recordings:
+        write_recordings(http_client, tickers, filing_chars)
+    rag_pipeline.client = FakeGeminiClient(
+        dimensions=args.dims, latency=args.embed_latency, generation_latency=args.generation_latency
+    )
+    tasks.fetch_yfinance_news = lambda ticker: [
+        {"content": f"Title: {ticker} stand-in headline {n}\nPublisher: Bench\n", "source": "Bench", "link": "n/a"}
+        for n in range(3)
+    ]
+    database.init_db()
+
+    start = time.perf_counter()
+    for ticker in tickers:
+        tasks.process_ticker_documents(ticker, f"bench-{ticker}")
+    ingest_seconds = time.perf_counter() - start
+    db = database.SessionLocal()
+    try:
+        failed = [t.id for t in db.query(database.Task).all() if t.status != "SUCCESS"]
+    finally:
+        db.close()
+    after_ingest = observability.stage_summary()
+
+    async def ask_all():
+        latencies = []
+        for n in range(args.queries):
+            for ticker in tickers:
+                # Distinct questions, so the answer cache does not short-circuit the pipeline.
+                question = f"{QUESTIONS[n % len(QUESTIONS)]} (#{n})"
+                begin = time.perf_counter()
+                await rag_pipeline.answer_question_async(question, ticker)
+                latencies.append(time.perf_counter() - begin)
+        return latencies
+
+    start = time.perf_counter()
+    latencies = asyncio.run(ask_all())
+    query_seconds = time.perf_counter() - start
+    after_query = observability.stage_summary()
+
+    return {
+        "filing_chars": filing_chars,
+        "tickers": len(tickers),
+        "failed_tasks": failed,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "chunks": after_ingest.get("chunk", {}).get("items", 0),
+        "ingest_stages": stage_delta(after_ingest, {}, INGEST_STAGES),
+        "queries": len(latencies),
+        "query_seconds": round(query_seconds, 3),
+        "query_p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        "query_p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "query_stages": stage_delta(after_query, after_ingest, QUERY_STAGES),
+    }
+
+
+def compare(results, baseline):
+    """
+    Rows of (size, stage, baseline mean ms, current mean ms, change %).
+    """
+    previous = {
+        (row["filing_chars"], stage): figures["mean_ms"]
+        for row in baseline["results"]
+        for stage, figures in {**row["ingest_stages"], **row["query_stages"]}.items()
+    }
+    rows = []
+    for row in results:
+        for stage, figures in {**row["ingest_stages"], **row["query_stages"]}.items():
+            old = previous.get((row["filing_chars"], stage))
+            new = figures["mean_ms"]
+            if old and new is not None:
+                rows.append((row["filing_chars"], stage, old, new, round((new - old) / old * 100, 1)))
+    return rows
+
+
+def print_table(results):
+    for row in results:
+        print(f"\n{row['tickers']} tickers x {row['filing_chars']:,} chars/filing: {row['chunks']} chunks, "
+              f"ingest {row['ingest_seconds']}s, {row['queries']} queries p50 {row['query_p50_ms']} ms "
+              f"p99 {row['query_p99_ms']} ms")
+        if row["failed_tasks"]:
+            print(f"  failed tasks: {', '.join(row['failed_tasks'])}")
+        print(f"  {'stage':<12}{'calls':>8}{'total s':>10}{'mean ms':>10}{'items':>8}{'items/s':>10}")
+        for stage, f in {**row["ingest_stages"], **row["query_stages"]}.items():
+            print(f"  {stage:<12}{f['calls']:>8}{f['seconds']:>10}{str(f['mean_ms']):>10}{f['items']:>8}{str(f['items_per_s']):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000,400000,1600000", help="characters per synthetic filing")
+    parser.add_argument("--tickers", type=int, default=4)
+    parser.add_argument("--ticker-list", help="comma-separated tickers (required with --recordings)")
+    parser.add_argument("--recordings", help="HTTP cache directory captured with HTTP_MODE=record")
+    parser.add_argument("--queries", type=int, default=20, help="questions per ticker")
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="fake embedding latency per call (s)")
+    parser.add_argument("--generation-latency", type=float, default=0.0, help="fake generation latency per call (s)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        print(json.dumps(run_size(args, args.run_size)))
+        return
+    if args.recordings and not args.ticker_list:
+        parser.error("--recordings needs --ticker-list")
+
+    passthrough = [a for a in sys.argv[1:] if a != "--json"]
+    results = []
+    sizes = [int(s) for s in args.sizes.split(",")] if not args.recordings else [0]
+    for size in sizes:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_end_to_end", *passthrough, "--run-size", str(size)],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        if out.returncode != 0:
+            raise SystemExit(f"benchmark run for size {size} failed:\n{out.stderr}")
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    report = {"dims": args.dims, "embed_latency": args.embed_latency,
+              "generation_latency": args.generation_latency, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    changes = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            changes = compare(results, json.load(f))
+
+    if args.json:
+        if changes is not None:
+            report["changes"] = [
+                {"filing_chars": s, "stage": st, "baseline_ms": o, "current_ms": n, "change_pct": c}
+                for s, st, o, n, c in changes
+            ]
+        print(json.dumps(report, indent=2))
+        return
+    print_table(results)
+    if changes:
+        print(f"\nvs {args.baseline} (mean ms per call)")
+        print(f"  {'chars':>10} {'stage':<12}{'baseline':>10}{'current':>10}{'change':>9}")
+        for size, stage, old, new, change in changes:
+            print(f"  {size:>10} {stage:<12}{old:>10}{new:>10}{change:>8}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Indicator throughput over synthetic daily price histories.
+
+    python -m benchmarks.bench_indicators [--tickers 500] [--years 20] [--indicators ...] [--json]
+
+Reports a cold batch computation, a per-ticker loop (timed on a sample and scaled to all
+tickers), a fully cached request, and the incremental update after one new bar per ticker.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app import indicators
+
+
+def synthetic_histories(tickers, bars, seed=11):
+    rng = np.random.default_rng(seed)
+    dates = np.busday_offset(np.datetime64("2000-01-03"), np.arange(bars), roll="forward")
+    returns = rng.normal(0.0003, 0.015, size=(tickers, bars))
+    closes = 50 * np.exp(np.cumsum(returns, axis=1))
+    return {f"T{i:04d}": {"dates": dates, "close": closes[i]} for i in range(tickers)}
+
+
+def append_bar(histories, seed=12):
+    rng = np.random.default_rng(seed)
+    extended = {}
+    for ticker, history in histories.items():
+        next_date = np.busday_offset(history["dates"][-1], 1, roll="forward")
+        next_close = history["close"][-1] * np.exp(rng.normal(0.0003, 0.015))
+        extended[ticker] = {
+            "dates": np.append(history["dates"], next_date),
+            "close": np.append(history["close"], next_close),
+        }
+    return extended
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--indicators", default=indicators.DEFAULT_INDICATORS)
+    parser.add_argument("--baseline-sample", type=int, default=25, help="tickers timed for the per-ticker loop")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    specs = indicators.parse_indicators(args.indicators)
+    bars = args.years * 252
+    histories = synthetic_histories(args.tickers, bars)
+    total_bars = args.tickers * bars
+
+    sample = list(histories.items())[:max(1, min(args.baseline_sample, args.tickers))]
+    indicators.clear_cache()
+    per_ticker = timed(lambda: [indicators.compute_many({t: h}, specs) for t, h in sample])
+    per_ticker *= args.tickers / len(sample)
+    indicators.clear_cache()
+    cold = timed(lambda: indicators.compute_many(histories, specs))
+    cached = timed(lambda: indicators.compute_many(histories, specs))
+    extended = append_bar(histories)
+    incremental = timed(lambda: indicators.compute_many(extended, specs))
+
+    results = {
+        "tickers": args.tickers,
+        "bars_per_ticker": bars,
+        "indicators": [indicators.indicator_name(s) for s in specs],
+        "per_ticker_seconds": round(per_ticker, 4),
+        "batch_seconds": round(cold, 4),
+        "batch_bars_per_s": round(total_bars * len(specs) / cold),
+        "cached_seconds": round(cached, 4),
+        "incremental_one_bar_seconds": round(incremental, 4),
+        "cache_stats": dict(indicators.cache_stats),
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.tickers} tickers x {bars} bars, indicators: {', '.join(results['indicators'])}")
+    print(f"  per-ticker loop       {per_ticker:8.3f}s  (scaled from {len(sample)} tickers)")
+    print(f"  batched (cold)        {cold:8.3f}s  ({results['batch_bars_per_s']:,} indicator-bars/s)")
+    print(f"  cached request        {cached:8.4f}s")
+    print(f"  +1 bar incremental    {incremental:8.4f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+API cold start: time to import `app.main` and run its startup hook, and the resulting
+peak RSS, with and without warm-up.
+
+    python -m benchmarks.bench_startup [--runs 5] [--json]
+
+Every run is a fresh interpreter, so import caches do not carry over between runs. The
+report also lists which heavy dependencies each mode ends up loading.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("google.genai", "chromadb", "yfinance", "pandas", "bs4", "alpha_vantage", "tiktoken")
+
+PROBE = """
+import asyncio, json, resource, sys, time
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+main.STARTUP_WARMUP = {warmup}
+async def startup():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+asyncio.run(startup())
+ready = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "ready_ms": (ready - start) * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(warmup, env):
+    code = PROBE.format(warmup=warmup, heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if out.returncode != 0:
+        raise SystemExit(f"startup probe failed (warmup={warmup}):\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(mode, runs):
+    return {
+        "mode": mode,
+        "import_ms": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "ready_ms": round(statistics.median(r["ready_ms"] for r in runs), 1),
+        "rss_mb": round(statistics.median(r["rss_mb"] for r in runs), 1),
+        "loaded": runs[-1]["loaded"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="cognivest-startup-")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+        CHROMA_PERSIST_DIR=os.path.join(scratch, "chroma"),
+        GEMINI_API_KEY=os.environ.get("GEMINI_API_KEY", "offline-benchmark"),
+        LOG_LEVEL="WARNING",
+    )
+    results = [
+        summarize(mode, [run_once(warmup, env) for _ in range(args.runs)])
+        for mode, warmup in (("lazy", False), ("warm-up", True))
+    ]
+
+    if args.json:
+        print(json.dumps({"runs": args.runs, "results": results}, indent=2))
+        return
+    print(f"median of {args.runs} fresh interpreters")
+    print(f"{'mode':>10}{'import ms':>12}{'ready ms':>12}{'RSS MB':>10}  heavy modules loaded")
+    for r in results:
+        print(f"{r['mode']:>10}{r['import_ms']:>12}{r['ready_ms']:>12}{r['rss_mb']:>10}  {', '.join(r['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
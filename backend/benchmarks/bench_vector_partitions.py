@@ -0,0 +1,105 @@
+"""
+Query latency vs corpus size: one shared collection with a ticker filter vs per-ticker
+collections.
+
+    python -m benchmarks.bench_vector_partitions [--tickers 50] [--sizes 10000,50000,100000] [--json]
+
+Both layouts are filled with the same random unit vectors in a temporary Chroma
+directory. At each corpus size the same queries go through
+`rag_pipeline.search_vectors` in each layout, and p50/p99 latency is reported.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+UPSERT_BATCH = 1000
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def fill(rag_pipeline, tickers, start, stop, dims, rng):
+    """
+    Adds documents start..stop-1 (spread round-robin over tickers) to both layouts.
+    """
+    for batch_start in range(start, stop, UPSERT_BATCH):
+        positions = range(batch_start, min(stop, batch_start + UPSERT_BATCH))
+        vectors = rng.normal(size=(len(positions), dims)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        rows = [(f"doc-{p}", tickers[p % len(tickers)], vectors[i].tolist()) for i, p in enumerate(positions)]
+
+        rag_pipeline.COLLECTION_LAYOUT = "shared"
+        rag_pipeline.get_collection("any").upsert(
+            ids=[r[0] for r in rows], embeddings=[r[2] for r in rows],
+            documents=[r[0] for r in rows], metadatas=[{"ticker": r[1]} for r in rows],
+        )
+        rag_pipeline.COLLECTION_LAYOUT = "ticker"
+        for ticker in tickers:
+            mine = [r for r in rows if r[1] == ticker]
+            if mine:
+                rag_pipeline.upsert_documents(
+                    ticker, ids=[r[0] for r in mine], embeddings=[r[2] for r in mine],
+                    documents=[r[0] for r in mine], metadatas=[{"ticker": ticker} for _ in mine],
+                )
+
+
+def measure(rag_pipeline, layout, queries, n_results):
+    rag_pipeline.COLLECTION_LAYOUT = layout
+    latencies = []
+    for ticker, vector in queries:
+        start = time.perf_counter()
+        rag_pipeline.search_vectors(vector, ticker, n_results)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "layout": layout,
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=50)
+    parser.add_argument("--sizes", default="10000,50000,100000", help="total vectors at each measurement")
+    parser.add_argument("--dims", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    os.environ["CHROMA_PERSIST_DIR"] = tempfile.mkdtemp(prefix="cognivest-partitions-")
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    from app import rag_pipeline
+
+    tickers = [f"T{i:03d}" for i in range(args.tickers)]
+    rng = np.random.default_rng(5)
+    picker = random.Random(5)
+    results = []
+    filled = 0
+    for size in sorted(int(s) for s in args.sizes.split(",")):
+        fill(rag_pipeline, tickers, filled, size, args.dims, rng)
+        filled = size
+        query_vectors = rng.normal(size=(args.queries, args.dims)).astype(np.float32)
+        queries = [(picker.choice(tickers), v.tolist()) for v in query_vectors]
+        for layout in ("shared", "ticker"):
+            results.append(dict(measure(rag_pipeline, layout, queries, args.n_results), corpus=size))
+
+    if args.json:
+        print(json.dumps({"tickers": args.tickers, "dims": args.dims, "results": results}, indent=2))
+        return
+    print(f"{args.tickers} tickers, {args.dims} dims, {args.queries} queries per point")
+    print(f"{'corpus':>10}{'layout':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['corpus']:>10}{r['layout']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Concurrent load test for /api/query, reporting p50/p99 latency and throughput.
+
+    python -m benchmarks.load_test_query                    # offline, before vs after
+    python -m benchmarks.load_test_query --url http://localhost:8000 --ticker AAPL
+
+Offline mode starts the API in-process on a temporary ChromaDB with a fake Gemini
+client that sleeps for a fixed embedding / generation latency, and compares:
+
+- before: the old handler shape, `async def` calling the blocking client directly
+- after:  /api/query on the async client with vector search on the executor
+
+Every request asks a distinct question, and each phase its own set, with the in-process
+query caches cleared in between, so neither the answer cache nor the embedding and
+retrieval caches filled by the first phase hide the difference.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_load(url, ticker, total, concurrency, phase="after"):
+    session = requests.Session()
+
+    def one(i):
+        start = time.perf_counter()
+        question = f"What drove revenue growth? ({phase} #{i})"
+        resp = session.post(url, json={"question": question, "ticker": ticker}, timeout=120)
+        resp.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "requests_per_s": round(total / elapsed, 2),
+    }
+
+
+def start_offline_server(ticker, embed_latency, generation_latency):
+    root = tempfile.mkdtemp(prefix="cognivest-bench-")
+    os.environ["CHROMA_PERSIST_DIR"] = os.path.join(root, "chroma")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(root, "lexical.db")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(root, "embeddings.db")
+    os.environ["COMPACT_VECTOR_DIR"] = os.path.join(root, "compact")
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(root, 'bench.db')}")
+
+    import uvicorn
+    from app import main, rag_pipeline
+    from app.fakes import FakeGeminiClient, fake_vector
+    from app.main import QueryRequest
+
+    fake = FakeGeminiClient(latency=embed_latency, generation_latency=generation_latency)
+    rag_pipeline.client = fake
+
+    docs = [f"{ticker} quarterly report section {i}: revenue grew on services demand." for i in range(50)]
+    rag_pipeline.upsert_documents(
+        ticker,
+        ids=[f"bench-{i}" for i in range(len(docs))],
+        documents=docs,
+        embeddings=[fake_vector(d, fake.dimensions) for d in docs],
+        metadatas=[{"ticker": ticker, "source": "bench", "link": "n/a"} for _ in docs],
+    )
+
+    @main.app.post("/bench/query-blocking")
+    async def query_blocking(request: QueryRequest):
+        # Pre-change handler: blocking Gemini + ChromaDB calls directly on the event loop.
+        return {"answer": rag_pipeline.answer_question(request.question, request.ticker)}
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running API; omit for the offline comparison")
+    parser.add_argument("--ticker", default="BENCH")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="offline fake embedding latency (s)")
+    parser.add_argument("--generation-latency", type=float, default=0.5, help="offline fake generation latency (s)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    if args.url:
+        results = {"after": run_load(f"{args.url}/api/query", args.ticker, args.requests, args.concurrency)}
+    else:
+        from app import query_cache
+
+        base, server = start_offline_server(args.ticker, args.embed_latency, args.generation_latency)
+        try:
+            results = {"before": run_load(f"{base}/bench/query-blocking", args.ticker, args.requests,
+                                          args.concurrency, phase="before")}
+            for cache in (query_cache.query_embeddings, query_cache.retrievals, query_cache.answers):
+                cache.clear()
+            results["after"] = run_load(f"{base}/api/query", args.ticker, args.requests, args.concurrency)
+        finally:
+            server.should_exit = True
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<8}{'requests':>10}{'conc':>6}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['requests']:>10}{r['concurrency']:>6}{r['p50_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['max_ms']:>10}{r['requests_per_s']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Deterministic, filing-shaped text for benchmarks that must run without network access.
+"""
+import random
+
+SECTIONS = [
+    ("PART I", None),
+    ("Item 1.", "Business"),
+    ("Item 1A.", "Risk Factors"),
+    ("Item 1B.", "Unresolved Staff Comments"),
+    ("Item 2.", "Properties"),
+    ("Item 3.", "Legal Proceedings"),
+    ("PART II", None),
+    ("Item 5.", "Market for Registrant's Common Equity"),
+    ("Item 7.", "Management's Discussion and Analysis of Financial Condition and Results of Operations"),
+    ("Item 7A.", "Quantitative and Qualitative Disclosures About Market Risk"),
+    ("Item 8.", "Financial Statements and Supplementary Data"),
+]
+
+SUBJECTS = ["Net sales", "Operating income", "Gross margin", "Adjusted EBITDA", "Free cash flow",
+            "Services revenue", "Research and development expense", "The Company", "Our segment"]
+VERBS = ["increased", "decreased", "remained flat", "was affected", "grew", "declined"]
+TAILS = ["compared to the prior fiscal year", "primarily due to higher demand in the Americas segment",
+         "as a result of foreign currency fluctuations", "driven by supply chain constraints",
+         "reflecting the impact of pricing actions", "partially offset by higher component costs"]
+
+
+def synthetic_filing_sections(target_chars=400_000, seed=7):
+    """
+    Returns [(heading, paragraphs)] totalling roughly `target_chars` characters.
+    """
+    rng = random.Random(seed)
+    per_section = target_chars // len(SECTIONS)
+    sections = []
+    for number, title in SECTIONS:
+        heading = f"{number} {title}" if title else number
+        paragraphs = []
+        size = 0
+        while size < per_section:
+            sentences = [
+                f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.randint(1, 40)}% to "
+                f"${rng.randint(1, 900)}.{rng.randint(0, 9)} billion {rng.choice(TAILS)}."
+                for _ in range(rng.randint(3, 8))
+            ]
+            paragraph = " ".join(sentences)
+            paragraphs.append(paragraph)
+            size += len(paragraph)
+        sections.append((heading, paragraphs))
+    return sections
+
+
+def synthetic_filing_text(target_chars=400_000, seed=7):
+    """
+    Whitespace-normalized filing text, as produced by the HTML cleaning step.
+    """
+    parts = []
+    for heading, paragraphs in synthetic_filing_sections(target_chars, seed):
+        parts.append(heading)
+        parts.extend(paragraphs)
+    return " ".join(parts)
+
+
+def synthetic_filing_html(target_chars=400_000, seed=7):
+    """
+    The same content wrapped in EDGAR-style HTML (inline styles, tables, script noise).
+    """
+    parts = ["<html><head><title>10-K</title><style>p{margin:0}</style></head><body>"]
+    for heading, paragraphs in synthetic_filing_sections(target_chars, seed):
+        parts.append(f'<div style="font-weight:bold"><span>{heading}</span></div>')
+        for i, paragraph in enumerate(paragraphs):
+            parts.append(f'<p style="font-family:Times New Roman">{paragraph}</p>')
+            if i % 10 == 9:
+                parts.append("<table><tr><td>Fiscal 2024</td><td>$ 391.0</td></tr>"
+                             "<tr><td>Fiscal 2023</td><td>$ 383.3</td></tr></table>")
+    parts.append("<script>var tracking = 1;</script></body></html>")
+    return "".join(parts)
@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+# Every store the app opens at import time points into a scratch directory, as in
+# benchmarks/bench_end_to_end.py.
+_root = tempfile.mkdtemp(prefix="cognivest-tests-")
+os.environ.update({
+    "HTTP_MODE": "replay",
+    "HTTP_CACHE_DIR": os.path.join(_root, "http"),
+    "CHROMA_PERSIST_DIR": os.path.join(_root, "chroma"),
+    "DATABASE_URL": f"sqlite:///{os.path.join(_root, 'tests.db')}",
+    "LEXICAL_INDEX_PATH": os.path.join(_root, "lexical.db"),
+    "EMBEDDING_CACHE_PATH": os.path.join(_root, "embeddings.db"),
+    "RATE_LIMIT_DB": os.path.join(_root, "rate_limits.db"),
+    "CIK_INDEX_PATH": os.path.join(_root, "cik.db"),
+    "COMPACT_VECTOR_DIR": os.path.join(_root, "compact"),
+    "PRICE_STORE_DIR": os.path.join(_root, "prices"),
+    "GEMINI_API_KEY": "offline-tests",
+    "ALPHA_VANTAGE_API_KEY": "offline-tests",
+})
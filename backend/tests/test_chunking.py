@@ -0,0 +1,30 @@
+from app import chunking
+
+SENTENCES = " ".join(
+    f"Revenue in segment {n} grew {n % 7} percent on higher volumes and pricing." for n in range(400)
+)
+
+
+def test_chunks_stay_within_budget_with_large_overlap():
+    chunks = list(chunking.iter_token_chunks(SENTENCES, max_tokens=50, overlap_tokens=45))
+    assert chunks
+    assert max(chunking.count_tokens(chunk) for chunk in chunks) <= 50
+
+
+def test_overlap_repeats_previous_tail():
+    chunks = list(chunking.iter_token_chunks(SENTENCES, max_tokens=60, overlap_tokens=20))
+    last_sentence = chunks[0].rsplit(". ", 1)[-1]
+    assert chunks[1].startswith(last_sentence)
+
+
+def test_streamed_pieces_match_whole_text():
+    whole = list(chunking.iter_token_chunks(SENTENCES, max_tokens=80))
+    pieces = (SENTENCES[i:i + 7] for i in range(0, len(SENTENCES), 7))
+    assert list(chunking.iter_token_chunks(pieces, max_tokens=80)) == whole
+
+
+def test_text_without_boundaries_is_split():
+    text = "x" * 50000
+    chunks = list(chunking.iter_token_chunks(iter(text), max_tokens=100))
+    assert "".join(chunks) == text
+    assert max(chunking.count_tokens(chunk) for chunk in chunks) <= 100
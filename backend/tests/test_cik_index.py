@@ -0,0 +1,62 @@
+import time
+
+import pytest
+
+from app import cik_index
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "cik.db")
+    fetches = []
+
+    def fake_get(url, source, headers=None):
+        fetches.append(url)
+        return FakeResponse({
+            "0": {"cik_str": 320193, "ticker": "AAPL", "title": "Apple Inc."},
+            "1": {"cik_str": 789019, "ticker": "msft", "title": "Microsoft Corp"},
+        })
+
+    monkeypatch.setattr(cik_index.http_client, "get", fake_get)
+    monkeypatch.setattr(cik_index, "CIK_INDEX_PATH", path)
+    monkeypatch.setattr(cik_index, "_index", None)
+    monkeypatch.setattr(cik_index, "_built_at", 0.0)
+    # build_index binds its default path at import time.
+    monkeypatch.setattr(cik_index.build_index, "__defaults__", (path,))
+    return path, fetches
+
+
+def test_first_lookup_builds_the_index_once(index_path):
+    _, fetches = index_path
+    assert cik_index.get_cik("aapl") == 320193
+    assert cik_index.get_cik("MSFT") == 789019
+    assert cik_index.get_cik("NOPE") is None
+    assert len(fetches) == 1
+
+
+def test_existing_index_is_read_from_disk(index_path):
+    path, fetches = index_path
+    cik_index.build_index(path)
+    assert cik_index.get_cik("AAPL") == 320193
+    assert len(fetches) == 1
+
+
+def test_stale_index_is_refreshed_in_the_background(index_path, monkeypatch):
+    refreshes = []
+    monkeypatch.setattr(cik_index, "_refresh_in_background", lambda: refreshes.append(True))
+    cik_index.get_cik("AAPL")
+    assert refreshes == []
+    monkeypatch.setattr(cik_index, "_built_at", time.time() - cik_index.CIK_INDEX_MAX_AGE_HOURS * 3600 - 1)
+    assert cik_index.get_cik("AAPL") == 320193
+    assert refreshes == [True]
@@ -0,0 +1,93 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from app import compact_vectors
+
+
+@pytest.fixture(autouse=True)
+def store_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(compact_vectors, "COMPACT_VECTOR_DIR", str(tmp_path))
+    compact_vectors._loaded.clear()
+    return tmp_path
+
+
+def unit_vectors(n, dims=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top(vectors, query, k):
+    return [str(i) for i in np.argsort(-(vectors @ query))[:k]]
+
+
+def test_int8_quantization_round_trips_closely():
+    vectors = unit_vectors(100)
+    codes, scales = compact_vectors.quantize_int8(vectors)
+    assert codes.dtype == np.int8
+    assert np.abs(codes * scales[:, None] - vectors).max() < 0.01
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_search_matches_exact_ranking(storage):
+    vectors = unit_vectors(500)
+    compact_vectors.upsert("coll", [str(i) for i in range(500)], vectors)
+    store = compact_vectors.load("coll")
+    for query in unit_vectors(10, seed=1):
+        found = store.search(query, 5, storage)
+        assert [doc_id for doc_id, _ in found] == exact_top(vectors, query, 5)
+        distance = found[0][1]
+        assert distance == pytest.approx(2 - 2 * float(vectors[int(found[0][0])] @ query), abs=0.01)
+
+
+def test_reupserted_ids_serve_their_newest_vector():
+    vectors = unit_vectors(10)
+    compact_vectors.upsert("coll", [str(i) for i in range(10)], vectors)
+    compact_vectors.upsert("coll", ["3"], vectors[7:8])
+    store = compact_vectors.load("coll")
+    assert len(store) == 10
+    assert {doc_id for doc_id, _ in store.search(vectors[7], 2, "float16")} == {"3", "7"}
+
+
+def test_segments_are_merged(store_dir):
+    vectors = unit_vectors(200)
+    for start in range(0, 200, 10):
+        compact_vectors.upsert("coll", [str(i) for i in range(start, start + 10)], vectors[start:start + 10])
+    manifest = compact_vectors._read_manifest("coll")
+    assert len(manifest["segments"]) <= compact_vectors.MAX_SEGMENTS
+    assert sum(segment["rows"] for segment in manifest["segments"]) == 200
+    assert len(compact_vectors.load("coll")) == 200
+
+
+def test_delete_removes_ids():
+    vectors = unit_vectors(20)
+    compact_vectors.upsert("coll", [str(i) for i in range(20)], vectors)
+    assert compact_vectors.delete("coll", ["0", "5", "missing"]) == 2
+    store = compact_vectors.load("coll")
+    assert len(store) == 18 and "5" not in set(store.ids)
+    assert compact_vectors.delete("absent", ["0"]) == 0
+
+
+def test_dimension_change_is_rejected():
+    compact_vectors.upsert("coll", ["a"], unit_vectors(1, dims=32))
+    with pytest.raises(ValueError):
+        compact_vectors.upsert("coll", ["b"], unit_vectors(1, dims=16))
+
+
+def _write_rows(directory, worker, rows):
+    compact_vectors.COMPACT_VECTOR_DIR = directory
+    vectors = unit_vectors(rows, seed=worker)
+    for start in range(0, rows, 10):
+        compact_vectors.upsert("coll", [f"{worker}-{i}" for i in range(start, start + 10)], vectors[start:start + 10])
+
+
+def test_writers_in_several_processes_lose_nothing(store_dir):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_write_rows, args=(str(store_dir), worker, 50)) for worker in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    assert all(p.exitcode == 0 for p in processes)
+    assert len(compact_vectors.load("coll")) == 150
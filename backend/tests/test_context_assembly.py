@@ -0,0 +1,44 @@
+from app import chunking, context_assembly
+
+
+def hit(text, doc_id=None):
+    return {"id": doc_id or text[:16], "document": text, "metadata": {}}
+
+
+def sentence(n):
+    return f"Segment {n} reports revenue of {n} million dollars and margin of {n} percent. "
+
+
+def test_near_duplicates_are_dropped():
+    text = "".join(sentence(i) for i in range(10))
+    context, used, report = context_assembly.assemble_context(
+        [hit(text, "a"), hit(text + " Filed late.", "b"), hit(sentence(99) * 3, "c")]
+    )
+    assert [h["id"] for h in used] == ["a", "c"]
+    assert report["duplicates_removed"] == 1
+    assert report["tokens_saved"] > 0
+    assert context.count("Segment 0 ") == 1
+
+
+def test_overlapping_chunk_windows_are_trimmed():
+    first = "".join(sentence(i) for i in range(0, 6))
+    second = "".join(sentence(i) for i in range(4, 20))
+    context, used, report = context_assembly.assemble_context([hit(first, "a"), hit(second, "b")])
+    assert len(used) == 2
+    assert report["overlap_chars_trimmed"] == len("".join(sentence(i) for i in range(4, 6)).strip()) + 1
+    assert context.count("Segment 5 ") == 1
+    assert "Segment 19 " in context
+
+
+def test_context_fits_the_token_budget():
+    hits = [hit("".join(sentence(i * 100 + j) for j in range(40)), str(i)) for i in range(6)]
+    context, used, report = context_assembly.assemble_context(hits, token_budget=500)
+    assert chunking.count_tokens(context) <= 500
+    assert report["tokens_used"] <= 500
+    assert report["truncated"] + report["dropped_over_budget"] > 0
+    assert used[0]["id"] == "0"
+
+
+def test_empty_documents_are_ignored():
+    context, used, report = context_assembly.assemble_context([hit(""), {"id": "x", "document": None}])
+    assert (context, used, report["chunks_used"]) == ("", [], 0)
@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from app import embedding_cache
+
+
+def test_keys_and_ids_ignore_whitespace_differences():
+    assert embedding_cache.cache_key("m", "RETRIEVAL_DOCUMENT", "Net  income\nrose") == \
+        embedding_cache.cache_key("m", "RETRIEVAL_DOCUMENT", " Net income rose ")
+    assert embedding_cache.cache_key("m", "RETRIEVAL_DOCUMENT", "x") != \
+        embedding_cache.cache_key("m", "RETRIEVAL_QUERY", "x")
+    assert embedding_cache.document_id("aapl", "Net income rose") == \
+        embedding_cache.document_id("AAPL", "Net  income rose")
+    assert embedding_cache.document_id("AAPL", "x") != embedding_cache.document_id("MSFT", "x")
+
+
+def test_vectors_round_trip_through_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+    embedding_cache.EmbeddingCache(path).put_many([("a", [0.5, -0.25]), ("empty", [])])
+    reopened = embedding_cache.EmbeddingCache(path)
+    assert reopened.get_many(["a", "empty", "missing"]) == {"a": pytest.approx([0.5, -0.25])}
+    assert len(reopened) == 1
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = embedding_cache.EmbeddingCache(str(tmp_path / "cache.db"), max_entries=2)
+    cache.put_many([("old", [1.0])])
+    time.sleep(0.01)
+    cache.put_many([("newer", [2.0])])
+    time.sleep(0.01)
+    cache.get_many(["old"])
+    time.sleep(0.01)
+    cache.put_many([("newest", [3.0])])
+    assert set(cache.get_many(["old", "newer", "newest"])) == {"old", "newest"}
@@ -0,0 +1,61 @@
+import threading
+from types import SimpleNamespace
+
+from app import embedding_cache, embedding_engine
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class FakeModels:
+    def __init__(self, fail_first=0):
+        self.calls = []
+        self.fail_first = fail_first
+        self._lock = threading.Lock()
+
+    def embed_content(self, model, contents, config):
+        with self._lock:
+            self.calls.append(list(contents))
+            if self.fail_first:
+                self.fail_first -= 1
+                raise RateLimited("RESOURCE_EXHAUSTED")
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=[3.0, 4.0]) for _ in contents])
+
+
+def make_engine(models, **kwargs):
+    engine = embedding_engine.EmbeddingEngine(
+        client=SimpleNamespace(models=models), initial_backoff=0.01, max_backoff=0.05, **kwargs
+    )
+    engine._config = lambda: None
+    return engine
+
+
+def test_texts_are_batched_and_normalized():
+    models = FakeModels()
+    vectors = make_engine(models, batch_size=2).embed(["a", "b", "c"])
+    assert sorted(len(batch) for batch in models.calls) == [1, 2]
+    assert vectors == [[0.6, 0.8]] * 3
+
+
+def test_rate_limited_batches_are_retried():
+    models = FakeModels(fail_first=2)
+    engine = make_engine(models, batch_size=10)
+    assert engine.embed(["a", "b"]) == [[0.6, 0.8]] * 2
+    assert engine.last_run["retries"] == 2
+    assert len(models.calls) == 3
+
+
+def test_cached_texts_are_not_sent_again(tmp_path):
+    cache = embedding_cache.EmbeddingCache(str(tmp_path / "cache.db"))
+    make_engine(FakeModels(), cache=cache).embed(["Revenue grew.", "Costs fell."])
+    models = FakeModels()
+    engine = make_engine(models, cache=cache)
+    engine.embed(["Revenue  grew.", "Guidance raised."])
+    assert models.calls == [["Guidance raised."]]
+    assert engine.last_run["cache_hits"] == 1
+
+
+def test_reduced_dimensions_use_their_own_cache_entries():
+    assert embedding_engine.cache_model_name("m", embedding_engine.FULL_EMBEDDING_DIMENSIONS) == "m"
+    assert embedding_engine.cache_model_name("m", 768) == "m@768"
@@ -0,0 +1,118 @@
+import json
+import time
+
+import pytest
+
+from app import http_client
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=b"", headers=None):
+        self.status_code = status_code
+        self.content = body
+        self.headers = headers or {}
+        self.encoding = "utf-8"
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        self.requests.append((url, dict(headers or {})))
+        return self.responses.pop(0)
+
+
+class NoLimit:
+    def acquire(self, tokens=1.0, deadline=None):
+        return 0.0
+
+
+@pytest.fixture
+def upstream(monkeypatch, tmp_path):
+    session = FakeSession()
+    monkeypatch.setattr(http_client, "HTTP_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(http_client, "HTTP_MODE", "live")
+    monkeypatch.setattr(http_client, "_session", lambda host: session)
+    monkeypatch.setattr(http_client.rate_limit, "limiter", lambda name: NoLimit())
+    return session
+
+
+URL = "https://data.sec.gov/submissions/CIK0000320193.json"
+
+
+def test_fresh_entries_are_served_from_the_cache(upstream):
+    upstream.responses.append(FakeResponse(body=b'{"filings": 1}'))
+    first = http_client.get(URL, "sec_submissions")
+    second = http_client.get(URL, "sec_submissions")
+    assert first.json() == second.json() == {"filings": 1}
+    assert second.from_cache and len(upstream.requests) == 1
+
+
+def test_stale_entries_are_revalidated(upstream, monkeypatch):
+    upstream.responses.append(FakeResponse(body=b"v1", headers={"ETag": '"abc"'}))
+    http_client.get(URL, "sec_submissions")
+    monkeypatch.setitem(http_client.SOURCES, "sec_submissions", dict(http_client.SOURCES["sec_submissions"], ttl=0))
+    upstream.responses.append(FakeResponse(status_code=304))
+    response = http_client.get(URL, "sec_submissions")
+    assert upstream.requests[-1][1]["If-None-Match"] == '"abc"'
+    assert response.from_cache and response.text == "v1"
+
+
+def test_rate_limit_notes_are_not_cached(upstream):
+    url = "https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers=AAPL&apikey=secret"
+    upstream.responses.append(FakeResponse(body=json.dumps({"Note": "5 calls per minute"}).encode()))
+    upstream.responses.append(FakeResponse(body=json.dumps({"feed": []}).encode()))
+    assert "Note" in http_client.get(url, "alpha_vantage").json()
+    assert http_client.get(url, "alpha_vantage").json() == {"feed": []}
+    assert http_client.get(url, "alpha_vantage").from_cache
+
+
+def test_streamed_body_is_cached_only_when_read_to_the_end(upstream):
+    body = b"x" * (3 * http_client.STREAM_CHUNK_BYTES)
+    upstream.responses.append(FakeResponse(body=body))
+    partial = http_client.get(URL, "sec_archives", stream=True)
+    next(partial.iter_content())
+    partial.close()
+
+    upstream.responses.append(FakeResponse(body=body))
+    whole = http_client.get(URL, "sec_archives", stream=True)
+    assert b"".join(whole.iter_content()) == body
+    assert http_client.get(URL, "sec_archives").content == body
+    assert len(upstream.requests) == 2
+
+
+def test_replay_serves_recordings_without_credentials(upstream, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_MODE", "replay")
+    http_client.record("https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers=MSFT", '{"feed": [1]}')
+    url = "https://www.alphavantage.co/query?tickers=MSFT&apikey=other&function=NEWS_SENTIMENT"
+    assert http_client.get(url, "alpha_vantage").json() == {"feed": [1]}
+    with pytest.raises(http_client.ReplayMissError):
+        http_client.get("https://www.alphavantage.co/query?function=NEWS_SENTIMENT&tickers=IBM", "alpha_vantage")
+    assert upstream.requests == []
+
+
+def test_deadline_stops_requests_before_the_network(upstream):
+    with pytest.raises(http_client.rate_limit.DeadlineExceeded):
+        http_client.get(URL, "sec_submissions", deadline=time.monotonic() - 1)
+    assert upstream.requests == []
+
+
+def test_prune_keeps_the_cache_under_its_limit(upstream, monkeypatch, tmp_path):
+    monkeypatch.setattr(http_client, "HTTP_CACHE_MAX_MB", 2.5 / 1024)
+    for n in range(5):
+        http_client.record(f"https://www.sec.gov/Archives/{n}.htm", b"y" * 1024)
+        time.sleep(0.01)
+    http_client._prune()
+    bodies = sorted(p.name for p in tmp_path.glob("*.body"))
+    assert len(bodies) == 2
+    assert http_client.cache_key("https://www.sec.gov/Archives/4.htm") + ".body" in bodies
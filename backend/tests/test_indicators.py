@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from app import indicators
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    indicators.clear_cache()
+
+
+def history(closes, start="2024-01-01"):
+    closes = np.asarray(closes, dtype=np.float64)
+    return {"dates": np.arange(np.datetime64(start), np.datetime64(start) + len(closes)), "close": closes}
+
+
+def random_walk(n, seed=0):
+    return 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.02, n)))
+
+
+def reference(kind, window, closes):
+    out = np.full(len(closes), np.nan)
+    if kind == "sma":
+        for t in range(window - 1, len(closes)):
+            out[t] = closes[t - window + 1:t + 1].mean()
+    elif kind == "ema":
+        alpha = 2 / (window + 1)
+        value = closes[0]
+        for t, close in enumerate(closes):
+            value = close if t == 0 else value + alpha * (close - value)
+            out[t] = value
+    elif kind == "rsi":
+        changes = np.diff(closes)
+        gain, loss = max(changes[0], 0), max(-changes[0], 0)
+        for t in range(1, len(changes)):
+            gain += (max(changes[t], 0) - gain) / window
+            loss += (max(-changes[t], 0) - loss) / window
+            if t + 1 >= window:
+                out[t + 1] = 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+    elif kind == "volatility":
+        returns = np.diff(np.log(closes))
+        for t in range(window, len(closes)):
+            out[t] = returns[t - window:t].std(ddof=1) * np.sqrt(indicators.TRADING_DAYS_PER_YEAR)
+    elif kind == "drawdown":
+        out = closes / np.maximum.accumulate(closes) - 1
+    return out
+
+
+SPECS = indicators.parse_indicators("sma_5,ema_10,rsi_14,volatility_20,drawdown")
+
+
+def test_kernels_match_reference_implementations():
+    closes = random_walk(120)
+    result = indicators.compute_many({"AAA": history(closes)}, SPECS)["AAA"]
+    for kind, window in SPECS:
+        name = indicators.indicator_name((kind, window))
+        np.testing.assert_allclose(result[name], reference(kind, window, closes), rtol=1e-9, equal_nan=True)
+
+
+def test_tickers_of_different_lengths_are_computed_together():
+    short, long = random_walk(30, seed=1), random_walk(200, seed=2)
+    together = indicators.compute_many({"S": history(short), "L": history(long)}, SPECS)
+    indicators.clear_cache()
+    alone = indicators.compute_many({"S": history(short)}, SPECS)
+    for name, values in alone["S"].items():
+        np.testing.assert_allclose(together["S"][name], values, equal_nan=True)
+        assert len(together["L"][name]) == 200
+
+
+def test_new_bars_are_computed_incrementally():
+    closes = random_walk(150)
+    indicators.compute_many({"AAA": history(closes[:140])}, SPECS)
+    incremental = indicators.compute_many({"AAA": history(closes)}, SPECS)["AAA"]
+    assert indicators.cache_stats["incremental"] == len(SPECS)
+    indicators.clear_cache()
+    full = indicators.compute_many({"AAA": history(closes)}, SPECS)["AAA"]
+    for name in full:
+        np.testing.assert_allclose(incremental[name], full[name], rtol=1e-9, equal_nan=True)
+
+    indicators.compute_many({"AAA": history(closes)}, SPECS)
+    assert indicators.cache_stats["hits"] == len(SPECS)
+
+
+def test_readjusted_history_is_recomputed():
+    closes = random_walk(60)
+    indicators.compute_many({"AAA": history(closes)}, SPECS)
+    adjusted = np.append(closes / 2, closes[-1])
+    result = indicators.compute_many({"AAA": history(adjusted)}, SPECS)["AAA"]
+    assert indicators.cache_stats["full"] == 2 * len(SPECS)
+    np.testing.assert_allclose(result["sma_5"], reference("sma", 5, adjusted), equal_nan=True)
+
+
+@pytest.mark.parametrize("names", ["macd", "sma_1", "sma_x"])
+def test_unknown_or_bad_indicators_are_rejected(names):
+    with pytest.raises(ValueError):
+        indicators.parse_indicators(names)
+
+
+def test_json_values_use_null_for_warm_up():
+    assert indicators.to_json_values(np.array([np.nan, 1.23456789])) == [None, 1.234568]
@@ -0,0 +1,38 @@
+import uuid
+
+from app import lexical_index
+
+
+def make_index(tmp_path):
+    return lexical_index.LexicalIndex(str(tmp_path / "lexical.db"))
+
+
+def test_legacy_uuid_ids_can_be_indexed_and_deleted(tmp_path):
+    index = make_index(tmp_path)
+    legacy = str(uuid.uuid4())
+    hashed = "0123456789abcdef0123456789abcdef"
+    index.add_documents("AAPL", [legacy, hashed], ["EBITDA rose sharply.", "EBITDA fell."], [{}, {}])
+    assert {hit["id"] for hit in index.search("AAPL", "EBITDA")} == {legacy, hashed}
+
+    index.add_documents("AAPL", [legacy], ["EBITDA rose sharply again."], [{}])
+    assert len(index) == 2
+
+    index.delete_documents([legacy])
+    assert [hit["id"] for hit in index.search("AAPL", "EBITDA")] == [hashed]
+
+
+def test_rowid_is_stable_for_hex_and_other_ids():
+    assert lexical_index._rowid("0123456789abcdef") == int("0123456789abcde", 16)
+    legacy = "3f2504e0-4f89-41d3-9a0c-0305e82c3301"
+    assert lexical_index._rowid(legacy) == lexical_index._rowid(legacy) < 2 ** 63
+
+
+def test_ticker_filter_is_exact():
+    index = lexical_index.LexicalIndex(":memory:")
+    index.add_documents("CAR", ["a" * 16], ["Fleet utilization improved."], [{}])
+    index.add_documents("CARS", ["b" * 16], ["Fleet utilization declined."], [{}])
+    assert [hit["id"] for hit in index.search("CAR", "fleet utilization")] == ["a" * 16]
+
+
+def test_question_without_terms_matches_nothing():
+    assert lexical_index.build_match_query("What is the?") is None
@@ -0,0 +1,46 @@
+import json
+import logging
+
+import pytest
+
+from app import observability
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = observability.Histogram("latency_seconds", "Latency.", labels=("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value, route='/a"b')
+    lines = hist.render()
+    assert 'latency_seconds_bucket{route="/a\\"b",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a\\"b",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a\\"b",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a\\"b"} 3' in lines
+
+
+def test_span_records_duration_items_and_errors():
+    before = observability.stage_summary().get("test-span", {"calls": 0, "items": 0, "errors": 0})
+    with observability.span("test-span", items=4):
+        pass
+    with pytest.raises(ValueError):
+        with observability.span("test-span", items=4):
+            raise ValueError("boom")
+    after = observability.stage_summary()["test-span"]
+    assert after["calls"] - before["calls"] == 2
+    assert after["items"] - before["items"] == 4
+    assert after["errors"] - before["errors"] == 1
+    assert "cognivest_stage_errors_total" in observability.render_metrics()
+
+
+def test_timed_iterator_counts_items():
+    timed = observability.TimedIterator(iter("abc"))
+    assert list(timed) == ["a", "b", "c"]
+    assert timed.items == 3 and timed.seconds >= 0
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.LogRecord("app.test", logging.INFO, __file__, 1, "Ran %s", ("job",), None)
+    record.ticker = "AAPL"
+    entry = json.loads(observability.JsonFormatter().format(record))
+    assert entry["message"] == "Ran job"
+    assert entry["ticker"] == "AAPL"
+    assert "args" not in entry
@@ -0,0 +1,154 @@
+import datetime
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from app import price_store
+
+
+class FakeSeries:
+    def __init__(self, values):
+        self.values = np.asarray(values)
+
+    def to_numpy(self, dtype=None):
+        return self.values.astype(dtype)
+
+    def fillna(self, value):
+        return np.nan_to_num(self.values.astype(np.float64), nan=value)
+
+
+class FakeFrame:
+    """
+    The slice of a pandas DataFrame that `price_store._fetch` reads.
+    """
+
+    def __init__(self, dates, columns):
+        self.index = types.SimpleNamespace(tz=None, values=np.asarray(dates, dtype="datetime64[ns]"))
+        self.columns = columns
+        self.empty = not len(dates)
+
+    def __contains__(self, column):
+        return column in self.columns
+
+    def __getitem__(self, column):
+        return FakeSeries(self.columns[column])
+
+
+class FakeMarket:
+    """
+    Weekday bars up to the last complete one. Prices before a split are divided by its
+    ratio, as in adjusted data.
+    """
+
+    def __init__(self):
+        self.split = None
+        self.requests = []
+
+    def history(self, start):
+        self.requests.append(start)
+        end = price_store._last_expected_bar()
+        days = np.arange(np.datetime64(start, "D"), end + 1)
+        days = days[np.is_busday(days)]
+        close = 100.0 + (days - np.datetime64("2000-01-01")).astype(np.float64)
+        splits = np.zeros(len(days))
+        if self.split is not None:
+            date, ratio = self.split
+            close = np.where(days < date, close / ratio, close)
+            splits[days == date] = ratio
+        return FakeFrame(days, {
+            "Open": close, "High": close + 1, "Low": close - 1, "Close": close,
+            "Volume": np.full(len(days), 1000.0), "Dividends": np.zeros(len(days)), "Stock Splits": splits,
+        })
+
+
+@pytest.fixture
+def market(monkeypatch, tmp_path):
+    fake = FakeMarket()
+    monkeypatch.setitem(sys.modules, "yfinance", types.SimpleNamespace(Ticker=lambda ticker: fake))
+    monkeypatch.setattr(price_store, "PRICE_STORE_DIR", str(tmp_path))
+    monkeypatch.setattr(price_store, "PRICE_HISTORY_YEARS", 1)
+    price_store._memory.clear()
+    price_store._last_checked.clear()
+    return fake
+
+
+def reopen(ticker):
+    # Forget the in-memory copy and the last upstream check, as a restarted process would.
+    price_store._memory.clear()
+    price_store._last_checked.clear()
+    return price_store.get_history(ticker)
+
+
+def truncate_stored(ticker, days):
+    history = price_store.get_history(ticker)
+    price_store._save(ticker, {key: values[:-days] for key, values in history.items()})
+
+
+def test_history_is_fetched_once_and_persisted(market):
+    history = price_store.get_history("abc")
+    assert len(history["dates"]) > 200
+    assert price_store.get_history("ABC") is history
+    assert len(reopen("ABC")["dates"]) == len(history["dates"])
+    assert len(market.requests) == 1
+
+
+def test_only_missing_bars_are_fetched(market):
+    full = price_store.get_history("ABC")
+    truncate_stored("ABC", 5)
+    history = reopen("ABC")
+    assert market.requests[-1] > market.requests[0]
+    assert np.array_equal(history["close"], full["close"])
+
+
+def test_split_refetches_the_adjusted_history(market):
+    price_store.get_history("ABC")
+    truncate_stored("ABC", 5)
+    market.split = (price_store._last_expected_bar() - 2, 4.0)
+    history = reopen("ABC")
+    assert market.requests[-1] == market.requests[0]
+    expected = market.history(market.requests[0])["Close"].to_numpy(np.float64)
+    assert np.array_equal(history["close"], expected)
+
+
+def test_unadjusted_store_is_replaced(market, tmp_path):
+    history = price_store.get_history("ABC")
+    np.savez(tmp_path / "ABC.npz", **history)
+    reopen("ABC")
+    assert len(market.requests) == 2
+
+
+def test_memory_is_bounded(market, monkeypatch):
+    monkeypatch.setattr(price_store, "PRICE_MEMORY_TICKERS", 2)
+    for ticker in ("AAA", "BBB", "CCC"):
+        price_store.get_history(ticker)
+    assert list(price_store._memory) == ["BBB", "CCC"]
+    assert "AAA" not in price_store._last_checked
+
+
+@pytest.mark.parametrize("ticker", ["../etc", "", "A" * 11, "a b"])
+def test_invalid_tickers_are_rejected(ticker):
+    with pytest.raises(ValueError):
+        price_store.validate_ticker(ticker)
+
+
+def test_downsample_aggregates_buckets():
+    dates = np.arange(np.datetime64("2024-01-01"), np.datetime64("2024-01-11"))
+    values = np.arange(10, dtype=np.float64)
+    history = {"dates": dates, "open": values, "high": values + 1, "low": values - 1, "close": values,
+               "volume": np.ones(10)}
+    bars = price_store.downsample(history, 3)
+    assert len(bars["dates"]) == 3
+    assert bars["dates"][-1] == dates[-1]
+    assert bars["volume"].sum() == 10
+    assert bars["high"].max() == 10 and bars["low"].min() == -1
+
+
+def test_chart_endpoints_reject_negative_max_points():
+    from fastapi.testclient import TestClient
+    from app import main
+
+    client = TestClient(main.app)
+    assert client.get("/api/indicators/ABC", params={"max_points": -1}).status_code == 422
+    assert client.get("/api/stock-data/ABC", params={"max_points": -1}).status_code == 422
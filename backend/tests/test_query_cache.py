@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from app import database, query_cache
+
+
+@pytest.fixture(autouse=True)
+def db():
+    database.init_db()
+
+
+def bump_elsewhere(ticker):
+    # What another process's invalidate_ticker leaves behind: only the database row changes.
+    session = database.SessionLocal()
+    try:
+        row = session.get(database.TickerGeneration, ticker)
+        if row is None:
+            session.add(database.TickerGeneration(ticker=ticker, generation=1))
+        else:
+            row.generation += 1
+        session.commit()
+    finally:
+        session.close()
+
+
+def test_invalidation_changes_keys_at_once():
+    key = query_cache.answer_key("qca", "What is revenue?", ["a", "b"])
+    assert query_cache.answer_key("QCA", " what is  REVENUE? ", ["a", "b"]) == key
+    query_cache.invalidate_ticker("QCA")
+    assert query_cache.answer_key("QCA", "What is revenue?", ["a", "b"]) != key
+
+
+def test_invalidation_in_another_process_is_picked_up():
+    key = query_cache.retrieval_key("QCB", "Risks?", 5)
+    bump_elsewhere("QCB")
+    query_cache.refresh_generations()
+    assert query_cache.retrieval_key("QCB", "Risks?", 5) != key
+
+
+def test_background_refresh_runs():
+    query_cache.start_generation_refresh()
+    before = query_cache.ticker_generation("QCC")
+    bump_elsewhere("QCC")
+    deadline = time.monotonic() + query_cache.GENERATION_REFRESH_SECONDS * 5
+    while query_cache.ticker_generation("QCC") == before and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert query_cache.ticker_generation("QCC") == before + 1
+
+
+def test_lookup_does_not_touch_the_database(monkeypatch):
+    query_cache.start_generation_refresh()
+
+    def no_session():
+        raise AssertionError("database read on the lookup path")
+
+    monkeypatch.setattr(database, "SessionLocal", no_session)
+    query_cache.answer_key("QCD", "Outlook?", ["x"])
+
+
+def test_ttl_cache_is_lru_and_expires():
+    cache = query_cache.TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1
+
+    short = query_cache.TTLCache(maxsize=2, ttl=0.01)
+    short.set("a", 1)
+    time.sleep(0.02)
+    assert short.get("a") is None
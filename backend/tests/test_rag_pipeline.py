@@ -0,0 +1,163 @@
+import asyncio
+import types
+
+import numpy as np
+import pytest
+
+from app import database, query_cache, rag_pipeline
+from app.fakes import FakeGeminiClient, fake_vector
+from app.lexical_index import get_lexical_index
+
+DIMS = rag_pipeline.EMBEDDING_DIMENSIONS
+QUESTION = "How did EBITDA develop?"
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    database.init_db()
+    client = FakeGeminiClient(dimensions=DIMS)
+    monkeypatch.setattr(rag_pipeline, "client", client)
+    for cache in (query_cache.query_embeddings, query_cache.retrievals, query_cache.answers):
+        cache.clear()
+    return client
+
+
+def store(ticker, docs):
+    """
+    docs: {id: (text, vector)}; indexed in Chroma and the BM25 index like ingestion does.
+    """
+    ids = list(docs)
+    texts = [docs[i][0] for i in ids]
+    metadatas = [{"ticker": ticker, "source": "test", "link": "n/a"} for _ in ids]
+    rag_pipeline.upsert_documents(ticker, ids, [docs[i][1] for i in ids], texts, metadatas)
+    get_lexical_index().add_documents(ticker, ids, texts, metadatas)
+
+
+def corpus(ticker):
+    query = np.asarray(fake_vector(QUESTION, DIMS))
+    docs = {f"{ticker}-dense": ("Operating results were broadly stable.", query.tolist()),
+            f"{ticker}-term": ("EBITDA rose to 4.2 billion.", (-query).tolist())}
+    for n in range(8):
+        docs[f"{ticker}-filler-{n}"] = (f"Filler paragraph {n} about store openings.", fake_vector(f"filler {n}", DIMS))
+    store(ticker, docs)
+
+
+def hit(doc_id, distance=None):
+    return {"id": doc_id, "document": doc_id, "metadata": {}, "distance": distance}
+
+
+def test_rrf_rewards_documents_found_by_both_rankings():
+    dense = [hit("a", 0.1), hit("b", 0.2), hit("c", 0.3)]
+    lexical = [hit("c"), hit("a"), hit("d")]
+    fused = rag_pipeline.fuse_rankings([dense, lexical], 3)
+    assert [h["id"] for h in fused] == ["a", "c", "b"]
+    assert fused[0]["distance"] == 0.1
+
+
+def test_hybrid_finds_exact_terms_dense_search_misses(fake, monkeypatch):
+    corpus("HYBA")
+    monkeypatch.setattr(rag_pipeline, "RETRIEVAL_MODE", "dense")
+    dense = [h["id"] for h in rag_pipeline.retrieve(QUESTION, "HYBA", 2)]
+    assert dense[0] == "HYBA-dense" and "HYBA-term" not in dense
+
+    query_cache.retrievals.clear()
+    monkeypatch.setattr(rag_pipeline, "RETRIEVAL_MODE", "hybrid")
+    hybrid = [h["id"] for h in rag_pipeline.retrieve(QUESTION, "HYBA", 2)]
+    assert set(hybrid) == {"HYBA-dense", "HYBA-term"}
+
+
+def test_lexical_failure_falls_back_to_dense(fake, monkeypatch):
+    corpus("HYBB")
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("index locked")
+
+    monkeypatch.setattr(get_lexical_index(), "search", broken)
+    assert rag_pipeline.retrieve(QUESTION, "HYBB", 2)[0]["id"] == "HYBB-dense"
+
+
+def test_retrievals_are_cached_until_the_ticker_changes(fake):
+    corpus("HYBC")
+    first = rag_pipeline.retrieve(QUESTION, "HYBC", 3)
+    calls = fake.embed_calls
+    assert rag_pipeline.retrieve(QUESTION.upper(), "HYBC", 3) == first
+    assert asyncio.run(rag_pipeline.retrieve_async(QUESTION, "HYBC", 3)) == first
+    assert fake.embed_calls == calls
+
+    store("HYBC", {"HYBC-new": ("EBITDA guidance was raised.", fake_vector(QUESTION, DIMS))})
+    query_cache.invalidate_ticker("HYBC")
+    assert "HYBC-new" in [h["id"] for h in rag_pipeline.retrieve(QUESTION, "HYBC", 3)]
+    # The question's embedding is still reused.
+    assert fake.embed_calls == calls
+
+
+def response(text, finish_reason=None):
+    return types.SimpleNamespace(text=text, candidates=[types.SimpleNamespace(finish_reason=finish_reason)])
+
+
+def test_answers_are_cached_until_the_ticker_changes(fake):
+    corpus("ANSA")
+    answer = rag_pipeline.answer_question(QUESTION, "ANSA")
+    assert asyncio.run(rag_pipeline.answer_question_async(QUESTION, "ANSA")) == answer
+    assert fake.generate_calls == 1
+    query_cache.invalidate_ticker("ANSA")
+    rag_pipeline.answer_question(QUESTION, "ANSA")
+    assert fake.generate_calls == 2
+
+
+@pytest.mark.parametrize("reply", [response(None, "SAFETY"), response("  "), response("Revenue grew", "MAX_TOKENS")])
+def test_incomplete_answers_are_not_cached(fake, monkeypatch, reply):
+    corpus("ANSB")
+    calls = []
+
+    def generate_content(model, contents, config=None):
+        calls.append(contents)
+        return reply
+
+    monkeypatch.setattr(fake.models, "generate_content", generate_content)
+    first = rag_pipeline.answer_question(QUESTION, "ANSB")
+    rag_pipeline.answer_question(QUESTION, "ANSB")
+    assert len(calls) == 2
+    if not (reply.text or "").strip():
+        assert first == rag_pipeline.ERROR_ANSWER
+
+
+def collect(stream, stop_after=None):
+    async def run():
+        events = []
+        async for event, data in stream:
+            events.append((event, data))
+            if event == stop_after:
+                break
+        await stream.aclose()
+        return events
+    return asyncio.run(run())
+
+
+def test_stream_is_cached_only_when_read_to_the_end(fake):
+    corpus("ANSC")
+    events = collect(rag_pipeline.stream_answer(QUESTION, "ANSC"), stop_after="token")
+    assert [event for event, _ in events] == ["sources", "token"]
+
+    events = collect(rag_pipeline.stream_answer(QUESTION, "ANSC"))
+    assert events[-1] == ("done", {"cached": False, "context": events[-1][1]["context"]})
+    streamed = "".join(data for event, data in events if event == "token")
+
+    events = collect(rag_pipeline.stream_answer(QUESTION, "ANSC"))
+    assert events[-1] == ("done", {"cached": True})
+    assert [data for event, data in events if event == "token"] == [streamed]
+    assert fake.generate_calls == 2
+
+
+def test_batch_answers_every_ticker(fake):
+    corpus("ANSD")
+    corpus("ANSE")
+
+    async def run():
+        return [item async for item in rag_pipeline.answer_batch(QUESTION, ["ANSD", "ANSE"])]
+
+    events = asyncio.run(run())
+    answers = [data for event, data in events if event == "answer"]
+    assert sorted(a["ticker"] for a in answers) == ["ANSD", "ANSE"]
+    assert not any(a["error"] for a in answers)
+    assert events[-1][0] == "done"
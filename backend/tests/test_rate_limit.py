@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from app import rate_limit
+
+
+def bucket(tmp_path, rate, capacity, name="test"):
+    return rate_limit.TokenBucket(name, rate, capacity, path=str(tmp_path / "buckets.db"))
+
+
+def test_burst_is_free_then_requests_are_paced(tmp_path):
+    limiter = bucket(tmp_path, rate=20, capacity=3)
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    start = time.monotonic()
+    waited = limiter.acquire()
+    assert waited > 0
+    assert time.monotonic() - start >= 0.04
+
+
+def test_buckets_share_state_through_the_file(tmp_path):
+    first = bucket(tmp_path, rate=1, capacity=2)
+    second = bucket(tmp_path, rate=1, capacity=2)
+    first.acquire(2)
+    with pytest.raises(rate_limit.DeadlineExceeded):
+        second.acquire(deadline=time.monotonic() + 0.1)
+
+
+def test_deadline_raises_without_waiting_or_taking_tokens(tmp_path):
+    limiter = bucket(tmp_path, rate=0.1, capacity=1)
+    limiter.acquire()
+    start = time.monotonic()
+    with pytest.raises(rate_limit.DeadlineExceeded):
+        limiter.acquire(deadline=time.monotonic() + 1)
+    assert time.monotonic() - start < 0.5
+    with pytest.raises(rate_limit.DeadlineExceeded):
+        limiter.acquire(deadline=time.monotonic() - 1)
+
+
+def test_concurrent_threads_never_exceed_the_rate(tmp_path):
+    limiter = bucket(tmp_path, rate=50, capacity=5)
+    taken = []
+
+    def take():
+        for _ in range(5):
+            limiter.acquire()
+            taken.append(time.monotonic())
+
+    threads = [threading.Thread(target=take) for _ in range(4)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 20 tokens: the 5-token burst, then 15 at 50/s.
+    assert len(taken) == 20
+    assert time.monotonic() - start >= 15 / 50 * 0.9
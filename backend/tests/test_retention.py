@@ -0,0 +1,75 @@
+import datetime
+import time
+import uuid
+
+import pytest
+
+from app import compact_vectors, database, query_cache, rag_pipeline, retention, worker
+from app.fakes import fake_vector
+from app.lexical_index import get_lexical_index
+
+OLD = int(time.time()) - 90 * 86400
+
+
+@pytest.fixture(autouse=True)
+def db():
+    database.init_db()
+
+
+def store(ticker, ids, doc_type="news", ingested_at=OLD):
+    documents = [f"{ticker} headline {doc_id}" for doc_id in ids]
+    metadatas = [{"ticker": ticker, "source": "Wire", "link": "n/a", "doc_type": doc_type, "ingested_at": ingested_at}
+                 for _ in ids]
+    rag_pipeline.upsert_documents(ticker, ids, [fake_vector(d, 16) for d in documents], documents, metadatas)
+    get_lexical_index().add_documents(ticker, ids, documents, metadatas)
+
+
+def test_legacy_uuid_news_is_deleted_everywhere():
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    store("RETA", ids)
+    fresh = str(uuid.uuid4())
+    store("RETA", [fresh], ingested_at=int(time.time()))
+    key = query_cache.answer_key("RETA", "headline?", ids)
+
+    report = retention.compact()
+
+    assert report["failed_collections"] == {}
+    assert report["reasons"]["news_age"] >= 3
+    assert rag_pipeline.get_collection("RETA").get(include=[])["ids"] == [fresh]
+    assert [hit["id"] for hit in get_lexical_index().search("RETA", "headline")] == [fresh]
+    assert query_cache.answer_key("RETA", "headline?", ids) != key
+
+
+def test_failing_collection_does_not_stop_the_rest(monkeypatch):
+    store("RETB", [str(uuid.uuid4())])
+    store("RETC", [str(uuid.uuid4())])
+    broken = rag_pipeline.ticker_collection_name("RETB")
+    real_delete = compact_vectors.delete
+
+    def delete(name, ids):
+        if name == broken:
+            raise OSError("disk full")
+        return real_delete(name, ids)
+
+    monkeypatch.setattr(compact_vectors, "delete", delete)
+    report = retention.compact()
+
+    assert broken in report["failed_collections"]
+    assert rag_pipeline.get_collection("RETB").count() == 1
+    assert rag_pipeline.get_collection("RETC").count() == 0
+
+
+def test_busy_tickers_are_skipped():
+    store("RETD", [str(uuid.uuid4())])
+    db = database.SessionLocal()
+    try:
+        db.add(database.Task(id=str(uuid.uuid4()), ticker="RETD", status="PROCESSING", lease_owner="worker-a",
+                             lease_expires_at=worker.utcnow() + datetime.timedelta(minutes=5)))
+        db.commit()
+        report = retention.compact()
+    finally:
+        db.query(database.Task).filter(database.Task.ticker == "RETD").delete()
+        db.commit()
+        db.close()
+    assert "RETD" in report["skipped_tickers"]
+    assert rag_pipeline.get_collection("RETD").count() == 1
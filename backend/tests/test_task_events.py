@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, main, progress, tasks
+
+
+@pytest.fixture
+def client(monkeypatch):
+    database.init_db()
+    monkeypatch.setattr(main, "TASK_EVENTS_POLL_SECONDS", 0.02)
+    return TestClient(main.app)
+
+
+def add_task(status="PENDING", message="Task queued"):
+    task_id = str(uuid.uuid4())
+    db = database.SessionLocal()
+    try:
+        db.add(database.Task(id=task_id, ticker=task_id[:8].upper(), status=status, message=message))
+        db.commit()
+    finally:
+        db.close()
+    return task_id
+
+
+def set_status(task_id, status, message):
+    db = database.SessionLocal()
+    try:
+        db.query(database.Task).filter(database.Task.id == task_id).update({"status": status, "message": message})
+        db.commit()
+    finally:
+        db.close()
+
+
+def later(*steps):
+    def run():
+        for step in steps:
+            time.sleep(0.1)
+            step()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def read_events(client, task_id):
+    events = []
+    with client.stream("GET", f"/task-events/{task_id}") as response:
+        assert response.status_code == 200
+        for line in response.iter_lines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[len("data: "):]))
+    return events
+
+
+def test_queued_task_is_followed_through_the_database(client):
+    task_id = add_task()
+    thread = later(lambda: set_status(task_id, "PROCESSING", "Fetching"),
+                   lambda: set_status(task_id, "SUCCESS", "Done"))
+    events = read_events(client, task_id)
+    thread.join()
+    assert [(e["status"], e["message"]) for e in events] == [
+        ("PENDING", "Task queued"), ("PROCESSING", "Fetching"), ("SUCCESS", "Done")
+    ]
+
+
+def test_inline_task_is_followed_on_the_bus(client):
+    task_id = add_task()
+    progress.bus.publish(task_id, "PENDING", "Task queued")
+    thread = later(lambda: progress.bus.publish(task_id, "PROCESSING", "Embedding"),
+                   lambda: progress.bus.publish(task_id, "SUCCESS", "Done"))
+    events = read_events(client, task_id)
+    thread.join()
+    assert events[-1]["status"] == "SUCCESS"
+    statuses = [e["status"] for e in events]
+    assert statuses == sorted(statuses, key=["PENDING", "PROCESSING", "SUCCESS"].index)
+
+
+def test_finished_task_sends_one_event(client):
+    task_id = add_task("FAILURE", "No documents")
+    assert [e["status"] for e in read_events(client, task_id)] == ["FAILURE"]
+
+
+def test_unknown_task_is_404(client):
+    assert client.get(f"/task-events/{uuid.uuid4()}").status_code == 404
+    assert client.get(f"/task-status/{uuid.uuid4()}").status_code == 404
+
+
+def test_progress_is_persisted_on_transitions_only(client):
+    task_id = add_task()
+    db = database.SessionLocal()
+    try:
+        tasks.update_task_db(db, task_id, "PROCESSING", "Fetching")
+        tasks.update_task_db(db, task_id, "PROCESSING", "Embedding 10/200")
+        assert main.read_task_state(task_id)["message"] == "Fetching"
+        # Polling answers live progress from memory.
+        assert client.get(f"/task-status/{task_id}").json()["message"] == "Embedding 10/200"
+        tasks.update_task_db(db, task_id, "SUCCESS", "Done")
+    finally:
+        db.close()
+    assert main.read_task_state(task_id)["status"] == "SUCCESS"
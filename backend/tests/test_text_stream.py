@@ -0,0 +1,28 @@
+from app import text_stream
+
+HTML = (
+    b"<html><head><title>10-K</title><style>p {color: red}</style></head>"
+    b"<body><p>Net   revenue <b>increased</b></p><script>var x = 1;</script>"
+    b"<!-- hidden --><div>\n  by 12%\n</div></body></html>"
+)
+
+
+def stream(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def text(byte_chunks):
+    return "".join(text_stream.iter_normalized_text(text_stream.iter_html_text(byte_chunks)))
+
+
+def test_skipped_tags_and_comments_are_dropped():
+    assert text([HTML]) == "Net revenue increased by 12%"
+
+
+def test_output_does_not_depend_on_chunk_boundaries():
+    for size in (1, 3, 7, 64):
+        assert text(stream(HTML, size)) == "Net revenue increased by 12%"
+
+
+def test_empty_input_yields_nothing():
+    assert text([b"", b""]) == ""
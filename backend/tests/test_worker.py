@@ -0,0 +1,142 @@
+import datetime
+import threading
+import uuid
+
+import pytest
+
+from app import database, retention, worker
+from app.database import Task
+
+
+@pytest.fixture
+def db():
+    database.init_db()
+    session = database.SessionLocal()
+    session.query(Task).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+def expire(db, task):
+    task.lease_expires_at = worker.utcnow() - datetime.timedelta(seconds=1)
+    db.commit()
+
+
+def test_requests_for_a_ticker_are_coalesced(db):
+    first, created = worker.enqueue_ingestion(db, "aapl")
+    again, created_again = worker.enqueue_ingestion(db, "AAPL")
+    assert created and not created_again
+    assert again.id == first.id
+
+
+def test_concurrent_enqueues_create_one_job(db):
+    barrier = threading.Barrier(8)
+    results = []
+
+    def enqueue():
+        session = database.SessionLocal()
+        try:
+            barrier.wait()
+            task, created = worker.enqueue_ingestion(session, "MSFT")
+            results.append((task.id, created))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=enqueue) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({task_id for task_id, _ in results}) == 1
+    assert db.query(Task).filter(Task.ticker == "MSFT").count() == 1
+
+
+def test_unique_index_rejects_a_second_active_job(db):
+    worker.enqueue_ingestion(db, "NVDA")
+    db.add(Task(id=str(uuid.uuid4()), ticker="NVDA", status="PENDING"))
+    with pytest.raises(Exception):
+        db.commit()
+
+
+def test_expired_worker_lease_is_reclaimed(db):
+    task, _ = worker.enqueue_ingestion(db, "AMD")
+    claimed = worker.claim_next(db, "worker-a")
+    assert claimed.id == task.id and claimed.attempts == 1
+    assert worker.claim_next(db, "worker-b") is None
+
+    expire(db, claimed)
+    reclaimed = worker.claim_next(db, "worker-b")
+    assert reclaimed.id == task.id
+    assert reclaimed.lease_owner == "worker-b" and reclaimed.attempts == 2
+    # A worker job is never treated as orphaned, only reclaimed.
+    assert worker.enqueue_ingestion(db, "AMD") == (reclaimed, False)
+
+
+def test_orphaned_inline_task_is_replaced(db):
+    task, _ = worker.enqueue_ingestion(db, "TSLA")
+    worker.start_inline(task)
+    db.commit()
+    assert worker.enqueue_ingestion(db, "TSLA")[0].id == task.id
+    assert retention.active_tickers() == {"TSLA"}
+
+    expire(db, task)
+    assert retention.active_tickers() == set()
+    replacement, created = worker.enqueue_ingestion(db, "TSLA")
+    assert created and replacement.id != task.id
+    db.refresh(task)
+    assert task.status == "FAILURE"
+
+
+def test_inline_task_without_lease_is_abandoned_at_startup(db):
+    # Rows written by inline runs before they held leases
+    legacy = Task(id=str(uuid.uuid4()), ticker="META", status="PROCESSING", attempts=1)
+    running = Task(id=str(uuid.uuid4()), ticker="GOOG", status="PROCESSING", attempts=1,
+                   lease_owner="worker-a", lease_expires_at=worker.utcnow() - datetime.timedelta(seconds=1))
+    db.add_all([legacy, running])
+    db.commit()
+
+    assert worker.abandon_orphaned_tasks(db) == 1
+    db.refresh(legacy)
+    db.refresh(running)
+    assert legacy.status == "FAILURE"
+    assert running.status == "PROCESSING"
+
+
+def test_failed_job_is_retried_with_backoff(db, monkeypatch):
+    from app import tasks
+
+    def fail(ticker, task_id):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(tasks, "process_ticker_documents", fail)
+    task, _ = worker.enqueue_ingestion(db, "IBM")
+    worker.claim_next(db, "worker-a")
+    worker.run_job(task.id, "IBM", "worker-a")
+
+    db.refresh(task)
+    assert task.status == "PENDING"
+    assert task.lease_owner is None
+    assert task.run_after > worker.utcnow()
+    assert "upstream down" in task.message
+
+
+def test_inline_run_releases_its_lease(db, monkeypatch):
+    from app import tasks
+
+    def succeed(ticker, task_id):
+        session = database.SessionLocal()
+        try:
+            tasks.update_task_db(session, task_id, "SUCCESS", "done")
+        finally:
+            session.close()
+
+    monkeypatch.setattr(tasks, "process_ticker_documents", succeed)
+    task, _ = worker.enqueue_ingestion(db, "ORCL")
+    worker.start_inline(task)
+    db.commit()
+    worker.run_inline("ORCL", task.id)
+
+    db.refresh(task)
+    assert task.status == "SUCCESS"
+    assert task.lease_owner is None and task.lease_expires_at is None
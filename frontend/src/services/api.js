@@ -1,9 +1,46 @@
 // src/services/api.js
 import axios from 'axios';
 
+const API_BASE_URL = 'http://localhost:8000';
+
 const apiService = axios.create({
-  baseURL: 'http://localhost:8000',
+  baseURL: API_BASE_URL,
   headers: { 'Content-Type': 'application/json' },
 });
 
-export default apiService;
\ No newline at end of file
+// POSTs to a server-sent events endpoint and calls onEvent(event, data) for each event.
+// (EventSource only supports GET, so the stream is read with fetch.)
+export async function postEventStream(path, body, onEvent) {
+  const response = await fetch(`${API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(body),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      onEvent(event, data ? JSON.parse(data) : null);
+    }
+  }
+}
+
+export { API_BASE_URL };
+export default apiService;
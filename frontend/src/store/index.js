@@ -1,6 +1,6 @@
 // src/store/index.js
 import { createStore } from 'vuex'
-import apiService from '@/services/api' // Use @ to reference the src folder
+import apiService, { postEventStream } from '@/services/api' // Use @ to reference the src folder
 
 export default createStore({
   state: {
@@ -23,6 +23,9 @@ export default createStore({
     ADD_MESSAGE(state, message) {
         state.messages.push(message);
     },
+    APPEND_TO_LAST_MESSAGE(state, text) {
+        state.messages[state.messages.length - 1].text += text;
+    },
     SET_DOC_PROCESSING(state, isProcessing) { // <-- ADD THIS
         state.isProcessingDocument = isProcessing;
     },
@@ -39,12 +42,32 @@ export default createStore({
       commit('ADD_MESSAGE', { sender: 'user', text: question });
       commit('SET_LOADING', true);
 
+      let streamed = false;
       try {
-        const response = await apiService.post('/api/query', { question, ticker });
-        commit('ADD_MESSAGE', { sender: 'ai', text: response.data.answer });
-      } catch (error) {
-        console.error("Error querying the API:", error);
-        commit('ADD_MESSAGE', { sender: 'ai', text: 'Sorry, I ran into an error. Please try again.' });
+        // Stream the answer: tokens are appended to the reply as Gemini produces them.
+        await postEventStream('/api/query/stream', { question, ticker }, (event, data) => {
+          if (event === 'token') {
+            if (!streamed) {
+              streamed = true;
+              commit('ADD_MESSAGE', { sender: 'ai', text: '' });
+              commit('SET_LOADING', false);
+            }
+            commit('APPEND_TO_LAST_MESSAGE', data);
+          }
+        });
+      } catch (streamError) {
+        if (streamed) {
+          console.error("Answer stream interrupted:", streamError);
+          return;
+        }
+        // Fall back to the non-streaming endpoint.
+        try {
+          const response = await apiService.post('/api/query', { question, ticker });
+          commit('ADD_MESSAGE', { sender: 'ai', text: response.data.answer });
+        } catch (error) {
+          console.error("Error querying the API:", error);
+          commit('ADD_MESSAGE', { sender: 'ai', text: 'Sorry, I ran into an error. Please try again.' });
+        }
       } finally {
         commit('SET_LOADING', false);
       }